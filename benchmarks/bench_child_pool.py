@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# Measure how long it takes to open an app, from opening the file until the
+#   'initialized' action of the app has run in its child process, with a new
+#   process for each app and with pooled child processes, for each available
+#   process start method.
+#
+# Run with:
+#   python benchmarks/bench_child_pool.py
+#
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+APP_XML = """\
+<html>
+<head><title>Open Benchmark</title></head>
+<body>
+<object classid='TextBox' id='result'></object>
+<object classid='Main' id='main'>
+  <param name='python_filename' value='bench_open'/>
+  <param name='actions' value="{'initialized': 'bench_open.initialized'}"/>
+</object>
+</body>
+</html>
+"""
+
+APP_PY = """\
+def initialized(result, **kwargs):
+    result.value = 'ready'
+"""
+
+
+def measure(start_method, pool_size, n_opens=10):
+    # runs in a fresh interpreter since the start method can only be set once
+    multiprocessing.set_start_method(start_method)
+    if start_method == 'forkserver':
+        import pythics.child
+        multiprocessing.set_forkserver_preload(pythics.child.PRELOAD_MODULES)
+    import pythics.start
+    QtWidgets = pythics.start.QtWidgets
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'bench_open.xml'), 'w') as f:
+        f.write(APP_XML)
+    with open(os.path.join(directory, 'bench_open.py'), 'w') as f:
+        f.write(APP_PY)
+    manager = multiprocessing.Manager()
+    application = QtWidgets.QApplication(sys.argv[:1])
+    parent = pythics.parent.Parent(manager, transport='pipe', child_pool_size=pool_size)
+    window = pythics.start.MainWindow(parent, application)
+    parent.start()
+
+    def process_events(t, done=None):
+        end_time = time.perf_counter() + t
+        while time.perf_counter() < end_time:
+            application.processEvents()
+            if (done is not None) and done():
+                return True
+            time.sleep(0.0001)
+        return False
+
+    times = list()
+    for i in range(n_opens):
+        # give the pool time to refill, as it would between opening apps by hand
+        process_events(2.0)
+        t0 = time.perf_counter()
+        window.open_html_file(os.path.join(directory, 'bench_open.xml'))
+        tab = window.get_active_tab()
+        if not process_events(30.0, lambda: tab.child_process.controls['result'].value == 'ready'):
+            raise RuntimeError('app did not initialize')
+        times.append(time.perf_counter() - t0)
+        tab.close()
+        window.tab_frame.removeTab(window.tab_frame.indexOf(tab))
+    window.shutdown()
+    times.sort()
+    print('%f %f' % (times[len(times)//2], times[0]))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(sys.argv[1], int(sys.argv[2]))
+        sys.exit(0)
+    print('%-12s %-12s %12s %12s' % ('start method', 'processes', 'median (ms)', 'best (ms)'))
+    for start_method in multiprocessing.get_all_start_methods():
+        for pool_size, description in ((0, 'new'), (2, 'pooled')):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), start_method, str(pool_size)],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                    universal_newlines=True).stdout.split()
+            if len(output) != 2:
+                print('%-12s %-12s %12s' % (start_method, description, 'failed'))
+                continue
+            median, best = float(output[0]), float(output[1])
+            print('%-12s %-12s %12.1f %12.1f' % (start_method, description, median*1e3, best*1e3))
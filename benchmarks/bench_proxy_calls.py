@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# Measure calls per second and latency of each kind of proxy call between
+#   a child process and the GUI, with payloads from scalars to 100 MB
+#   arrays. The app runs headless and the calls are timed in the child
+#   process. Calls without a return value (set_Proxy_attr, delete_Proxy)
+#   are timed as they are sent, and calls per second include waiting for
+#   the GUI to execute all of them.
+#
+# Run with:
+#   python benchmarks/bench_proxy_calls.py [options]
+#
+# Results are written as JSON, to compare transports or changes in how
+#   requests are serialized, e.g.
+#   python benchmarks/bench_proxy_calls.py -t pipe -o before.json
+#
+import getopt
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, '..'))
+
+import numpy as np
+
+import pythics.libcontrol
+import pythics.libproxy
+
+
+KINDS = ('get_Proxy_attr', 'set_Proxy_attr', 'call_Proxy_method', 'call_Proxy', 'delete_Proxy')
+
+# payload name: size in bytes of a float64 array, or a special payload
+PAYLOADS = (('scalar', None),
+            ('list', None),
+            ('array_1KB', 2**10),
+            ('array_64KB', 2**16),
+            ('array_1MB', 2**20),
+            ('array_10MB', 10*2**20),
+            ('array_100MB', 100*2**20))
+
+APP_XML = """\
+<html>
+<head><title>Proxy Call Benchmark</title></head>
+<body>
+<object classid='bench_proxy_calls.Echo' id='bench'></object>
+<object classid='Main' id='main'>
+  <param name='python_filename' value='bench_proxy_app'/>
+  <param name='batch_size' value='%(batch_size)s'/>
+  <param name='shared_memory_threshold' value='%(threshold)s'/>
+</object>
+</body>
+</html>
+"""
+
+APP_PY = """\
+import sys
+sys.path.insert(0, %r)
+from bench_proxy_calls import run_benchmarks
+"""
+
+
+#
+# control in the GUI which the benchmark calls
+#
+class Echo(pythics.libcontrol.Control):
+    def __init__(self, parent, **kwargs):
+        pythics.libcontrol.Control.__init__(self, parent, **kwargs)
+        self.settings = None
+        self.payload = None
+        self.results = None
+
+    def store(self, payload):
+        self.payload = payload
+
+    def sync(self):
+        pass
+
+    def new_object(self):
+        # a new object which is only accessible by proxy
+        return object()
+
+
+def make_payload(name):
+    if name == 'scalar':
+        return 1.5
+    elif name == 'list':
+        return [0.5]*16
+    for payload_name, size in PAYLOADS:
+        if payload_name == name:
+            return np.random.random(size//8)
+    raise ValueError("Unknown payload '%s'." % name)
+
+
+def payload_size(payload):
+    if isinstance(payload, np.ndarray):
+        return payload.nbytes
+    elif isinstance(payload, list):
+        return 8*len(payload)
+    return 8
+
+
+def measure(bench, kind, payload_name, duration, max_calls):
+    # runs in the child process, returns a dict of results
+    if kind == 'delete_Proxy':
+        payload = None
+        n_bytes = 0
+    else:
+        payload = make_payload(payload_name)
+        n_bytes = payload_size(payload)
+    store = bench.store
+    if kind == 'get_Proxy_attr':
+        bench.payload = payload
+        bench.sync()
+        call = lambda: bench.payload
+    elif kind == 'set_Proxy_attr':
+        call = lambda: setattr(bench, 'payload', payload)
+    elif kind == 'call_Proxy_method':
+        call = lambda: bench._call_async('store', payload).result()
+    elif kind == 'call_Proxy':
+        call = lambda: store(payload)
+    latencies = list()
+    objects = list()
+    # warm up
+    if kind != 'delete_Proxy':
+        call()
+    bench.sync()
+    start_time = time.perf_counter()
+    end_time = start_time + duration
+    while (len(latencies) < 3) or ((len(latencies) < max_calls) and (time.perf_counter() < end_time)):
+        if kind == 'delete_Proxy':
+            if len(objects) == 0:
+                # objects to delete, not timed
+                pause_time = time.perf_counter()
+                objects = [bench.new_object() for i in range(100)]
+                start_time += time.perf_counter() - pause_time
+                end_time += time.perf_counter() - pause_time
+            proxy = objects.pop()
+            # the proxy is deleted explicitly instead of when it is garbage
+            #   collected, when handles are released in batches
+            proxy._mark_do_not_delete_original()
+            t0 = time.perf_counter()
+            proxy._call_method_no_return(pythics.libproxy.DELETE_PROXY, proxy._key)
+            latencies.append(time.perf_counter() - t0)
+        else:
+            t0 = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - t0)
+    # wait until the GUI has executed calls without a return value
+    bench.sync()
+    elapsed = time.perf_counter() - start_time
+    for proxy in objects:
+        proxy._mark_do_not_delete_original()
+    latencies.sort()
+    n = len(latencies)
+    result = dict(kind=kind, payload=payload_name if kind != 'delete_Proxy' else None,
+                  bytes=n_bytes, calls=n, seconds=elapsed,
+                  calls_per_s=n/elapsed,
+                  mb_per_s=n*n_bytes/elapsed/2**20,
+                  mean_us=1e6*sum(latencies)/n,
+                  p50_us=1e6*latencies[n//2],
+                  p99_us=1e6*latencies[min(int(0.99*n), n - 1)])
+    return result
+
+
+def run_benchmarks(bench, **kwargs):
+    # the action of the benchmark app, runs in the child process
+    settings = bench.settings
+    results = list()
+    for kind in settings['kinds']:
+        if kind == 'delete_Proxy':
+            payload_names = [None]
+        else:
+            payload_names = settings['payloads']
+        for payload_name in payload_names:
+            results.append(measure(bench, kind, payload_name,
+                                   settings['duration'], settings['max_calls']))
+    bench.results = results
+
+
+def run_transport(transport, settings, batch_size, threshold):
+    # runs in the GUI process, returns a list of results
+    import pythics.headless
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'bench_proxy_calls.xml'), 'w') as f:
+        f.write(APP_XML % dict(batch_size=batch_size, threshold=threshold))
+    with open(os.path.join(directory, 'bench_proxy_app.py'), 'w') as f:
+        f.write(APP_PY % BENCHMARK_DIRECTORY)
+    runner = pythics.headless.HeadlessRunner(transport=transport)
+    try:
+        runner.open(os.path.join(directory, 'bench_proxy_calls.xml'))
+        bench = runner.controls['bench']
+        bench.settings = settings
+        runner.trigger('bench_proxy_app.run_benchmarks')
+        runner.wait_for(lambda: bench.results is not None)
+        results = bench.results
+    finally:
+        runner.close()
+    for result in results:
+        result['transport'] = transport
+    return results
+
+
+def usage():
+    print("""\
+Usage: python benchmarks/bench_proxy_calls.py [options]
+Options:
+  -h | --help       show help text then exit
+  -t | --transport  comma separated transports (default 'manager,pipe')
+  -k | --kinds      comma separated kinds of call (default all):
+                      %s
+  -p | --payloads   comma separated payloads (default all):
+                      %s
+  -d | --duration   seconds to measure each kind of call and payload
+                      (default 1.0)
+  -n | --max-calls  maximum calls of each kind and payload (default 100000)
+  -o | --output     write JSON results to this file instead of stdout
+  --batch-size      batch_size of the app, see Main (default 0)
+  --threshold       shared_memory_threshold of the app in bytes, or None
+                      (default 65536)""" % (', '.join(KINDS),
+                                            ', '.join(name for name, size in PAYLOADS)))
+
+
+if __name__ == '__main__':
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'ht:k:p:d:n:o:',
+                                   ['help', 'transport=', 'kinds=', 'payloads=', 'duration=',
+                                    'max-calls=', 'output=', 'batch-size=', 'threshold='])
+    except getopt.GetoptError as err:
+        print(err)
+        usage()
+        sys.exit(2)
+    transports = ['manager', 'pipe']
+    settings = dict(kinds=list(KINDS), payloads=[name for name, size in PAYLOADS],
+                    duration=1.0, max_calls=100000)
+    output = None
+    batch_size = 0
+    threshold = 65536
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+            sys.exit(0)
+        elif o in ('-t', '--transport'):
+            transports = a.split(',')
+        elif o in ('-k', '--kinds'):
+            settings['kinds'] = a.split(',')
+        elif o in ('-p', '--payloads'):
+            settings['payloads'] = a.split(',')
+        elif o in ('-d', '--duration'):
+            settings['duration'] = float(a)
+        elif o in ('-n', '--max-calls'):
+            settings['max_calls'] = int(a)
+        elif o in ('-o', '--output'):
+            output = a
+        elif o == '--batch-size':
+            batch_size = int(a)
+        elif o == '--threshold':
+            threshold = None if a == 'None' else int(a)
+    for kind in settings['kinds']:
+        if kind not in KINDS:
+            print("unknown kind of call '%s'" % kind)
+            sys.exit(2)
+    for payload_name in settings['payloads']:
+        if payload_name not in [name for name, size in PAYLOADS]:
+            print("unknown payload '%s'" % payload_name)
+            sys.exit(2)
+    results = list()
+    for transport in transports:
+        results.extend(run_transport(transport, settings, batch_size, threshold))
+    report = dict(python=platform.python_version(),
+                  platform=platform.platform(),
+                  numpy=np.__version__,
+                  batch_size=batch_size,
+                  shared_memory_threshold=threshold,
+                  duration=settings['duration'],
+                  results=results)
+    if output is None:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    # a summary for reading
+    print('%-8s %-18s %-12s %12s %12s %12s' % ('transport', 'kind', 'payload', 'calls/s',
+                                               'p50 (us)', 'p99 (us)'), file=sys.stderr)
+    for r in results:
+        print('%-8s %-18s %-12s %12.0f %12.1f %12.1f' % (r['transport'], r['kind'], r['payload'],
+                                                         r['calls_per_s'], r['p50_us'],
+                                                         r['p99_us']), file=sys.stderr)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# Compare the size and pickling time of the call tuples sent from a child
+#   process to the GUI in the old format (string keys and method names,
+#   objects without __slots__) and the current format (integer handles and
+#   opcodes, objects with __slots__).
+#
+# Run with:
+#   python benchmarks/bench_wire_format.py
+#
+import multiprocessing.reduction
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pythics.libproxy
+
+
+# the ProxyKey class as it was before __slots__ and integer handles
+class OldProxyKey(object):
+    def __init__(self, key, cache=False):
+        self.key = key
+        self.cache = cache
+
+
+def old_key():
+    return OldProxyKey('AutoProxy_key_' + str(type(1.0)) + '_' + str(id(object())))
+
+
+def new_key():
+    return pythics.libproxy.ProxyKey(1234)
+
+
+def calls():
+    # (description, old call tuple, new call tuple)
+    return [("set value", ('1', 'set_Proxy_attr', (old_key(), 'value', 1.5), {}),
+                          ('1', pythics.libproxy.SET_PROXY_ATTR, (new_key(), 'value', 1.5), {})),
+            ("get value", ('1', 'get_Proxy_attr', (old_key(), 'value'), {}),
+                          ('1', pythics.libproxy.GET_PROXY_ATTR, (new_key(), 'value'), {})),
+            ("call method", ('1', 'call_Proxy_method', (old_key(), 'set_data', 'c', [1.0, 2.0]), {}),
+                            ('1', pythics.libproxy.CALL_PROXY_METHOD, (new_key(), 'set_data', 'c', [1.0, 2.0]), {})),
+            ("batch of 32 sets", ('1', 'exec_Proxy_batch', ([('set_Proxy_attr', (old_key(), 'value', float(i)), {}) for i in range(32)],), {}),
+                                 ('1', pythics.libproxy.EXEC_PROXY_BATCH, ([(pythics.libproxy.SET_PROXY_ATTR, (new_key(), 'value', float(i)), {}) for i in range(32)],), {}))]
+
+
+def time_pickle(obj, number=20000):
+    dumps = multiprocessing.reduction.ForkingPickler.dumps
+    loads = multiprocessing.reduction.ForkingPickler.loads
+    data = dumps(obj)
+    t_dumps = min(timeit.repeat(lambda: dumps(obj), number=number, repeat=3))/number
+    t_loads = min(timeit.repeat(lambda: loads(data), number=number, repeat=3))/number
+    return len(data), t_dumps, t_loads
+
+
+if __name__ == '__main__':
+    print('%-18s %15s %15s %15s' % ('call', 'bytes', 'dumps (us)', 'loads (us)'))
+    for description, old, new in calls():
+        n_old, d_old, l_old = time_pickle(old)
+        n_new, d_new, l_new = time_pickle(new)
+        print('%-18s %6d -> %6d %6.2f -> %6.2f %6.2f -> %6.2f'
+              % (description, n_old, n_new, d_old*1e6, d_new*1e6, l_old*1e6, l_new*1e6))
@@ -22,41 +22,117 @@
 #
 # load libraries
 #
+import concurrent.futures
 import imp
+import importlib
 import multiprocessing
+import multiprocessing.reduction
+import os
 import sys
+import threading
+import time
 import weakref
 
+import pythics.libproxy
+import pythics.libtransport
+import pythics.proxies
+
 
 #
 # Child holds the child process data within the child process itself
 #
 class Child(object):
-    def __init__(self, process_id, call_queue, return_queue,
+    def __init__(self, process_id, call_queues, return_queues,
                  child_to_parent_call_queue_semaphore,
                  parent_to_child_call_queue,
-                 path, module_names, control_proxies):
+                 path, module_names, control_proxies, options=None,
+                 value_versions=None, instrumentation_flag=None,
+                 action_counts=None):
         self.process_id = process_id
-        self.child_to_parent_call_queue = call_queue
-        self.child_to_parent_call_return_queue = return_queue
+        # one queue of each kind for each lane
+        self.child_to_parent_call_queues = call_queues
+        self.child_to_parent_call_return_queues = return_queues
         self.child_to_parent_call_queue_semaphore = child_to_parent_call_queue_semaphore
         self.parent_to_child_call_queue = parent_to_child_call_queue
         self.path = path
         self.module_names = module_names
         self.modules = dict()
         self.control_proxies = control_proxies
+        # per-app settings, usually set through the Main control
+        if options is None:
+            options = dict()
+        self.options = options
+        # version counters for values cached by proxies
+        self.value_versions = value_versions
+        # shared with the parent process, nonzero if instrumentation is on
+        if instrumentation_flag is None:
+            instrumentation_flag = multiprocessing.RawValue('b', 0)
+        self.instrumentation_flag = instrumentation_flag
+        # shared with the parent process, the number of actions taken from
+        #   parent_to_child_call_queue and the number of actions running
+        if action_counts is None:
+            action_counts = multiprocessing.RawArray('l', 2)
+        self.action_counts = action_counts
 
     def process_loop(self):
         self.weak_proxy_refs = weakref.WeakSet()
+        # threading objects are created here, in the child process, since
+        #   the Child object may be pickled to start the process
+        # actions which may run in parallel with other actions, by name
+        self.concurrent_actions = set(self.options.get('concurrent_actions', ()))
+        self.action_executor = None
+        # statistics for each action, by name, updated from several threads
+        self.action_statistics = dict()
+        self.action_statistics_lock = threading.Lock()
+        # pool of worker processes for compute-heavy functions, created when
+        #   first used, see MainProxy.submit()
+        self.worker_pool = None
+        self.worker_pool_lock = threading.Lock()
+        # held while the process loop runs an action or a proxy call, and by
+        #   RunButtons which step in their own thread
+        self.action_lock = threading.RLock()
+        # one thread serves all Timers, created when first used
+        self.timer_scheduler = None
+        self.timer_scheduler_lock = threading.Lock()
+        self.instrumentation = pythics.libproxy.Instrumentation(self.instrumentation_flag)
         logger = multiprocessing.get_logger()
         logger.info("Starting new child process '%s'." % self.process_id)
         # pull out a few attributes for fastest access
         control_proxies = self.control_proxies
         parent_to_child_call_queue = self.parent_to_child_call_queue
+        action_lock = self.action_lock
+        # all calls to the parent process go through the call channel
+        self.call_channel = pythics.libproxy.CallChannel(self)
+        # optionally combine calls with no return value into batches
+        batch_size = self.options.get('batch_size', 0)
+        if batch_size > 1:
+            self.call_batcher = pythics.libproxy.CallBatcher(self, batch_size,
+                                    self.options.get('batch_window', 0.005))
+        else:
+            self.call_batcher = None
+        # optionally send large numpy arrays through shared memory
+        threshold = self.options.get('shared_memory_threshold', 65536)
+        if (threshold is not None) and pythics.libtransport.shared_memory_available:
+            self.shared_array_pool = pythics.libtransport.SharedArrayPool(threshold)
+        else:
+            if threshold is not None:
+                logger.warning('Shared memory array transfer requires numpy and Python 3.8 or later.')
+            self.shared_array_pool = None
         # reinitialize control proxies to give them access to parent_to_child_call_queue
-        for proxy in control_proxies.values():
+        for name, proxy in control_proxies.items():
             if hasattr(proxy, '_start'):
                 proxy._start(self)
+                proxy._instrumentation_name = name
+        # proxies which receive ProxyMessages, by proxy id, including the
+        #   proxies of controls in SubWindows
+        self.message_proxies = dict()
+        self.add_message_proxies(control_proxies)
+        message_proxies = self.message_proxies
+        # send instrumentation data to the parent process while it is on
+        self.instrumentation_stop = threading.Event()
+        self.instrumentation_thread = threading.Thread(target=self.report_instrumentation_loop)
+        self.instrumentation_thread.daemon = True
+        self.instrumentation_thread.start()
         # load required modules
         if self.path not in sys.path:
             sys.path.append(self.path)
@@ -71,22 +147,25 @@ class Child(object):
         # the event loop in the action process
         while True:
             try:
-                called_module_name, called_function_name = \
-                    parent_to_child_call_queue.get()
+                message = parent_to_child_call_queue.get()
+                called_module_name, called_function_name = message[0], message[1]
                 if called_module_name is not None:
+                    # actions may include the time they were sent
+                    if len(message) > 2:
+                        sent_time = message[2]
+                    else:
+                        sent_time = time.time()
                     try:
-                        called_module = self.modules[called_module_name]
-                        f = getattr(called_module, called_function_name)
-                        logger.debug("Child process executing '%s.%s'." % \
-                                     (called_module_name,
-                                     called_function_name))
-                        f(**control_proxies)
+                        with action_lock:
+                            self.dispatch_action(called_module_name, called_function_name, sent_time)
                     except:
                         logger.exception('Error in child_process_loop while executing call request from a control in parent process.')
+                    self.action_counts[0] += 1
                 elif called_function_name is not None:
                     # None, ProxyMessge is the signal to call a proxy method
                     m = called_function_name
-                    getattr(control_proxies[m.proxy_id], m.method)(*m.args, **m.kwargs)
+                    with action_lock:
+                        getattr(message_proxies[m.proxy_id], m.method)(*m.args, **m.kwargs)
                 else:
                     # None, None is the signal to stop the loop and exit the process
                     break
@@ -94,12 +173,194 @@ class Child(object):
                 logger.exception('Error in action process loop.')
         logger.info("Shutting down child process '%s'." % self.process_id)
         # shutting down, so cleanup
+        if self.action_executor is not None:
+            # let concurrent actions finish while proxies still work
+            self.action_executor.shutdown(wait=True)
+        if self.worker_pool is not None:
+            # work which has not started yet is abandoned
+            try:
+                self.worker_pool.shutdown(wait=True, cancel_futures=True)
+            except TypeError:
+                # before Python 3.9
+                self.worker_pool.shutdown(wait=True)
+        self.instrumentation_stop.set()
+        self.instrumentation_thread.join()
         for proxy in control_proxies.values():
             if hasattr(proxy, '_stop'):
                 proxy._stop()
+        if self.timer_scheduler is not None:
+            self.timer_scheduler.stop()
         logger.debug("Called _stop() on Control proxies in child process '%s'." % self.process_id)
+        if self.call_batcher is not None:
+            # send any remaining batched calls
+            self.call_batcher.stop()
+        if self.shared_array_pool is not None:
+            self.shared_array_pool.close()
         while len(self.weak_proxy_refs) > 0:
             proxy = self.weak_proxy_refs.pop()
             if hasattr(proxy, '_mark_deleted'):
                 proxy._mark_do_not_delete_original()
         logger.debug("Called _mark_deleted() on AutoProxies in child process '%s'." % self.process_id)
+
+    def add_message_proxies(self, proxies):
+        for proxy in proxies.values():
+            if isinstance(proxy, pythics.proxies.SubWindowProxy):
+                self.add_message_proxies(proxy)
+            elif getattr(proxy, '_proxy_id', None) is not None:
+                self.message_proxies[proxy._proxy_id] = proxy
+
+    def report_instrumentation_loop(self, interval=1.0):
+        n_reported = 0
+        while not self.instrumentation_stop.wait(interval):
+            n_records = self.instrumentation.n_records
+            if n_records != n_reported:
+                n_reported = n_records
+                try:
+                    self.call_channel.send(pythics.libproxy.REPORT_INSTRUMENTATION,
+                                           (self.instrumentation.get_stats(),), {},
+                                           pythics.libproxy.LANE_BULK)
+                except:
+                    multiprocessing.get_logger().exception('Error while reporting instrumentation.')
+
+    def dispatch_action(self, module_name, function_name, sent_time):
+        # run an action now, or start it in the thread pool if it is concurrent
+        #   returns the concurrent.futures.Future of a concurrent action
+        f = getattr(self.modules[module_name], function_name)
+        name = module_name + '.' + function_name
+        with self.action_statistics_lock:
+            self.action_counts[1] += 1
+        if getattr(f, '_pythics_concurrent', False) or (name in self.concurrent_actions):
+            multiprocessing.get_logger().debug("Child process starting concurrent '%s'." % name)
+            try:
+                return self.get_action_executor().submit(self.exec_action, name, f, sent_time, True)
+            except:
+                with self.action_statistics_lock:
+                    self.action_counts[1] -= 1
+                raise
+        else:
+            multiprocessing.get_logger().debug("Child process executing '%s'." % name)
+            self.exec_action(name, f, sent_time, False)
+
+    def get_action_executor(self):
+        if self.action_executor is None:
+            self.action_executor = concurrent.futures.ThreadPoolExecutor(
+                                        self.options.get('action_threads', 4),
+                                        thread_name_prefix='action')
+        return self.action_executor
+
+    def get_worker_pool(self):
+        with self.worker_pool_lock:
+            if self.worker_pool is None:
+                # workers are not forked from this process, which already runs
+                #   threads that may hold locks, and holds the pipes to the
+                #   parent process open
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self.worker_pool = concurrent.futures.ProcessPoolExecutor(
+                                        self.options.get('worker_processes', None),
+                                        mp_context=context)
+        return self.worker_pool
+
+    def get_timer_scheduler(self):
+        with self.timer_scheduler_lock:
+            if self.timer_scheduler is None:
+                self.timer_scheduler = pythics.proxies.TimerScheduler()
+        return self.timer_scheduler
+
+    def exec_action(self, name, f, sent_time, is_concurrent):
+        start_time = time.time()
+        with self.action_statistics_lock:
+            if name in self.action_statistics:
+                stats = self.action_statistics[name]
+            else:
+                stats = dict(calls=0, concurrent=is_concurrent, running=0, max_running=0,
+                             errors=0, wait_time=0.0, max_wait_time=0.0,
+                             run_time=0.0, max_run_time=0.0)
+                self.action_statistics[name] = stats
+            wait_time = max(start_time - sent_time, 0.0)
+            stats['calls'] += 1
+            stats['running'] += 1
+            stats['max_running'] = max(stats['max_running'], stats['running'])
+            stats['wait_time'] += wait_time
+            stats['max_wait_time'] = max(stats['max_wait_time'], wait_time)
+        error = False
+        try:
+            f(**self.control_proxies)
+        except:
+            error = True
+            multiprocessing.get_logger().exception("Error while executing action '%s'." % name)
+        finally:
+            run_time = time.time() - start_time
+            with self.action_statistics_lock:
+                self.action_counts[1] -= 1
+                stats['running'] -= 1
+                stats['run_time'] += run_time
+                stats['max_run_time'] = max(stats['max_run_time'], run_time)
+                if error:
+                    stats['errors'] += 1
+
+    def get_action_statistics(self):
+        # times in ms, averages over all calls
+        statistics = dict()
+        with self.action_statistics_lock:
+            for name, stats in self.action_statistics.items():
+                calls = max(stats['calls'], 1)
+                statistics[name] = dict(calls=stats['calls'],
+                                        concurrent=stats['concurrent'],
+                                        running=stats['running'],
+                                        max_running=stats['max_running'],
+                                        errors=stats['errors'],
+                                        mean_wait_ms=1e3*stats['wait_time']/calls,
+                                        max_wait_ms=1e3*stats['max_wait_time'],
+                                        mean_run_ms=1e3*stats['run_time']/calls,
+                                        max_run_ms=1e3*stats['max_run_time'])
+        return statistics
+
+
+#
+# decorator to allow an action to run in parallel with other actions, in a
+#   thread pool in the child process, e.g.
+#
+#   @pythics.child.concurrent_action
+#   def save_data(data, **kwargs):
+#       ...
+#
+def concurrent_action(f):
+    f._pythics_concurrent = True
+    return f
+
+
+# modules imported by pooled child processes while they wait for an app
+PRELOAD_MODULES = ['numpy', 'pythics.libproxy', 'pythics.libtransport', 'pythics.proxies']
+
+
+def pooled_process_loop(call_queues, return_queues,
+                        child_to_parent_call_queue_semaphore,
+                        parent_to_child_call_queue, value_versions,
+                        instrumentation_flag=None, action_counts=None):
+    # a pooled child process waits here until the parent process gives it an
+    #   app, see pythics.parent.ChildPool
+    for module_name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+    data = parent_to_child_call_queue.get()
+    if data == (None, None):
+        # the pool was stopped before the process was used
+        return
+    process_id, name, path, module_names, control_proxies, options = \
+        multiprocessing.reduction.ForkingPickler.loads(data)
+    multiprocessing.current_process().name = name
+    # the process was started before the app was opened, so it is not yet
+    #   in the app's directory like a new process would be
+    if path:
+        os.chdir(path)
+    child = Child(process_id, call_queues, return_queues,
+                  child_to_parent_call_queue_semaphore,
+                  parent_to_child_call_queue, path, module_names,
+                  control_proxies, options, value_versions, instrumentation_flag,
+                  action_counts)
+    child.process_loop()
@@ -87,6 +87,52 @@ class Main(pythics.libcontrol.Control):
       *label*: [ str | *None* (default) ]
         text to show in GUI or None to show nothing in GUI for this control
 
+      *batch_size*: int (default 0)
+        if greater than 1, calls to controls which return no value (e.g.
+        setting a value) are sent to the GUI in batches of up to this many
+        calls, which is much faster when updating many controls
+
+      *batch_window*: float (default 0.005)
+        maximum time in seconds that a call may wait in a batch before the
+        batch is sent to the GUI
+
+      *shared_memory_threshold*: [ int (default 65536) | None ]
+        numpy arrays of at least this many bytes which are passed to controls
+        (e.g. to plot data) are sent to the GUI through shared memory instead
+        of being copied, or None to always copy arrays
+
+      *min_window*: int (default 2)
+        minimum number of requests from the python script which may be
+        waiting for the GUI at any time
+
+      *max_window*: int (default 32)
+        maximum number of requests from the python script which may be
+        waiting for the GUI at any time; the actual number adapts between
+        min_window and max_window depending on how fast the GUI can keep up
+
+      *max_proxied_objects*: [ int (default 10000) | None ]
+        maximum number of objects in the GUI (other than controls) which are
+        kept alive for proxies in the python script; beyond this, the oldest
+        objects are only available while the GUI still uses them
+
+      *action_threads*: int (default 4)
+        maximum number of concurrent actions which may run at the same time;
+        an action is concurrent if it is given in an actions dictionary as
+        ('module.function', 'concurrent') or if the function is decorated with
+        @pythics.child.concurrent_action, all other actions run one at a time
+
+      *worker_processes*: [ int | *None* (default) ]
+        number of worker processes used to run compute-heavy functions passed
+        to main.submit() or main.map() from the python script, or None to
+        use one for each CPU; the worker processes are only started when
+        first needed
+
+      *gui_budget_ms*: [ float | *None* (default) ]
+        maximum time in milliseconds that the GUI may spend on requests from
+        the python script in each frame (about 16 ms), so that other open apps
+        get a predictable share of the GUI; with the weighted scheduler, this
+        is also the share of GUI time relative to other apps
+
       *actions*: dict
         a dictionary of key:value pairs where the key is the name of a signal
         and value is the function to run when the signal is emitted
@@ -101,7 +147,11 @@ class Main(pythics.libcontrol.Control):
         ================    ===================================================
     """
 
-    def __init__(self, parent, python_filename='', parameters_filename='', label=None, **kwargs):
+    def __init__(self, parent, python_filename='', parameters_filename='', label=None,
+                 batch_size=0, batch_window=0.005, shared_memory_threshold=65536,
+                 min_window=2, max_window=32, max_proxied_objects=10000,
+                 action_threads=4, worker_processes=None, gui_budget_ms=None,
+                 **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
         if label is None or label == '':
             self._widget = None
@@ -109,6 +159,15 @@ class Main(pythics.libcontrol.Control):
             self._widget = QtWidgets.QLabel(label)
         self._python_filename = python_filename
         self._parameters_filename = parameters_filename
+        self._batch_size = batch_size
+        self._batch_window = batch_window
+        self._shared_memory_threshold = shared_memory_threshold
+        self._min_window = min_window
+        self._max_window = max_window
+        self._max_proxied_objects = max_proxied_objects
+        self._action_threads = action_threads
+        self._worker_processes = worker_processes
+        self._gui_budget_ms = gui_budget_ms
 
     def _register(self, process, element_id, proxy_key):
         self._element_id = element_id
@@ -119,8 +178,18 @@ class Main(pythics.libcontrol.Control):
             self._process.append_initialization_command(self.actions['initialized'])
         if 'terminated' in self.actions:
             self._process.append_termination_command(self.actions['terminated'])
+        process.child_options['batch_size'] = self._batch_size
+        process.child_options['batch_window'] = self._batch_window
+        process.child_options['shared_memory_threshold'] = self._shared_memory_threshold
+        process.child_options['min_window'] = self._min_window
+        process.child_options['max_window'] = self._max_window
+        process.child_options['max_proxied_objects'] = self._max_proxied_objects
+        process.child_options['action_threads'] = self._action_threads
+        process.child_options['worker_processes'] = self._worker_processes
+        process.child_options['gui_budget_ms'] = self._gui_budget_ms
         process.default_parameter_filename = self._parameters_filename
         process.load_parameters()
+        self._proxy = pythics.proxies.MainProxy(proxy_key, enable_cache=True)
 
     def import_module(self, module):
         return importlib.import_module(module)
@@ -136,6 +205,10 @@ class Main(pythics.libcontrol.Control):
         """Save current parameters to a file. Use default parameter file if filename=None."""
         self._process.save_parameters(filename)
 
+    def get_statistics(self):
+        """Return a dictionary of statistics on communication between the python script and the GUI, including the current flow control window and GUI time used."""
+        return self._process.get_stats()
+
     def open_input_dialog_int(self, title, message, default_value=0, minimum=-2147483647, maximum=2147483647, step=1):
         """Open a dialog box for the user to enter an integer value."""
         ret = QtWidgets.QInputDialog.getInt(self._parent, title, message,
@@ -274,18 +347,40 @@ class GlobalNamespace(pythics.libcontrol.Control):
 
       *label*: [ str | *None* (default) ]
         text to show in GUI
+
+      *mode*: [ 'manager' (default) | 'shared' ]
+        'manager' gives a namespace which can hold any picklable values, each
+        read or write goes through the multiprocessing manager process;
+        'shared' gives a namespace of the numeric fields and arrays declared
+        in *fields* in shared memory, for high rates of reads and writes.
+        Reads of a field are always consistent, but each field should be
+        written by only one app at a time. The method version(name) returns
+        a number which increases each time a field is written.
+
+      *fields*: [ dict | *None* (default) ]
+        for the 'shared' mode, a dictionary of field names and numpy dtypes,
+        or (dtype, shape) tuples for arrays, e.g.
+        {'setpoint': 'float64', 'trace': ('float64', 1000)}; all apps using
+        the namespace must declare the same fields
     """
-    def __init__(self, parent, label=None, **kwargs):
+    def __init__(self, parent, label=None, mode='manager', fields=None, **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
         if label is None or label == '':
             self._widget = None
         else:
             self._widget = QtWidgets.QLabel(label)
+        if mode not in ('manager', 'shared'):
+            raise ValueError("Unknown GlobalNamespace mode '%s', should be 'manager' or 'shared'." % mode)
+        if (mode == 'shared') and not fields:
+            raise ValueError("A GlobalNamespace with mode 'shared' needs fields.")
+        self._mode = mode
+        self._fields = fields
 
     def _register(self, process, element_id, proxy_key):
         self._element_id = element_id
         self._process = process
-        self._proxy = self._process.new_global_namespace(element_id)
+        self._proxy = self._process.new_global_namespace(element_id, self._mode,
+                                                         self._fields)
 
 
 #
@@ -298,7 +393,11 @@ class GlobalAction(pythics.libcontrol.Control):
 
     The `id` parameter is the name of the control and it must match the
     'action_id' of an associated `GlobalTrigger`. The GlobalAction and
-    GlobalTrigger may be in different apps.
+    GlobalTrigger may be in different apps. Triggers are delivered straight
+    to the app, without waiting for the GUI. In the action, the `payload`
+    attribute holds the payload of the latest trigger, `sent_time` the
+    time.time() it was triggered, and get_latency_statistics() returns
+    statistics of the time from trigger to delivery.
 
     HTML parameters:
 
@@ -328,7 +427,13 @@ class GlobalAction(pythics.libcontrol.Control):
         self._element_id = element_id
         self._process = process
         self._proxy_key = proxy_key
+        if proxy_key is None:
+            # without an id, no GlobalTrigger can reach the action
+            return
         process.new_global_action(element_id, proxy_key)
+        self._proxy = pythics.proxies.GlobalActionProxy(proxy_key.key,
+                                                        self.actions.get('triggered', None),
+                                                        proxy_key)
 
 
 #
@@ -358,12 +463,18 @@ class GlobalTrigger(pythics.libcontrol.Control):
             self._widget = QtWidgets.QLabel(label)
         self.action_id = action_id
 
+    def _register(self, process, element_id, proxy_key):
+        pythics.libcontrol.Control._register(self, process, element_id, proxy_key)
+        # triggers from the action go straight to the subscribed apps
+        self._proxy = pythics.proxies.GlobalTriggerProxy(self.action_id, proxy_key)
+
     #---------------------------------------------------
     # methods below used only for access by action proxy
 
-    def trigger(self):
-        """Trigger all GlobalActions with a matching `key`."""
-        self._process.trigger_global_action(self.action_id)
+    def trigger(self, payload=None):
+        """Trigger all GlobalActions with a matching `key`, passing them
+        payload, which must be picklable."""
+        self._process.trigger_global_action(self.action_id, payload)
 
 
 #
@@ -375,6 +486,12 @@ class Timer(pythics.libcontrol.Control):
     timer can be stopped by calling the `stop` method. The timer may be started
     and stopped multiple times. Due to the mult-threaded nature of Timers, most
     control properties are read-only and can only be set by calling `start`.
+    All Timers in an app share one thread, which makes calls at fixed
+    deadlines so the interval does not drift. The `catch_up` argument of
+    `start` selects what happens when a call is due before the previous one
+    has finished: 'burst' (default), 'skip', or 'coalesce'. Call
+    `get_statistics` for the number of missed calls and the jitter of the
+    deadlines.
 
     HTML parameters:
 
@@ -407,7 +524,13 @@ class Timer(pythics.libcontrol.Control):
             action = self.actions['triggered']
         else:
             action = None
-        self._proxy = pythics.proxies.TimerProxy(action)
+        # calls queued by the timer are addressed to the proxy by its handle,
+        #   since ids may repeat in SubWindows
+        if proxy_key is None:
+            proxy_id = None
+        else:
+            proxy_id = proxy_key.key
+        self._proxy = pythics.proxies.TimerProxy(proxy_id, action)
 
     #-------------------------------------------------------------------
     # no methods for access by action proxy - all functionality in proxy
@@ -446,6 +569,7 @@ class Button(pythics.libcontrol.Control):
         'toggled'           button changes state (only if toggle=True)
         ================    ===================================================
     """
+    _value_changed_signals = ('toggled',)
 
     def __init__(self, parent, label='', toggle=False, **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
@@ -524,6 +648,8 @@ class CheckBox(pythics.libcontrol.Control):
         'toggled'           button changes state
         ================    ===================================================
     """
+    _value_changed_signals = ('stateChanged',)
+
     def __init__(self, parent, label='', **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
         self._widget = QtWidgets.QCheckBox(label)
@@ -590,6 +716,8 @@ class ChoiceBox(pythics.libcontrol.Control):
         'itemPressed'
         ======================    =============================================
     """
+    _value_changed_signals = ('itemSelectionChanged',)
+
     def __init__(self, parent, choices='[]', style='single', **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
         self._widget = QtWidgets.QListWidget()
@@ -765,6 +893,12 @@ class EventButton(pythics.libcontrol.Control):
       *toggle*: [*True* | *False*  (default) ]
         whether the button should hold the pressed state
 
+      *spin_threshold*: float (default 0)
+        wait_interval() sleeps until this many seconds before the end of the
+        interval, then checks the time in a loop for the rest, since sleeping
+        may end late by as much; larger values, e.g. 0.001, give more precise
+        intervals but keep a CPU busy
+
       *actions*: dict
         a dictionary of key:value pairs where the key is the name of a signal
         and value is the function to run when the signal is emitted
@@ -780,9 +914,10 @@ class EventButton(pythics.libcontrol.Control):
         'run'               change from unpressed to pressed (only if toggle=True)
         ================    ===================================================
     """
-    def __init__(self, parent, label='', toggle=False, **kwargs):
+    def __init__(self, parent, label='', toggle=False, spin_threshold=0, **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
         self._toggle = toggle
+        self._spin_threshold = spin_threshold
         if self._toggle:
             self._widget = QtWidgets.QToolButton()
             self._widget.setToolButtonStyle(QtCore.Qt.ToolButtonTextOnly)
@@ -799,7 +934,8 @@ class EventButton(pythics.libcontrol.Control):
         self._process = process
         self._event = multiprocessing.Event()
         self._widget.clicked.connect(self._on_click)
-        self._proxy = pythics.proxies.EventButtonProxy(self._event, proxy_key)
+        self._proxy = pythics.proxies.EventButtonProxy(self._event, self._spin_threshold,
+                                                       proxy_key)
 
     def _on_click(self, *args, **kwargs):
         if self._toggle:
@@ -982,6 +1118,8 @@ class Image(pythics.libcontrol.Control):
         'mouseRightDoubleClick'    mouse right button double clicked
         =======================    ============================================
     """
+    _lane = pythics.libproxy.LANE_BULK
+
     def __init__(self, parent, fit=False, scale=1.0, use_shared_memory=False,
                     image_dimensions=None, **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
@@ -1075,9 +1213,10 @@ class Image(pythics.libcontrol.Control):
             self.shared_image_data = multiprocessing.Array(ctypes.c_char, size)
             #size = 4*self._image_max_size[0]*self._image_max_size[1]
             #self.shared_image_data = multiprocessing.Array(ctypes.c_int8, size)
-            self._proxy = pythics.proxies.ImageWithSharedProxy(self.shared_image_data, proxy_key)
+            self._proxy = pythics.proxies.ImageWithSharedProxy(self.shared_image_data, proxy_key,
+                                                               lane=self._lane)
         else:
-            self._proxy = pythics.proxies.ImageProxy(proxy_key)
+            self._proxy = pythics.proxies.ImageProxy(proxy_key, lane=self._lane)
 
     #---------------------------------------
     # used for access by either action proxy
@@ -1407,6 +1546,10 @@ class Meter(pythics.libcontrol.Control):
 
       *precision*: [ int ] (default *0*)
         nunber of digits in labels after the decimal point
+
+      *coalesce*: [ *True* | *False* (default) ]
+        if *True*, when the value is set by an action faster than the GUI can
+        keep up, only the latest value is displayed and older ones are skipped
     """
     def __init__(self, parent, minimum=0.0, maximum=100.0, fmt='f', precision=0, **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
@@ -1517,6 +1660,10 @@ class MetricNumBox(pythics.libcontrol.Control):
       *metric_prefix:: str (default '')
         the default metric prefix
 
+      *coalesce*: [ *True* | *False* (default) ]
+        if *True*, when the value is set by an action faster than the GUI can
+        keep up, only the latest value is displayed and older ones are skipped
+
       *actions*: dict
         a dictionary of key:value pairs where the key is the name of a signal
         and value is the function to run when the signal is emitted
@@ -1529,6 +1676,8 @@ class MetricNumBox(pythics.libcontrol.Control):
         'valueChanged'      value is changed
         ================    ===================================================
     """
+    _value_changed_signals = ('valueChanged',)
+
     def __init__(self, parent,
                  read_only = False, align='left',
                  increment=1, digits=1,
@@ -1640,6 +1789,10 @@ class NumBox(pythics.libcontrol.Control):
       *suffix*: str (default '')
         text to show after the value, e.g. a unit
 
+      *coalesce*: [ *True* | *False* (default) ]
+        if *True*, when the value is set by an action faster than the GUI can
+        keep up, only the latest value is displayed and older ones are skipped
+
       *actions*: dict
         a dictionary of key:value pairs where the key is the name of a signal
         and value is the function to run when the signal is emitted
@@ -1652,6 +1805,8 @@ class NumBox(pythics.libcontrol.Control):
         'valueChanged'      value is changed
         ================    ===================================================
     """
+    _value_changed_signals = ('valueChanged',)
+
     def __init__(self, parent,
                  read_only = False, align='left',
                  increment=1, digits=1,
@@ -2178,7 +2333,7 @@ class SubWindow(pythics.libcontrol.Control):
         self._proxy = pythics.proxies.SubWindowProxy()
         for k, v in self._controls.items():
             # _register() controls in the SubWindow
-            pk = process.new_ProxyKey(v)
+            pk = process.new_ProxyKey(v, pin=True)
             if hasattr(v, '_register'):
                 v._register(process, k, pk)
             # update control_proxies
@@ -2187,10 +2342,14 @@ class SubWindow(pythics.libcontrol.Control):
                 self._proxy[k] = v._proxy
             else:
                 # use a standard AutoProxy
-                self._proxy[k] = pythics.libproxy.AutoProxy(pk, enable_cache=True)
+                self._proxy[k] = pythics.libproxy.AutoProxy(pk, enable_cache=True,
+                                        value_cache_slot=getattr(v, '_value_cache_slot', None),
+                                        lane=getattr(v, '_lane', pythics.libproxy.LANE_INTERACTIVE))
+            process.concurrent_actions.update(getattr(v, '_concurrent_actions', ()))
         for v in self._anonymous_controls:
             if hasattr(v, '_register'):
                 v._register(process, None, None)
+            process.concurrent_actions.update(getattr(v, '_concurrent_actions', ()))
 
     #--------------------------
     # the usual Control methods
@@ -2263,6 +2422,8 @@ class TextBox(pythics.libcontrol.Control):
         'undoAvailable'
          =======================    ============================================
     """
+    _value_changed_signals = ('textChanged',)
+
     def __init__(self, parent, align='left', multiline=False, read_only=False,
                  font='Consolas', font_size=10, font_weight='Normal', **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
@@ -2507,6 +2668,18 @@ class RunButton(pythics.libcontrol.Control):
         strict delay (interval=False) or as the requested time between steps in
         your run function (interval=True)
 
+      *in_thread*: [ *True* | *False* (default) ]
+        whether to run the steps of your run function in a thread of its own,
+        instead of in the loop which runs all actions; steps still never run
+        at the same time as other actions, but follow each other much faster,
+        which is needed for intervals of a few ms or less
+
+      *spin_threshold*: float (default 0)
+        the wait between steps sleeps until this many seconds before its end,
+        then checks the time in a loop for the rest, since sleeping may end
+        late by as much; larger values, e.g. 0.001, give more precise
+        intervals but keep a CPU busy
+
       *actions*: dict
         a dictionary of key:value pairs where the key is the name of a signal
         and value is the function to run when the signal is emitted
@@ -2519,7 +2692,8 @@ class RunButton(pythics.libcontrol.Control):
         'run'               button changes state from unpressed to pressed
         ================    ===================================================
     """
-    def __init__(self, parent, label='Start/Stop', interval=True, **kwargs):
+    def __init__(self, parent, label='Start/Stop', interval=True, in_thread=False,
+                 spin_threshold=0, **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, save=False, **kwargs)
         self._widget = QtWidgets.QToolButton()
         self._widget.setToolButtonStyle(QtCore.Qt.ToolButtonTextOnly)
@@ -2528,6 +2702,8 @@ class RunButton(pythics.libcontrol.Control):
         self._widget.setText(label)
         self._widget.setCheckable(True)
         self._time_interval = interval
+        self._in_thread = in_thread
+        self._spin_threshold = spin_threshold
 
     def _register(self, process, element_id, proxy_key):
         self._element_id = element_id
@@ -2536,8 +2712,16 @@ class RunButton(pythics.libcontrol.Control):
             action = self.actions['run']
         else:
             action = None
-        self._proxy = pythics.proxies.RunButtonProxy(self._element_id, action,
+        # clicks and the steps queued by the proxy are addressed to it by its
+        #   handle, since ids may repeat in SubWindows
+        if proxy_key is None:
+            proxy_id = None
+        else:
+            proxy_id = proxy_key.key
+        self._proxy_id = proxy_id
+        self._proxy = pythics.proxies.RunButtonProxy(proxy_id, action,
                                                      self._time_interval,
+                                                     self._in_thread, self._spin_threshold,
                                                      proxy_key)
         self._widget.toggled.connect(self._toggled)
 
@@ -2551,10 +2735,10 @@ class RunButton(pythics.libcontrol.Control):
     def _toggled(self):
         if not self._blocked:
             if self._widget.isChecked():
-                self._process.exec_parent_to_proxy_call_request(self._element_id,
+                self._process.exec_parent_to_proxy_call_request(self._proxy_id,
                 'start', update_button_state=False)
             else:
-                self._process.exec_parent_to_proxy_call_request(self._element_id,
+                self._process.exec_parent_to_proxy_call_request(self._proxy_id,
                 'abort')
 
     #---------------------------------------------------
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+# Run an app without a display, for benchmarks and unattended batch runs.
+#   Controls are still created and drawn (to an offscreen buffer), so the
+#   cost of drawing is included in any measurements. Use from the command
+#   line, e.g.
+#
+#     python -m pythics.headless -a sweep.run -s app.xml
+#
+#   or from python:
+#
+#     runner = pythics.headless.HeadlessRunner()
+#     runner.open('app.xml')
+#     runner.trigger('app.run')
+#     runner.wait_for(lambda: runner.controls['result'].value != '')
+#     runner.close()
+#
+
+#
+# load libraries
+#
+import getopt
+import json
+import logging
+import multiprocessing
+import os, os.path
+import sys
+import time
+
+# must be set before Qt is loaded
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from pythics.settings import _TRY_PYSIDE
+try:
+    if not _TRY_PYSIDE:
+        raise ImportError()
+    import PySide2.QtCore as _QtCore
+    import PySide2.QtGui as _QtGui
+    import PySide2.QtWidgets as _QtWidgets
+    QtCore = _QtCore
+    QtGui = _QtGui
+    QtWidgets = _QtWidgets
+    USES_PYSIDE = True
+except ImportError:
+    import PyQt5.QtCore as _QtCore
+    import PyQt5.QtGui as _QtGui
+    import PyQt5.QtWidgets as _QtWidgets
+    QtCore = _QtCore
+    QtGui = _QtGui
+    QtWidgets = _QtWidgets
+    USES_PYSIDE = False
+
+import pythics.child
+import pythics.html
+import pythics.libtransport
+import pythics.parent
+
+
+#
+# HeadlessRunner opens one app in an offscreen window and runs its actions
+#   on request
+#
+class HeadlessRunner(object):
+    def __init__(self, transport='manager', scheduler='round_robin',
+                 child_pool_size=0, size=(800, 600), manager=None):
+        self.logger = multiprocessing.get_logger()
+        self.application = QtWidgets.QApplication.instance()
+        if self.application is None:
+            self.application = QtWidgets.QApplication(sys.argv[:1])
+        if manager is None:
+            manager = multiprocessing.Manager()
+        self.manager = manager
+        self.parent_process = pythics.parent.Parent(manager, transport=transport,
+                                                    scheduler=scheduler,
+                                                    child_pool_size=child_pool_size)
+        self.parent_process.start()
+        self.size = size
+        self.window = None
+        self.child_process = None
+        # perf_counter() time when wait_idle() last saw the app busy
+        self.last_busy_time = None
+
+    def open(self, filename):
+        # open an app and start its child process
+        filename = os.path.abspath(filename)
+        os.chdir(os.path.dirname(filename))
+        self.window = pythics.html.HtmlWindow(None, 'pythics.controls', self.logger)
+        self.window.resize(*self.size)
+        anonymous_controls, controls = self.window.open_file(filename)
+        path, file_name_only = os.path.split(filename)
+        self.child_process = self.parent_process.new_child_process(path, file_name_only,
+                                                                   anonymous_controls, controls)
+        self.child_process.start()
+        # showing the window makes controls draw themselves
+        self.window.show()
+        self.process_events()
+
+    @property
+    def controls(self):
+        # the controls of the app, by id, in this process
+        return self.child_process.controls
+
+    def trigger(self, action):
+        # run an action, given as 'module.function', in the child process
+        self.child_process.exec_parent_to_child_call_request(action)
+
+    def process_events(self, t=0.0):
+        # let the GUI run for t seconds
+        end_time = time.perf_counter() + t
+        while True:
+            self.application.processEvents()
+            if time.perf_counter() >= end_time:
+                break
+            time.sleep(0.0005)
+
+    def wait_for(self, condition, timeout=None):
+        # let the GUI run until condition() returns True, returns False if
+        #   timeout seconds passed first
+        if timeout is not None:
+            end_time = time.perf_counter() + timeout
+        while not condition():
+            if (timeout is not None) and (time.perf_counter() >= end_time):
+                return False
+            self.process_events(0.001)
+        return True
+
+    def wait_idle(self, quiet_time=0.5, timeout=None):
+        # let the GUI run until no action is running in the child process and
+        #   it has sent no requests for quiet_time seconds, returns False if
+        #   timeout seconds passed first
+        child_process = self.child_process
+        flow_control = child_process.flow_control
+        state = [flow_control.received]
+        self.last_busy_time = time.perf_counter()
+
+        def idle():
+            now = time.perf_counter()
+            if ((flow_control.received != state[0])
+                or child_process.has_pending_commands()
+                or not child_process.actions_finished()):
+                state[0] = flow_control.received
+                self.last_busy_time = now
+                return False
+            return now - self.last_busy_time >= quiet_time
+
+        return self.wait_for(idle, timeout)
+
+    def get_stats(self):
+        stats = dict()
+        stats['parent'] = self.parent_process.get_stats()
+        if self.child_process is not None:
+            stats['app'] = self.child_process.get_stats()
+        return stats
+
+    def close(self):
+        if self.child_process is not None:
+            self.parent_process.stop_child_process(self.child_process)
+            self.child_process = None
+        if self.window is not None:
+            self.window.close()
+            self.window = None
+        self.parent_process.stop()
+
+
+class OptionsProcessor(object):
+    def __init__(self):
+        # configure the logger
+        self.logger = multiprocessing.log_to_stderr()
+        self.logger.setLevel(logging.WARNING)
+        self.actions = list()
+        self.transport = 'manager'
+        self.scheduler = 'round_robin'
+        self.quiet_time = 0.5
+        self.timeout = None
+        self.print_stats = False
+        self.filename = ''
+
+    def usage(self):
+        print("""\
+Usage: python -m pythics.headless [options] app.xml
+Options:
+  -h | --help       show help text then exit
+  -a | --action     action to run, as module.function; may be given more
+                      than once to run actions in order, each after the
+                      last one has finished using the controls
+  -q | --quiet      seconds without requests from the app, after the action
+                      has returned, before it is considered finished, to
+                      let the GUI catch up (default 0.5)
+  -T | --timeout    maximum seconds to wait for each action (default none)
+  -s | --stats      print statistics as JSON when finished
+  -t | --transport  selects transport between processes: 'manager' (default)
+                      or 'pipe' (faster, direct OS pipes)
+  --scheduler       selects how GUI time is shared between apps:
+                      'round_robin' (default) or 'weighted'
+  -v | --verbose    selects verbose mode
+  -d | --debug      selects debug mode""")
+
+    def options(self):
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], 'ha:q:T:st:vd',
+                                       ['help', 'action=', 'quiet=', 'timeout=', 'stats',
+                                        'transport=', 'scheduler=', 'verbose', 'debug'])
+        except getopt.GetoptError as err:
+            print(err)
+            self.usage()
+            sys.exit(2)
+        for o, a in opts:
+            if o in ('-v', '--verbose'):
+                self.logger.setLevel(logging.INFO)
+            elif o in ('-d', '--debug'):
+                self.logger.setLevel(logging.DEBUG)
+            elif o in ('-h', '--help'):
+                self.usage()
+                sys.exit(0)
+            elif o in ('-a', '--action'):
+                self.actions.append(a)
+            elif o in ('-q', '--quiet'):
+                self.quiet_time = float(a)
+            elif o in ('-T', '--timeout'):
+                self.timeout = float(a)
+            elif o in ('-s', '--stats'):
+                self.print_stats = True
+            elif o in ('-t', '--transport'):
+                if a not in pythics.libtransport.TRANSPORTS:
+                    print("unknown transport '%s'" % a)
+                    self.usage()
+                    sys.exit(2)
+                self.transport = a
+            elif o == '--scheduler':
+                if a not in pythics.parent.SCHEDULERS:
+                    print("unknown scheduler '%s'" % a)
+                    self.usage()
+                    sys.exit(2)
+                self.scheduler = a
+            else:
+                assert False, 'unhandled option'
+        if len(args) != 1:
+            self.usage()
+            sys.exit(2)
+        self.filename = args[0]
+
+
+#
+# open the app, run the actions, then exit
+#
+if __name__ == '__main__':
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        multiprocessing.set_start_method('forkserver')
+        multiprocessing.set_forkserver_preload(pythics.child.PRELOAD_MODULES)
+    cl_options_processor = OptionsProcessor()
+    cl_options_processor.options()
+    runner = HeadlessRunner(transport=cl_options_processor.transport,
+                            scheduler=cl_options_processor.scheduler)
+    status = 0
+    try:
+        runner.open(cl_options_processor.filename)
+        runner.wait_idle(cl_options_processor.quiet_time, cl_options_processor.timeout)
+        for action in cl_options_processor.actions:
+            start_time = time.perf_counter()
+            runner.trigger(action)
+            if runner.wait_idle(cl_options_processor.quiet_time, cl_options_processor.timeout):
+                # the action finished when the app was last seen busy
+                elapsed = runner.last_busy_time - start_time
+                print("action '%s' finished in %.3f s" % (action, elapsed), file=sys.stderr)
+            else:
+                print("action '%s' timed out" % action, file=sys.stderr)
+                status = 1
+        if cl_options_processor.print_stats:
+            print(json.dumps(runner.get_stats(), indent=2, sort_keys=True))
+    finally:
+        runner.close()
+    sys.exit(status)
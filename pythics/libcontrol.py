@@ -24,6 +24,8 @@
 #
 import collections
 
+import pythics.libproxy
+
 from pythics.settings import _TRY_PYSIDE
 try:
     if not _TRY_PYSIDE:
@@ -59,17 +61,39 @@ except ImportError:
 # base class for controls
 #
 class Control(object):
-    def __init__(self, parent, actions={}, save=True, user=None):
+    # names of the widget signals emitted when the value property changes,
+    #   which allows proxies to cache the value
+    _value_changed_signals = ()
+    # requests from actions to this control use this lane, controls which
+    #   mostly receive large, slow updates (like plots) should use the
+    #   bulk lane so they don't hold up the others
+    _lane = pythics.libproxy.LANE_INTERACTIVE
+
+    def __init__(self, parent, actions={}, save=True, user=None, coalesce=False):
         self._parent = parent
         self._widget = None
         self._blocked = False
-        self.actions = actions
+        # an action may be given as ('module.function', 'concurrent') to
+        #   allow it to run in parallel with other actions
+        self.actions = dict()
+        self._concurrent_actions = set()
+        for k, v in actions.items():
+            if isinstance(v, tuple):
+                v, mode = v
+                if mode == 'concurrent':
+                    self._concurrent_actions.add(v)
+                else:
+                    raise ValueError("Unknown action mode '%s', should be 'concurrent'." % mode)
+            self.actions[k] = v
         self._enabled = True
         self.save = save
         if user is not None:
             self.user = user
         else:
             self.user = None
+        # if True, a property set from an action is skipped if a newer set
+        #   of the same property is already waiting for the GUI
+        self._coalesce = coalesce
 
     def _register(self, process, element_id, proxy_key):
         self._element_id = element_id
@@ -77,6 +101,9 @@ class Control(object):
         self._proxy_key = proxy_key
         # setup Qt signals and slots from the actions dictionary
         self._connect_actions()
+        self._connect_value_changed()
+        if self._coalesce and (proxy_key is not None):
+            process.coalesced_keys.add(proxy_key.key)
         # define self._proxy only if you want a custom proxy
         #self._proxy = None
 
@@ -107,6 +134,16 @@ class Control(object):
         for k in self.actions:
             getattr(self._widget, k).connect(lambda: self._exec_action(k))
 
+    def _connect_value_changed(self):
+        if len(self._value_changed_signals) > 0:
+            self._value_cache_slot = self._process.new_value_cache_slot()
+            for s in self._value_changed_signals:
+                getattr(self._widget, s).connect(self._value_changed)
+
+    def _value_changed(self, *args):
+        # tell proxies that their cached value is out of date
+        self._process.invalidate_value_cache(self._value_cache_slot)
+
     def _exec_action(self, k):
         if self.enabled and (not self._blocked):
             if k in self.actions:
@@ -139,6 +176,8 @@ class Control(object):
 # base class for Matplotlib controls with modified setup of events
 #
 class MPLControl(Control):
+    _lane = pythics.libproxy.LANE_BULK
+
     def __init__(self, *args, **kwargs):
         Control.__init__(self, *args, **kwargs)
         # event handling
@@ -22,14 +22,107 @@
 #
 # load libraries
 #
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import copy
+import itertools
+import queue
+import threading
+import time
 import traceback
 import types
+import weakref
+
+import numpy as np
+
+
+#
+# opcodes for the requests a child process can send to its ChildInterface
+#   in the parent process, which are sent instead of method names
+#
+CALL_PROXY = 0
+GET_PROXY_ATTR = 1
+SET_PROXY_ATTR = 2
+CALL_PROXY_METHOD = 3
+CALL_PROXY_METHOD_NO_RETURN = 4
+DELETE_PROXY = 5
+EXEC_PROXY_BATCH = 6
+RELEASE_PROXIES = 7
+REPORT_INSTRUMENTATION = 8
+PUBLISH_EVENT = 9
+
+# names of the ChildInterface methods, indexed by opcode
+OPCODE_NAMES = ('call_Proxy',
+                'get_Proxy_attr',
+                'set_Proxy_attr',
+                'call_Proxy_method',
+                'call_Proxy_method_no_return',
+                'delete_Proxy',
+                'exec_Proxy_batch',
+                'release_Proxies',
+                'report_Instrumentation',
+                'publish_Event')
+
+
+#
+# priority lanes for requests from a child process to the GUI
+#   Each lane has its own queues and the GUI always executes requests in the
+#   interactive lane first, so control updates don't wait behind bulk data
+#   such as plots and images. Requests in the same lane from one child process
+#   execute in order, but requests in different lanes may not.
+#
+LANE_INTERACTIVE = 0
+LANE_BULK = 1
+LANE_NAMES = ('interactive', 'bulk')
+
+# per thread override of the lane, set with lane()
+_lane_override = threading.local()
+
+
+@contextlib.contextmanager
+def lane(name):
+    """Send all requests to the GUI made in this thread in a block through
+    the given lane ('interactive' or 'bulk'). Use like:
+
+    with pythics.libproxy.lane('bulk'):
+        do_something()
+    """
+    previous = getattr(_lane_override, 'lane', None)
+    _lane_override.lane = LANE_NAMES.index(name)
+    try:
+        yield
+    finally:
+        _lane_override.lane = previous
+
+
+#
+# types which are sent between processes without any conversion
+#
+SCALAR_TYPES = frozenset([int, float, complex, bool, str, bytes, type(None)]
+                         + list(np.sctypeDict.values()))
+
+
+def copy_cached_value(value):
+    # a cached value is handed out as a copy, unless it can't be changed, so
+    #   changing it in the script doesn't change later reads
+    if type(value) in SCALAR_TYPES:
+        return value
+    return copy.copy(value)
+
+
+def is_scalar_sequence(value):
+    # checks if a list or tuple contains only scalars without a python loop
+    return set(map(type, value)) <= SCALAR_TYPES
 
 
 #
 # Object to send method call requests to proxies
 #
 class ProxyMessage(object):
+    __slots__ = ('proxy_id', 'method', 'args', 'kwargs')
+
     def __init__(self, proxy_id, method, *args, **kwargs):
         self.proxy_id = proxy_id
         self.method = method
@@ -41,20 +134,268 @@ class ProxyMessage(object):
 # used to transfer proxy keys
 #
 class ProxyKey(object):
+    __slots__ = ('key', 'cache')
+
     def __init__(self, key, cache=False):
-        # SPEED UP USING __slots__ ?
+        # key is an integer handle
         self.key = key
         self.cache = cache
 
+    def __reduce__(self):
+        # pickle as just the class and the two values
+        return (ProxyKey, (self.key, self.cache))
+
+
+#
+# keeps the objects in the parent process which have proxies in a child
+#   process, by integer handle
+#   Handles are never reused. Objects are held with a count of proxies, and
+#   are removed when the count reaches zero. If more than max_objects are
+#   held, the oldest are demoted to weak references, so they stay available
+#   only as long as something else in the GUI keeps them alive. Pinned
+#   objects (the controls) are never demoted or removed.
+#
+class ObjectRegistry(object):
+    def __init__(self, max_objects=None):
+        self.max_objects = max_objects
+        self._last_handle = 0
+        # handle: [count, object], oldest first
+        self._objects = dict()
+        # id(object): handle, only for objects in self._objects so the
+        #   objects are alive and their ids can't be reused
+        self._handles = dict()
+        # handle: [count, weak reference]
+        self._weak = dict()
+        # handle: object
+        self._pinned = dict()
+        self._pinned_handles = dict()
+        self.n_registered = 0
+        self.n_released = 0
+        self.n_demoted = 0
+        self.n_lost = 0
+
+    def register(self, obj, pin=False):
+        object_id = id(obj)
+        if pin:
+            if object_id not in self._pinned_handles:
+                self._last_handle += 1
+                self._pinned_handles[object_id] = self._last_handle
+                self._pinned[self._last_handle] = obj
+            return self._pinned_handles[object_id]
+        if object_id in self._pinned_handles:
+            return self._pinned_handles[object_id]
+        if object_id in self._handles:
+            handle = self._handles[object_id]
+            self._objects[handle][0] += 1
+            return handle
+        self._last_handle += 1
+        handle = self._last_handle
+        self._handles[object_id] = handle
+        self._objects[handle] = [1, obj]
+        self.n_registered += 1
+        if (self.max_objects is not None) and (len(self._objects) > self.max_objects):
+            self._demote_oldest()
+        return handle
+
+    def _demote_oldest(self):
+        handle = next(iter(self._objects))
+        count, obj = self._objects.pop(handle)
+        self._handles.pop(id(obj))
+        self.n_demoted += 1
+        try:
+            if type(obj) is types.MethodType:
+                # a bound method lives as long as its object
+                ref = weakref.WeakMethod(obj)
+            else:
+                ref = weakref.ref(obj)
+        except TypeError:
+            # can't be weakly referenced
+            self.n_lost += 1
+        else:
+            self._weak[handle] = [count, ref]
+
+    def lookup(self, handle):
+        if handle in self._pinned:
+            return self._pinned[handle]
+        if handle in self._objects:
+            return self._objects[handle][1]
+        if handle in self._weak:
+            obj = self._weak[handle][1]()
+            if obj is not None:
+                return obj
+            self._weak.pop(handle)
+            self.n_lost += 1
+        raise KeyError('The object with handle %d is no longer available in the GUI process.' % handle)
+
+    def release(self, handle):
+        if handle in self._objects:
+            entry = self._objects[handle]
+            entry[0] -= 1
+            if entry[0] == 0:
+                self._objects.pop(handle)
+                self._handles.pop(id(entry[1]))
+                self.n_released += 1
+        elif handle in self._weak:
+            entry = self._weak[handle]
+            entry[0] -= 1
+            if entry[0] == 0:
+                self._weak.pop(handle)
+                self.n_released += 1
+
+    def get_stats(self):
+        return dict(live=len(self._objects),
+                    weak=len(self._weak),
+                    pinned=len(self._pinned),
+                    max_objects=self.max_objects,
+                    registered=self.n_registered,
+                    released=self.n_released,
+                    demoted=self.n_demoted,
+                    lost=self.n_lost)
+
+
+#
+# histogram of times, in buckets which double in width starting from 1 us
+#
+class LatencyHistogram(object):
+    N_BUCKETS = 32
+
+    def __init__(self):
+        self.counts = [0]*self.N_BUCKETS
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, t):
+        i = min(int(t*1e6).bit_length(), self.N_BUCKETS - 1)
+        self.counts[i] += 1
+        self.n += 1
+        self.total += t
+        if t > self.max:
+            self.max = t
+
+    def percentile(self, p):
+        # upper edge of the bucket holding the p-th percentile, in seconds
+        if self.n == 0:
+            return 0.0
+        limit = p*self.n/100.0
+        n = 0
+        for i, count in enumerate(self.counts):
+            n += count
+            if n >= limit:
+                return min(2**i*1e-6, self.max)
+        return self.max
+
+    def get_stats(self):
+        # times in ms, buckets as [upper edge, count] for non-empty buckets
+        stats = dict()
+        stats['count'] = self.n
+        stats['mean_ms'] = 1e3*self.total/self.n if self.n > 0 else 0.0
+        stats['max_ms'] = 1e3*self.max
+        stats['p50_ms'] = 1e3*self.percentile(50)
+        stats['p99_ms'] = 1e3*self.percentile(99)
+        stats['buckets'] = [[2**i*1e-3, count] for i, count in enumerate(self.counts) if count > 0]
+        return stats
+
+
+def describe_call(f, args):
+    # short name for a request, e.g. 'set_Proxy_attr value'
+    if type(f) is not int:
+        return str(f)
+    name = OPCODE_NAMES[f]
+    if ((f in (GET_PROXY_ATTR, SET_PROXY_ATTR, CALL_PROXY_METHOD, CALL_PROXY_METHOD_NO_RETURN))
+        and (len(args) > 1)):
+        return name + ' ' + str(args[1])
+    return name
+
+
+#
+# low-overhead instrumentation of requests between processes
+#   flag is a shared multiprocessing.RawValue, so instrumentation is switched
+#   on and off in all processes at once. When off, instrumented code only
+#   checks the enabled property.
+#
+class Instrumentation(object):
+    def __init__(self, flag):
+        self._flag = flag
+        self._lock = threading.Lock()
+        self._histograms = dict()
+        # [count, total time] by proxy name, then by call description
+        self._calls = dict()
+        self.n_records = 0
+
+    @property
+    def enabled(self):
+        return self._flag.value != 0
+
+    def add_time(self, histogram, t):
+        with self._lock:
+            if histogram not in self._histograms:
+                self._histograms[histogram] = LatencyHistogram()
+            self._histograms[histogram].add(t)
+            self.n_records += 1
+
+    def count(self, proxy, call, t=0.0):
+        with self._lock:
+            calls = self._calls.setdefault(proxy, dict())
+            if call in calls:
+                entry = calls[call]
+            else:
+                entry = [0, 0.0]
+                calls[call] = entry
+            entry[0] += 1
+            entry[1] += t
+            self.n_records += 1
+
+    def get_stats(self):
+        with self._lock:
+            histograms = dict((name, h.get_stats()) for name, h in self._histograms.items())
+            calls = dict()
+            for proxy, proxy_calls in self._calls.items():
+                calls[proxy] = dict((call, dict(count=entry[0], total_ms=1e3*entry[1]))
+                                    for call, entry in proxy_calls.items())
+        return dict(histograms=histograms, calls=calls)
+
 
 #
 # use to transfer callback functions from child to parent process
 #
 class FunctionProxy(object):
+    __slots__ = ('name',)
+
     def __init__(self, f):
         self.name = f.__module__ + '.' + f.__name__
 
 
+# FunctionProxy for each function which has been sent, to avoid creating
+#   a new one each time
+_function_proxies = weakref.WeakKeyDictionary()
+
+
+def get_function_proxy(f):
+    try:
+        return _function_proxies[f]
+    except KeyError:
+        fp = FunctionProxy(f)
+        _function_proxies[f] = fp
+        return fp
+
+
+#
+# used to transfer a large numpy array through shared memory
+#
+class SharedArray(object):
+    __slots__ = ('name', 'shape', 'dtype', 'released')
+
+    def __init__(self, name, shape, dtype, released=()):
+        # name of the shared memory segment holding the data
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        # names of segments the child process has unlinked since the last
+        #   SharedArray was sent, which the parent process should unmap
+        self.released = released
+
+
 #
 # classes to signal exceptions across threads
 #
@@ -67,48 +408,344 @@ class CrossProcessException(Exception):
     pass
 
 
+#
+# a future for the return value of a call to the parent process
+#   The return value is read when result() is called, so several calls can
+#   be waiting in the parent process at the same time. It can also be awaited
+#   in an asyncio coroutine.
+#
+class ProxyFuture(concurrent.futures.Future):
+    # (proxy name, call description, send time) if instrumented
+    _instrumented = None
+
+    def __init__(self, channel, lane=LANE_INTERACTIVE, convert=None):
+        concurrent.futures.Future.__init__(self)
+        self._channel = channel
+        self._lane = lane
+        # function applied to the value returned from the parent process
+        self._convert = convert
+
+    def _set_return(self, r):
+        if self._instrumented is not None:
+            proxy, call, start_time = self._instrumented
+            t = time.perf_counter() - start_time
+            instrumentation = self._channel.instrumentation
+            instrumentation.add_time('round_trip', t)
+            instrumentation.count(proxy, call, t)
+        if type(r) == CrossProcessExceptionProxy:
+            message = "An exception '%s' was raised in the parent process." % r.message
+            self.set_exception(CrossProcessException(message))
+        elif self._convert is not None:
+            try:
+                self.set_result(self._convert(r))
+            except Exception as e:
+                self.set_exception(e)
+        else:
+            self.set_result(r)
+
+    def result(self, timeout=None):
+        if not self.done():
+            self._channel.wait_for(self, timeout)
+        return concurrent.futures.Future.result(self, 0)
+
+    def exception(self, timeout=None):
+        if not self.done():
+            self._channel.wait_for(self, timeout)
+        return concurrent.futures.Future.exception(self, 0)
+
+    def _wait_briefly(self):
+        try:
+            self._channel.wait_for(self, 0.1)
+        except concurrent.futures.TimeoutError:
+            pass
+
+    async def _wait_async(self):
+        # wait for the return value in another thread so the event loop
+        #   is not blocked, a little at a time so a cancelled await does
+        #   not hold on to the thread
+        loop = asyncio.get_event_loop()
+        while not self.done():
+            await loop.run_in_executor(None, self._wait_briefly)
+        return concurrent.futures.Future.result(self, 0)
+
+    def __await__(self):
+        return self._wait_async().__await__()
+
+
+#
+# sends calls from all proxies and threads in a child process to the parent
+#   process and matches up return values, which come back in each lane in
+#   the order the calls were sent
+#
+class CallChannel(object):
+    def __init__(self, process):
+        self._process_id = process.process_id
+        # one queue of each kind for each lane
+        self._child_to_parent_call_queues = process.child_to_parent_call_queues
+        self._child_to_parent_call_return_queues = process.child_to_parent_call_return_queues
+        self._child_to_parent_call_queue_semaphore = process.child_to_parent_call_queue_semaphore
+        # futures waiting for a return value, in the order the calls were sent
+        self._pending = tuple(collections.deque() for q in self._child_to_parent_call_queues)
+        # held while sending a call and adding its future to self._pending
+        self._send_lock = threading.RLock()
+        # held by the thread reading return values in each lane
+        self._receive_locks = tuple(threading.RLock() for q in self._child_to_parent_call_queues)
+        # handles of deleted proxies, sent to the parent process together
+        #   once there are this many
+        self._releases = collections.deque()
+        self.release_batch_size = 64
+        self._release_batches = itertools.count()
+        self.instrumentation = process.instrumentation
+
+    def acquire_credit(self):
+        # wait until this process has few enough requests left in the queue
+        #  semaphore is released by GUI process once request has executed
+        #  while waiting with calls pending, read any return values which
+        #  are ready so they don't pile up unread, otherwise just block
+        semaphore = self._child_to_parent_call_queue_semaphore
+        while True:
+            if not any(self._pending):
+                semaphore.acquire()
+                return
+            if semaphore.acquire(True, 0.01):
+                return
+            self._receive_ready()
+
+    def release(self, key):
+        # called by AutoProxy.__del__, which may run at any time in any
+        #   thread, so just save the handle
+        self._releases.append(key.key)
+
+    def _send_releases(self):
+        handles = list()
+        try:
+            while True:
+                handles.append(self._releases.popleft())
+        except IndexError:
+            pass
+        if len(handles) > 0:
+            # the handles may have been used in any lane, so the batch is
+            #   sent in every lane and the parent process releases them when
+            #   it has arrived in all of them, after any calls which use them
+            batch = next(self._release_batches)
+            n_lanes = len(self._child_to_parent_call_queues)
+            for lane in range(n_lanes):
+                self.acquire_credit()
+                self._child_to_parent_call_queues[lane].put(
+                    (self._process_id, RELEASE_PROXIES,
+                     (handles if lane == LANE_INTERACTIVE else [], batch, n_lanes), {}))
+
+    def send(self, f, args, kwargs, lane=LANE_INTERACTIVE):
+        # send a call with no return value
+        if len(self._releases) >= self.release_batch_size:
+            self._send_releases()
+        self.acquire_credit()
+        self._child_to_parent_call_queues[lane].put((self._process_id, f, args, kwargs))
+
+    def publish(self, topic, payload=None):
+        # publish an event to the subscribers in all processes, see
+        #   pythics.parent.EventBus
+        #   events are delivered by the queue watcher without waiting for
+        #   the GUI, so they don't need a credit
+        self._child_to_parent_call_queues[LANE_INTERACTIVE].put(
+            (self._process_id, PUBLISH_EVENT, (topic, payload, time.time()), {}))
+
+    def submit(self, f, args, kwargs, convert=None, lane=LANE_INTERACTIVE, future=None):
+        # send a call with a return value, returns a ProxyFuture
+        if future is None:
+            future = ProxyFuture(self, lane, convert)
+        if len(self._releases) >= self.release_batch_size:
+            self._send_releases()
+        self.acquire_credit()
+        with self._send_lock:
+            self._child_to_parent_call_queues[lane].put((self._process_id, f, args, kwargs))
+            self._pending[lane].append(future)
+        return future
+
+    def _receive_next(self, lane, timeout=None):
+        # must be called with self._receive_locks[lane] held
+        try:
+            r = self._child_to_parent_call_return_queues[lane].get(True, timeout)
+        except queue.Empty:
+            raise concurrent.futures.TimeoutError()
+        with self._send_lock:
+            future = self._pending[lane].popleft()
+        future._set_return(r)
+
+    def _receive_ready(self):
+        for lane in range(len(self._pending)):
+            if self._receive_locks[lane].acquire(False):
+                try:
+                    while ((len(self._pending[lane]) > 0)
+                           and (not self._child_to_parent_call_return_queues[lane].empty())):
+                        self._receive_next(lane)
+                finally:
+                    self._receive_locks[lane].release()
+
+    def wait_for(self, future, timeout=None):
+        # read return values in order until future has its value, raises
+        #   concurrent.futures.TimeoutError if it takes longer than timeout
+        lane = future._lane
+        receive_lock = self._receive_locks[lane]
+        if timeout is None:
+            with receive_lock:
+                while not future.done():
+                    self._receive_next(lane)
+            return
+        deadline = time.monotonic() + timeout
+        if not receive_lock.acquire(True, max(timeout, 0)):
+            raise concurrent.futures.TimeoutError()
+        try:
+            while not future.done():
+                self._receive_next(lane, max(deadline - time.monotonic(), 0))
+        finally:
+            receive_lock.release()
+
+
+#
+# collects calls with no return value from all proxies in a child process
+#   and sends them to the parent process together as a single request
+#   for each lane
+#
+class CallBatcher(object):
+    def __init__(self, process, size=32, window=0.005):
+        self._process_id = process.process_id
+        self._call_channel = process.call_channel
+        # send the batch when it holds this many calls
+        self._size = size
+        # or this many seconds after the first call was added
+        self._window = window
+        self._calls = tuple(list() for name in LANE_NAMES)
+        self._n_calls = 0
+        self._first_time = 0.0
+        self._flushing = False
+        self._stopped = False
+        # reentrant since AutoProxy.__del__ may add a call at any time
+        self._lock = threading.RLock()
+        self._condition = threading.Condition(self._lock)
+        self._thread = threading.Thread(target=self._thread_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def append(self, f, args, kwargs, lane=LANE_INTERACTIVE):
+        with self._lock:
+            self._calls[lane].append((f, args, kwargs))
+            self._n_calls += 1
+            if self._n_calls == 1:
+                self._first_time = time.monotonic()
+                # wake up the thread to start timing the flush window
+                self._condition.notify()
+            elif len(self._calls[lane]) >= self._size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        # must be called with self._lock held
+        #   don't flush again if a call is added while flushing
+        if self._flushing or (self._n_calls == 0):
+            return
+        self._flushing = True
+        try:
+            for lane in range(len(self._calls)):
+                calls = self._calls[lane][:]
+                if len(calls) > 0:
+                    del self._calls[lane][:]
+                    self._n_calls -= len(calls)
+                    # a whole batch takes only one place in the queue
+                    self._call_channel.send(EXEC_PROXY_BATCH, (calls,), {}, lane)
+        finally:
+            self._flushing = False
+
+    def _thread_loop(self):
+        with self._lock:
+            while not self._stopped:
+                if self._n_calls == 0:
+                    self._condition.wait()
+                else:
+                    remaining = self._first_time + self._window - time.monotonic()
+                    if remaining > 0:
+                        self._condition.wait(remaining)
+                    else:
+                        self._flush()
+
+    def stop(self):
+        with self._lock:
+            self._flush()
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+
 #
 # base class for control proxies
 #
 class ControlProxy(object):
-    def __init__(self, key):
+    # name used for instrumentation, the control id for control proxies
+    _instrumentation_name = 'object'
+
+    def __init__(self, key, lane=LANE_INTERACTIVE):
         self._key = key
+        # the lane for requests to the GUI, unless overridden with lane()
+        self._lane = lane
 
     def _start(self, process):
         self._process = process
         self._process_id = self._process.process_id
-        self._child_to_parent_call_queue = self._process.child_to_parent_call_queue
-        self._child_to_parent_call_return_queue = self._process.child_to_parent_call_return_queue
-        self._child_to_parent_call_queue_semaphore = self._process.child_to_parent_call_queue_semaphore
+        self._call_channel = self._process.call_channel
+        # None if calls are not batched
+        self._call_batcher = self._process.call_batcher
+        # None if arrays are always pickled
+        self._shared_array_pool = self._process.shared_array_pool
+        self._instrumentation = self._process.instrumentation
+
+    def _get_lane(self):
+        override = getattr(_lane_override, 'lane', None)
+        if override is None:
+            return self._lane
+        return override
 
     def _call_method(self, f, *args, **kwargs):
-        # wait until this process has few enough requests left in the queue
-        #  semaphore is released by GUI process once request has executed
-        self._child_to_parent_call_queue_semaphore.acquire()
-        self._child_to_parent_call_queue.put((self._process_id, f, args, kwargs))
-        r = self._child_to_parent_call_return_queue.get()
-        # check if r is an exception
-        #  if it is and exception, re-raise it in child process (here)
-        if type(r) == CrossProcessExceptionProxy:
-            message = "An exception '%s' was raised in the parent process." % r.message
-            raise CrossProcessException(message)
-        else:
-            return r
+        # if the parent process raises an exception, it is re-raised here
+        #  as a CrossProcessException
+        return self._submit(f, args, kwargs).result()
+
+    def _submit(self, f, args, kwargs, convert=None):
+        if self._call_batcher is not None:
+            # send any batched calls first
+            self._call_batcher.flush()
+        if self._instrumentation.enabled:
+            # the round trip is measured when the return value arrives
+            future = ProxyFuture(self._call_channel, self._get_lane(), convert)
+            future._instrumented = (self._instrumentation_name, describe_call(f, args),
+                                    time.perf_counter())
+            return self._call_channel.submit(f, args, kwargs, lane=self._get_lane(),
+                                             future=future)
+        return self._call_channel.submit(f, args, kwargs, convert, self._get_lane())
 
     def _call_method_no_return(self, f, *args, **kwargs):
-        # wait until this process has few enough requests left in the queue
-        #  semaphore is released by parent process once request has executed
-        self._child_to_parent_call_queue_semaphore.acquire()
-        self._child_to_parent_call_queue.put((self._process_id, f, args, kwargs))
+        if self._instrumentation.enabled:
+            self._instrumentation.count(self._instrumentation_name, describe_call(f, args))
+        if self._call_batcher is not None:
+            self._call_batcher.append(f, args, kwargs, self._get_lane())
+        else:
+            self._call_channel.send(f, args, kwargs, self._get_lane())
 
     def _get_class(self):
         return None
         
 
 class AutoProxy(ControlProxy):
-    def __init__(self, key, enable_cache=False):
-        ControlProxy.__init__(self, key)
+    def __init__(self, key, enable_cache=False, value_cache_slot=None,
+                 lane=LANE_INTERACTIVE):
+        ControlProxy.__init__(self, key, lane)
         self._enable_cache = enable_cache
+        # if not None, the value attribute is cached until the version in
+        #   this slot is changed by the parent process
+        self._value_cache_slot = value_cache_slot
+        self._value_cache = None
         # this tells Pythics not to try to delete the original object later
         #   this is changed when _start is called
         self._do_not_delete_original = True
@@ -120,6 +757,9 @@ class AutoProxy(ControlProxy):
         # store weak reference for cleanup when closing
         self._process.weak_proxy_refs.add(self)
         self._do_not_delete_original = False
+        self._value_versions = self._process.value_versions
+        if self._value_versions is None:
+            self._value_cache_slot = None
 
     def __getattr__(self, name):
         if name.startswith('_'):
@@ -127,8 +767,10 @@ class AutoProxy(ControlProxy):
             #return object.__getattribute__(self, name)
             # shouldn't have gotten here if it is defined
             raise AttributeError("'%s' is not defined." % name)
+        elif (name == 'value') and (self._value_cache_slot is not None):
+            return self._get_attr_async(name).result()
         else:
-            r = self._call_method('get_Proxy_attr',
+            r = self._call_method(GET_PROXY_ATTR,
                                   self._key, name)
             ret = self._keys_to_proxies(r)
             if self._enable_cache and (type(r) == ProxyKey) and (r.cache):
@@ -140,23 +782,57 @@ class AutoProxy(ControlProxy):
         if name.startswith('_'):
             object.__setattr__(self, name, value)
         else:
+            if name == 'value':
+                self._value_cache = None
             v = self._proxies_to_keys(value)
-            self._call_method_no_return('set_Proxy_attr',
+            self._call_method_no_return(SET_PROXY_ATTR,
                                         self._key, name, v)
 
+    def _get_attr_async(self, name):
+        if (name == 'value') and (self._value_cache_slot is not None):
+            # read the version before the value so a change while the value
+            #   is being fetched is not missed
+            version = self._value_versions[self._value_cache_slot]
+            cache = self._value_cache
+            if (cache is not None) and (cache[0] == version):
+                future = ProxyFuture(self._call_channel, self._lane)
+                future.set_result(copy_cached_value(cache[1]))
+                return future
+            def convert(r):
+                r = self._keys_to_proxies(r)
+                self._value_cache = (version, r)
+                return copy_cached_value(r)
+            return self._submit(GET_PROXY_ATTR, (self._key, name), {}, convert)
+        return self._submit(GET_PROXY_ATTR, (self._key, name), {},
+                            self._keys_to_proxies)
+
+    def _get_async(self):
+        return AsyncAttributes(self)
+
+    # proxy._async.name returns a ProxyFuture for proxy.name, so several
+    #   attributes can be requested before waiting for any of them
+    _async = property(_get_async)
+
+    def _call_async(self, method_name, *args, **kwargs):
+        # call a method, returns a ProxyFuture for the return value
+        a = self._proxies_to_keys(args)
+        kwa = self._proxies_to_keys(kwargs)
+        return self._submit(CALL_PROXY_METHOD, (self._key, method_name) + a,
+                            kwa, self._keys_to_proxies)
+
     def _mark_do_not_delete_original(self):
         self._do_not_delete_original = True
 
     def __del__(self):
         if not self._do_not_delete_original:
-            self._call_method_no_return('delete_Proxy', self._key)
+            self._call_channel.release(self._key)
             self._do_not_delete_original = True
 
     def __call__(self, *args, **kwargs):
         # this is here for AutoProxies of functions
         a = self._proxies_to_keys(args)
         kwa = self._proxies_to_keys(kwargs)
-        r = self._call_method('call_Proxy', self._key, *a, **kwa)
+        r = self._call_method(CALL_PROXY, self._key, *a, **kwa)
         return self._keys_to_proxies(r)
 
     def _to_key(self):
@@ -165,16 +841,23 @@ class AutoProxy(ControlProxy):
     def _proxies_to_keys(self, value):
         # convert proxies to keys to send to parent process
         t = type(value)
-        if t is AutoProxy:
+        if t in SCALAR_TYPES:
+            return value
+        elif t is AutoProxy:
             # some other type that has to be accessed by proxy
             #  because it may not be picklable
             return value._to_key()
         elif t is list:
+            if is_scalar_sequence(value):
+                # copy since the call may be sent later in a batch
+                return list(value)
             r = list()
             for v in value:
                 r.append(self._proxies_to_keys(v))
             return r
         elif t is tuple:
+            if is_scalar_sequence(value):
+                return value
             r = list()
             for v in value:
                 r.append(self._proxies_to_keys(v))
@@ -185,7 +868,10 @@ class AutoProxy(ControlProxy):
                 r[k] = self._proxies_to_keys(v)
             return r
         elif t is types.FunctionType:
-            return FunctionProxy(value)
+            return get_function_proxy(value)
+        elif (t is np.ndarray) and (self._shared_array_pool is not None):
+            # large arrays are sent through shared memory
+            return self._shared_array_pool.pack(value)
         else:
             # hopefully just a picklable type
             return value
@@ -193,12 +879,17 @@ class AutoProxy(ControlProxy):
     def _keys_to_proxies(self, value):
         # convert keys from parent process to proxies
         t = type(value)
-        if t is ProxyKey:
+        if t in SCALAR_TYPES:
+            return value
+        elif t is ProxyKey:
             # some other type that has to be accessed by proxy
             #  because it may not be picklable
-            r = AutoProxy(value)
+            r = AutoProxy(value, lane=self._lane)
             r._start(*self._start_args, **self._start_kwargs)
             return r
+        elif (t is list or t is tuple) and is_scalar_sequence(value):
+            # no ProxyKeys, and value was just unpickled so it can be used
+            return value
         elif t is list:
             # have to check for ProxyKeys in the list
             r = list()
@@ -222,60 +913,60 @@ class AutoProxy(ControlProxy):
             return value
 
     def __dir__(self):
-        c_dir = self._call_method('call_Proxy_method', self._key, '_dir')
+        c_dir = self._call_method(CALL_PROXY_METHOD, self._key, '_dir')
         p_dir = list(vars(self).keys())
         return c_dir + p_dir
 
     def _get__doc__(self):
-        return self._call_method('get_Proxy_attr', self._key, '__doc__')
+        return self._call_method(GET_PROXY_ATTR, self._key, '__doc__')
 
     __doc__ = property(_get__doc__)
 
     def _get_class(self):
         # useful for getting information about the original class,
         #  used for extracting help information
-        r = self._call_method('get_Proxy_attr', self._key, '__class__')
+        r = self._call_method(GET_PROXY_ATTR, self._key, '__class__')
         return self._keys_to_proxies(r)
 
     ###########################################################################
     # EXTRA METHODS THAT NEED WORK
 
     def __len__(self):
-        r = self._call_method('call_Proxy_method', self._key, '__len__')
+        r = self._call_method(CALL_PROXY_METHOD, self._key, '__len__')
         return r
 
     def __getitem__(self, key):
-        r = self._call_method('call_Proxy_method', self._key, '__getitem__', key)
+        r = self._call_method(CALL_PROXY_METHOD, self._key, '__getitem__', key)
         return r
 
     def __setitem__(self, key, value):
-        r = self._call_method('call_Proxy_method', self._key, '__setitem__', key, value)
+        r = self._call_method(CALL_PROXY_METHOD, self._key, '__setitem__', key, value)
         return r
 
     def __delitem__(self, key):
-        r = self._call_method('call_Proxy_method', self._key, '__delitem__', key)
+        r = self._call_method(CALL_PROXY_METHOD, self._key, '__delitem__', key)
         return r
 
     # __iter__ UNTESTED!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
     def _get__iter__(self):
-        r = self._call_method('get_Proxy_attr', self._key, '__iter__')
+        r = self._call_method(GET_PROXY_ATTR, self._key, '__iter__')
         return self._keys_to_proxies(r)
 
     __iter__ = property(_get__iter__)
 
 #    # __name__ UNTESTED!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
 #    def _get__name__(self):
-#        r = self._call_method('get_Proxy_attr', self._key, '__name__')
+#        r = self._call_method(GET_PROXY_ATTR, self._key, '__name__')
 #        return r
 #
 #    __name__ = property(_get__name__)
 
     def __repr__(self):
-        r = self._call_method('call_Proxy_method', self._key, '__repr__')
+        r = self._call_method(CALL_PROXY_METHOD, self._key, '__repr__')
         return r
 
     def __str__(self):
-        r = self._call_method('call_Proxy_method', self._key, '__str__')
+        r = self._call_method(CALL_PROXY_METHOD, self._key, '__str__')
         return r
 
 
@@ -290,5 +981,18 @@ class PartialAutoProxy(AutoProxy):
             object.__setattr__(self, name, value)
         else:
             v = self._proxies_to_keys(value)
-            self._call_method_no_return('set_Proxy_attr',
+            self._call_method_no_return(SET_PROXY_ATTR,
                                         self._key, name, v)
+
+
+#
+# helper for AutoProxy._async
+#
+class AsyncAttributes(object):
+    def __init__(self, proxy):
+        self._proxy = proxy
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError("'%s' is not defined." % name)
+        return self._proxy._get_attr_async(name)
@@ -0,0 +1,712 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+# load libraries
+#
+import collections
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.reduction
+import queue
+import threading
+import time
+import weakref
+
+try:
+    import numpy as np
+    import multiprocessing.resource_tracker
+    import multiprocessing.shared_memory
+    shared_memory_available = True
+except ImportError:
+    # requires numpy and Python 3.8 or later
+    shared_memory_available = False
+
+import pythics.libproxy
+
+
+# the available transports, the first is the default
+TRANSPORTS = ('manager', 'pipe')
+
+
+#
+# A queue built directly on an OS pipe
+#   Unlike a multiprocessing.Manager().Queue(), each put() and get() goes
+#   straight through the pipe instead of making a round trip through the
+#   manager server process. Like all multiprocessing synchronization objects,
+#   it must be passed to child processes when they are started. Each pipe
+#   connects the parent process to one child process, so a child process
+#   which dies while writing can only break its own pipe.
+#
+class PipeQueue(object):
+    def __init__(self):
+        self._reader, self._writer = multiprocessing.Pipe(duplex=False)
+        self._read_lock = multiprocessing.Lock()
+        self._write_lock = multiprocessing.Lock()
+        self._feeder = None
+
+    def __getstate__(self):
+        # the feeder thread stays in the process which started it
+        return (self._reader, self._writer, self._read_lock, self._write_lock)
+
+    def __setstate__(self, state):
+        self._reader, self._writer, self._read_lock, self._write_lock = state
+        self._feeder = None
+
+    def put(self, obj, block=True, timeout=None):
+        # pickle outside of the lock so other writers are not held up
+        data = multiprocessing.reduction.ForkingPickler.dumps(obj)
+        if self._feeder is not None:
+            self._feeder.put(data)
+        else:
+            with self._write_lock:
+                self._writer.send_bytes(data)
+
+    def put_nowait(self, obj):
+        self.put(obj, False)
+
+    def get(self, block=True, timeout=None):
+        if not block:
+            timeout = 0.0
+        with self._read_lock:
+            if (timeout is not None) and (not self._reader.poll(timeout)):
+                raise queue.Empty
+            data = self._reader.recv_bytes()
+        return multiprocessing.reduction.ForkingPickler.loads(data)
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def empty(self):
+        return not self._reader.poll()
+
+    def start_feeder(self):
+        # from now on put() hands the data to a thread which writes it to the
+        #   pipe, so put() never blocks when the reader is slow, stuck or dead
+        self._feeder = PipeFeeder(self._writer, self._write_lock)
+
+    def close_reader(self):
+        # called once the other process has its copy of the pipe, so the
+        #   writer gets an error instead of blocking if that process dies
+        self._reader.close()
+
+    def close_writer(self):
+        # called once the other process has its copy of the pipe, so the
+        #   reader gets EOFError if that process dies
+        self._writer.close()
+
+    def close(self):
+        # close the ends still open in this process
+        if self._feeder is not None:
+            # the feeder closes the writer when it is done with it
+            self._feeder.close()
+        elif not self._writer.closed:
+            self._writer.close()
+        if not self._reader.closed:
+            self._reader.close()
+
+
+#
+# PipeFeeder writes to a pipe in a thread of its own, like the feeder thread
+#   of a multiprocessing.Queue, so the GUI thread never waits for a child
+#   process to read a large return value. Data for a reader which has died
+#   is discarded.
+#
+class PipeFeeder(object):
+    def __init__(self, writer, write_lock):
+        self._writer = writer
+        self._write_lock = write_lock
+        self._buffer = collections.deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._closed = False
+        self.broken = False
+        self._thread = threading.Thread(target=self._thread_loop, name='PipeFeeder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, data):
+        with self._condition:
+            if self._closed or self.broken:
+                return
+            self._buffer.append(data)
+            self._condition.notify()
+
+    def _thread_loop(self):
+        while True:
+            with self._condition:
+                while (len(self._buffer) == 0) and (not self._closed):
+                    self._condition.wait()
+                if len(self._buffer) == 0:
+                    break
+                data = self._buffer.popleft()
+            try:
+                with self._write_lock:
+                    self._writer.send_bytes(data)
+            except (OSError, ValueError):
+                # the reader has gone, or the pipe was closed
+                with self._condition:
+                    self.broken = True
+                    self._buffer.clear()
+                break
+        try:
+            self._writer.close()
+        except OSError:
+            pass
+
+    def close(self):
+        # data already put is still written, unless the reader has gone
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+
+#
+# PipeQueueMux reads the PipeQueues of one lane from all child processes in
+#   the parent process, so a queue watcher thread can get() from it like
+#   from a single queue. A PipeQueue is dropped when its child process closes
+#   the pipe, by exiting or dying. put() is only for requests from the parent
+#   process itself, like the signal for the queue watcher to stop.
+#
+class PipeQueueMux(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        # PipeQueue by reader connection
+        self._queues = dict()
+        self._ready = collections.deque()
+        self._local = collections.deque()
+        # wakes up get() when a PipeQueue is added or put() is called
+        self._wake_reader, self._wake_writer = multiprocessing.Pipe(duplex=False)
+
+    def add(self, pipe_queue):
+        with self._lock:
+            self._queues[pipe_queue._reader] = pipe_queue
+        self._wake_writer.send_bytes(b'')
+
+    def put(self, obj, block=True, timeout=None):
+        with self._lock:
+            self._local.append(obj)
+        self._wake_writer.send_bytes(b'')
+
+    def put_nowait(self, obj):
+        self.put(obj, False)
+
+    def get(self, block=True, timeout=None):
+        # only called from one thread
+        if not block:
+            timeout = 0.0
+        if timeout is not None:
+            end_time = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if len(self._local) > 0:
+                    return self._local.popleft()
+            while len(self._ready) > 0:
+                reader = self._ready.popleft()
+                try:
+                    data = reader.recv_bytes()
+                except (EOFError, OSError):
+                    # the child process has exited, or died part way
+                    #   through writing a request
+                    self._drop(reader)
+                    continue
+                return multiprocessing.reduction.ForkingPickler.loads(data)
+            with self._lock:
+                readers = list(self._queues)
+            if timeout is None:
+                wait_time = None
+            else:
+                wait_time = max(end_time - time.monotonic(), 0.0)
+            ready = multiprocessing.connection.wait(readers + [self._wake_reader], wait_time)
+            for reader in ready:
+                if reader is self._wake_reader:
+                    while self._wake_reader.poll():
+                        self._wake_reader.recv_bytes()
+                else:
+                    self._ready.append(reader)
+            if (len(ready) == 0) and (timeout is not None):
+                raise queue.Empty
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def _drop(self, reader):
+        with self._lock:
+            self._queues.pop(reader, None)
+        reader.close()
+
+    def __len__(self):
+        # the number of PipeQueues being read
+        with self._lock:
+            return len(self._queues)
+
+
+#
+# A queue which discards everything put in it, for replaying requests
+#   without a child process
+#
+class DiscardQueue(object):
+    def put(self, obj, block=True, timeout=None):
+        pass
+
+    def put_nowait(self, obj):
+        pass
+
+
+#
+# Transport creates the queues used to communicate between
+#   the parent process and the child processes
+#
+class Transport(object):
+    def __init__(self, kind, manager):
+        if kind not in TRANSPORTS:
+            raise ValueError("Unknown transport '%s', should be one of %s." % (kind, str(TRANSPORTS)))
+        self.kind = kind
+        self.manager = manager
+        # held from creating the queues for a child process until it has
+        #   started and child_started() has closed its ends of the pipes, so
+        #   a process forked meanwhile from another thread (e.g. by
+        #   pythics.parent.ChildPool) doesn't inherit them, which would keep
+        #   the pipes open after the child process exits
+        self.start_lock = threading.Lock()
+
+    def new_call_queue(self):
+        # queue read by the parent process for the latency-critical calls
+        #   from all child processes, one for each lane
+        if self.kind == 'pipe':
+            return PipeQueueMux()
+        else:
+            return self.manager.Queue()
+
+    def new_child_call_queue(self, call_queue):
+        # queue a child process sends calls on, which are read from
+        #   call_queue, see new_call_queue()
+        if self.kind == 'pipe':
+            pipe_queue = PipeQueue()
+            call_queue.add(pipe_queue)
+            return pipe_queue
+        else:
+            return call_queue
+
+    def new_return_queue(self):
+        # queue for return values from the parent process to a child process
+        if self.kind == 'pipe':
+            return PipeQueue()
+        else:
+            return self.manager.Queue()
+
+    def new_action_queue(self):
+        # queue for action requests to a child process; a put() should never
+        #   block the GUI while the child process is busy
+        if self.kind == 'pipe':
+            return multiprocessing.Queue()
+        else:
+            return self.manager.Queue()
+
+    def child_started(self, call_queues, return_queues):
+        # called once a child process has been started with these queues,
+        #   closes the ends of the pipes which only the child process uses
+        if self.kind == 'pipe':
+            for q in call_queues:
+                q.close_writer()
+            for q in return_queues:
+                q.close_reader()
+                q.start_feeder()
+
+    def child_stopped(self, return_queues):
+        # called once a child process has stopped, the ends of its call
+        #   queues are closed when they are read to the end
+        if self.kind == 'pipe':
+            for q in return_queues:
+                q.close()
+
+
+#
+# Credit-based flow control of requests from a child process to the GUI
+#   The child process takes one credit from the semaphore for each request
+#   and the parent process gives credits back as requests are executed. The
+#   number of credits in circulation (the window) grows by one each time a
+#   full window of requests executes without a backlog in the GUI and shrinks
+#   by one, by not giving a credit back, each time a backlog builds up. The
+#   semaphore is not a Manager object so no credit needs a Manager round trip.
+#
+class FlowControl(object):
+    def __init__(self, min_window=2, max_window=32, credits=None):
+        if min_window < 1 or max_window < min_window:
+            raise ValueError('Flow control window limits should satisfy 1 <= min_window <= max_window.')
+        self.min_window = min_window
+        self.max_window = max_window
+        self.window = min_window
+        if credits is None:
+            self.credits = multiprocessing.Semaphore(min_window)
+        else:
+            # an existing semaphore with no credits, which was already
+            #   passed to a pooled child process
+            self.credits = credits
+            for i in range(min_window):
+                self.credits.release()
+        # received is only changed in the queue watcher thread and executed
+        #   is only changed in the GUI thread
+        self.received = 0
+        self.executed = 0
+        self.max_backlog = 0
+        self._uncongested = 0
+
+    def request_received(self):
+        self.received += 1
+
+    def request_executed(self):
+        self.executed += 1
+        # requests received but still waiting for the GUI
+        backlog = self.received - self.executed
+        self.max_backlog = max(self.max_backlog, backlog)
+        if (2*backlog > self.window) and (self.window > self.min_window):
+            # the GUI is falling behind, keep this credit
+            self.window -= 1
+            self._uncongested = 0
+            return
+        self.credits.release()
+        if backlog <= 1:
+            self._uncongested += 1
+            if (self._uncongested >= self.window) and (self.window < self.max_window):
+                # the GUI is keeping up, add a credit
+                self.window += 1
+                self._uncongested = 0
+                self.credits.release()
+
+    def get_stats(self):
+        return dict(window=self.window,
+                    min_window=self.min_window,
+                    max_window=self.max_window,
+                    received=self.received,
+                    executed=self.executed,
+                    backlog=self.received - self.executed,
+                    max_backlog=self.max_backlog)
+
+
+#
+# Transfer of large numpy arrays through shared memory
+#
+#   Each shared memory segment starts with a header. The first byte of the
+#   header is nonzero while the segment holds an array that the parent process
+#   may still be using. The child process sets it when it copies an array into
+#   the segment and the parent process clears it when the last view of the
+#   array is garbage collected, so no extra messages are needed to recycle
+#   segments. When the child process unlinks a segment, its name is sent
+#   along with the next SharedArray so the parent process can unmap it too.
+#
+SHARED_ARRAY_HEADER_SIZE = 64
+
+
+#
+# SharedArrayPool is used in the child process to move arrays into recycled
+#   shared memory segments
+#
+class SharedArrayPool(object):
+    def __init__(self, threshold=65536, max_total_size=2**30):
+        # arrays smaller than this many bytes are pickled as usual
+        self.threshold = threshold
+        # never hold more than this many bytes of shared memory
+        self.max_total_size = max_total_size
+        self._segments = list()
+        self._total_size = 0
+        # names of unlinked segments not yet sent to the parent process
+        self._released = list()
+        self._lock = threading.Lock()
+
+    def pack(self, array):
+        # returns a SharedArray to send in place of the array, or the array
+        #   itself if it should be pickled as usual
+        if (array.nbytes < self.threshold) or array.dtype.hasobject:
+            return array
+        with self._lock:
+            segment = self._get_free_segment(array.nbytes)
+            if segment is None:
+                return array
+            segment.buf[0] = 1
+            released = tuple(self._released)
+            del self._released[:]
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf,
+                          offset=SHARED_ARRAY_HEADER_SIZE)
+        view[...] = array
+        return pythics.libproxy.SharedArray(segment.name, array.shape,
+                                            array.dtype, released)
+
+    def _get_free_segment(self, nbytes):
+        # must be called with self._lock held
+        # use the smallest free segment which is large enough
+        best = None
+        for segment in self._segments:
+            if ((segment.buf[0] == 0)
+                and (segment.size - SHARED_ARRAY_HEADER_SIZE >= nbytes)
+                and ((best is None) or (segment.size < best.size))):
+                best = segment
+        if best is not None:
+            return best
+        # otherwise make a new segment, rounding up to a power of 2 so it
+        #   can be reused for arrays of similar size
+        size = SHARED_ARRAY_HEADER_SIZE + nbytes
+        size = max(2**(size - 1).bit_length(), 2**16)
+        if self._total_size + size > self.max_total_size:
+            # free up space by removing segments not in use
+            for segment in list(self._segments):
+                if segment.buf[0] == 0:
+                    self._remove_segment(segment)
+            if self._total_size + size > self.max_total_size:
+                return None
+        segment = multiprocessing.shared_memory.SharedMemory(create=True, size=size)
+        self._segments.append(segment)
+        self._total_size += segment.size
+        return segment
+
+    def _remove_segment(self, segment):
+        self._segments.remove(segment)
+        self._total_size -= segment.size
+        self._released.append(segment.name)
+        segment.close()
+        segment.unlink()
+
+    def close(self):
+        with self._lock:
+            for segment in list(self._segments):
+                self._remove_segment(segment)
+
+
+def _attach_shared_memory(name):
+    # attach to an existing segment without registering it with the
+    #   resource tracker of this process, which would otherwise unlink
+    #   the segment when this process exits
+    try:
+        return multiprocessing.shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13
+        register = multiprocessing.resource_tracker.register
+        multiprocessing.resource_tracker.register = lambda name, rtype: None
+        try:
+            return multiprocessing.shared_memory.SharedMemory(name=name)
+        finally:
+            multiprocessing.resource_tracker.register = register
+
+
+def _release_shared_array(buf):
+    # called when the last view of a shared array is garbage collected
+    try:
+        buf[0] = 0
+    except ValueError:
+        # the segment was already closed
+        pass
+
+
+#
+# SharedArrayMapper is used in the parent process to turn each SharedArray
+#   into a numpy array which is a view into shared memory, without copying
+#
+class SharedArrayMapper(object):
+    def __init__(self):
+        self._segments = dict()
+        # segments unlinked by the child process which could not be closed
+        #   yet because a control still holds a view of an array
+        self._closing = list()
+
+    def _get_segment(self, shared_array):
+        if shared_array.released or self._closing:
+            self._release_segments(shared_array.released)
+        name = shared_array.name
+        if name in self._segments:
+            segment = self._segments[name]
+        else:
+            segment = _attach_shared_memory(name)
+            self._segments[name] = segment
+        return segment
+
+    def _release_segments(self, names):
+        closing = self._closing
+        self._closing = list()
+        for name in names:
+            if name in self._segments:
+                closing.append(self._segments.pop(name))
+        for segment in closing:
+            try:
+                segment.close()
+            except BufferError:
+                # try again when the next SharedArray arrives
+                self._closing.append(segment)
+
+    def view(self, shared_array):
+        segment = self._get_segment(shared_array)
+        array = np.ndarray(shared_array.shape, dtype=shared_array.dtype,
+                           buffer=segment.buf, offset=SHARED_ARRAY_HEADER_SIZE)
+        # the segment is recycled only after all views of the array are gone,
+        #   so controls may keep a reference to the array
+        finalizer = weakref.finalize(array, _release_shared_array, segment.buf)
+        finalizer.atexit = False
+        return array
+
+    def copy(self, shared_array):
+        # returns a copy of the array, without releasing the segment when
+        #   the copy is garbage collected
+        segment = self._get_segment(shared_array)
+        array = np.ndarray(shared_array.shape, dtype=shared_array.dtype,
+                           buffer=segment.buf, offset=SHARED_ARRAY_HEADER_SIZE)
+        return array.copy()
+
+    def close(self):
+        for segment in list(self._segments.values()) + self._closing:
+            try:
+                segment.close()
+            except BufferError:
+                # a control still holds a view of an array, the memory will
+                #   be released when the view is garbage collected
+                pass
+        self._segments = dict()
+        self._closing = list()
+
+
+#
+# SharedNamespace is a namespace of typed numeric fields and arrays in shared
+#   memory, for passing data between apps at high rates without going through
+#   the multiprocessing.Manager. Each field has its own sequence counter,
+#   used as a seqlock: a writer makes the counter odd while it writes, and a
+#   reader retries until it has read the field with the same even counter
+#   before and after. A field should only be written by one app at a time.
+#
+class SharedNamespace(object):
+    # names which can't be used for fields
+    RESERVED_NAMES = ('version',)
+
+    def __init__(self, fields, name=None):
+        # fields is a dict of field name: dtype or (dtype, shape), the
+        #   namespace is created if name is None, otherwise the existing
+        #   namespace with that name is used
+        if not shared_memory_available:
+            raise RuntimeError('A shared GlobalNamespace requires numpy and Python 3.8 or later.')
+        layout, size = self.get_layout(fields)
+        object.__setattr__(self, '_fields', fields)
+        object.__setattr__(self, '_layout', layout)
+        if name is None:
+            segment = multiprocessing.shared_memory.SharedMemory(create=True, size=size)
+            segment.buf[:size] = bytes(size)
+        else:
+            segment = _attach_shared_memory(name)
+        object.__setattr__(self, '_segment', segment)
+        sequences = dict()
+        data = dict()
+        for field_name, dtype, shape, offset in layout:
+            sequences[field_name] = np.ndarray((), dtype=np.uint64, buffer=segment.buf, offset=offset)
+            data[field_name] = np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=offset + 8)
+        object.__setattr__(self, '_sequences', sequences)
+        object.__setattr__(self, '_data', data)
+        # held by writers in this process, and by a reader which has waited
+        #   too long for a write to finish, since a writer in another thread
+        #   may give up the GIL part way through every write
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    @classmethod
+    def get_layout(cls, fields):
+        # returns a list of (name, dtype, shape, offset) and the total size,
+        #   each field is its sequence counter followed by the data, aligned
+        #   to 8 bytes
+        layout = list()
+        offset = 0
+        for name in sorted(fields):
+            if name.startswith('_') or (name in cls.RESERVED_NAMES):
+                raise ValueError("'%s' can't be used as a field name." % name)
+            spec = fields[name]
+            if isinstance(spec, tuple):
+                dtype, shape = spec
+                if isinstance(shape, int):
+                    shape = (shape,)
+            else:
+                dtype, shape = spec, ()
+            dtype = np.dtype(dtype)
+            if dtype.kind not in 'biufc':
+                raise ValueError("Field '%s' must be numeric, not '%s'." % (name, dtype))
+            nbytes = dtype.itemsize*int(np.prod(shape, dtype=np.int64))
+            layout.append((name, dtype, tuple(shape), offset))
+            offset += 8 + 8*((nbytes + 7)//8)
+        return layout, max(offset, 8)
+
+    def __reduce__(self):
+        # other processes attach to the same shared memory
+        return (SharedNamespace, (self._fields, self._segment.name))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError("'%s' is not defined." % name)
+        try:
+            sequence = self._sequences[name]
+            data = self._data[name]
+        except KeyError:
+            raise AttributeError("GlobalNamespace has no field '%s'." % name)
+        lock = None
+        n_tries = 0
+        try:
+            while True:
+                before = int(sequence)
+                if before & 1 == 0:
+                    if data.ndim == 0:
+                        value = data.item()
+                    else:
+                        value = data.copy()
+                    if int(sequence) == before:
+                        return value
+                n_tries += 1
+                if n_tries % 1000 == 0:
+                    if lock is None:
+                        # keep writers in this process from starting again
+                        lock = self._lock
+                        lock.acquire()
+                    else:
+                        # let the writer finish
+                        time.sleep(0)
+                    if n_tries > 1000000:
+                        raise RuntimeError("Field '%s' of GlobalNamespace is stuck being written." % name)
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def __setattr__(self, name, value):
+        try:
+            sequence = self._sequences[name]
+            data = self._data[name]
+        except KeyError:
+            raise AttributeError("GlobalNamespace has no field '%s'." % name)
+        with self._lock:
+            n = int(sequence)
+            sequence[...] = n + 1
+            try:
+                data[...] = value
+            finally:
+                sequence[...] = n + 2
+
+    def version(self, name):
+        # a number which increases each time the field is written, to check
+        #   for new data without reading it
+        return int(self._sequences[name]) >> 1
+
+    def __dir__(self):
+        return list(self._fields) + list(self.RESERVED_NAMES)
+
+    def close(self, unlink=False):
+        object.__setattr__(self, '_sequences', dict())
+        object.__setattr__(self, '_data', dict())
+        self._segment.close()
+        if unlink:
+            self._segment.unlink()
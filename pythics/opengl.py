@@ -94,6 +94,8 @@ class ScopePlot(pythics.libcontrol.Control):
       *use_opengl*: [ *True* | *False* (default) ]
         Whether to render with opengl for hardware acceleration (if available).
     """
+    _lane = pythics.libproxy.LANE_BULK
+
     def __init__(self, parent, antialias=True, aspect_locked=False, grid_color=(200,200,200,255), grid_line_width=1, use_opengl=False, **kwargs):
         pythics.libcontrol.Control.__init__(self, parent, **kwargs)
         self._widget = ScopePlotCanvas(antialias=antialias, aspect_locked=aspect_locked, grid_color=grid_color, grid_line_width=grid_line_width, use_opengl=use_opengl)
@@ -22,11 +22,16 @@
 #
 # load libraries
 #
+import collections
 import multiprocessing
+import multiprocessing.reduction
+import os.path
 import pickle
+import threading
+import queue
+import time
 
 import numpy as np
-import collections
 
 from pythics.settings import _TRY_PYSIDE
 try:
@@ -60,44 +65,177 @@ except ImportError:
 
 import pythics.child
 import pythics.libproxy
+import pythics.libtransport
+import pythics.recording
  
 
+# the available schedulers for sharing GUI time between child processes,
+#   the first is the default
+SCHEDULERS = ('round_robin', 'weighted')
+
+
 #
 # Parent is the main object which manages everything in Pythics.
 #   You should usually create only one instance
 #
 class Parent(QtCore.QObject):
-    def __init__(self, manager):
+    def __init__(self, manager, transport='manager', watcher_batch_size=64,
+                 watcher_batch_time=0.002, frame_time=0.016, scheduler='round_robin',
+                 child_pool_size=0):
         QtCore.QObject.__init__(self)
         self.multiprocess_manager = manager
-        self.child_to_parent_call_queue = self.multiprocess_manager.Queue()
+        # the transport selects how queues between processes are built:
+        #   'manager' - multiprocessing.Manager queues (default)
+        #   'pipe' - direct OS pipes, no round trip through the manager
+        self.transport = pythics.libtransport.Transport(transport, manager)
+        # one queue for each lane, see pythics.libproxy.LANE_NAMES
+        self.child_to_parent_call_queues = tuple(self.transport.new_call_queue()
+                                                 for name in pythics.libproxy.LANE_NAMES)
+        # True while the GUI thread has been asked to execute pending commands
+        self.wake_pending = False
+        # commands are executed in frames of this many seconds, after which
+        #   the GUI handles other events
+        self.frame_time = frame_time
+        # how GUI time in each frame is shared between child processes:
+        #   'round_robin' - each child process executes one command in turn
+        #   'weighted' - the child process which has used the smallest
+        #       fraction of its budget (gui_budget_ms) goes next
+        if scheduler not in SCHEDULERS:
+            raise ValueError("Unknown scheduler '%s', should be one of %s." % (scheduler, str(SCHEDULERS)))
+        self.scheduler = scheduler
+        self.n_frames = 0
+        # number of idle child processes to keep ready for opening apps
+        self.child_pool_size = child_pool_size
+        self.child_pool = None
+        # if not None, all requests from child processes are recorded,
+        #   see start_recording()
+        self.recorder = None
+        # shared with all child processes, nonzero if instrumentation is on,
+        #   see set_instrumentation()
+        self.instrumentation_flag = multiprocessing.RawValue('b', 0)
+        # the queue watcher passes commands which are already waiting to the
+        #   GUI together, up to this many commands or this many seconds
+        self.watcher_batch_size = watcher_batch_size
+        self.watcher_batch_time = watcher_batch_time
         self.global_namespaces = dict()
-        self.global_actions = dict()
+        # delivers events from GlobalTriggers to GlobalActions
+        self.event_bus = EventBus(self)
         self.last_child_process_index = 0
         self.child_processes = dict()
         self.logger = multiprocessing.get_logger()
 
     def start(self):
-        # thread to relay command requests from child processes to GUI
-        self.watcher_thread = QtCore.QThread()
-        self.watcher = QueueWatcher(self, self.child_to_parent_call_queue, self.logger)
-        self.watcher.moveToThread(self.watcher_thread)
-        self.watcher.call_requested.connect(self.exec_child_to_parent_call_request,
+        # threads to relay command requests from child processes to GUI,
+        #   one for each lane
+        self.watcher_threads = list()
+        self.watchers = list()
+        for lane, q in enumerate(self.child_to_parent_call_queues):
+            watcher_thread = QtCore.QThread()
+            watcher = QueueWatcher(self, q, lane, self.logger,
+                                   self.watcher_batch_size, self.watcher_batch_time)
+            watcher.moveToThread(watcher_thread)
+            watcher.calls_requested.connect(self.exec_pending_commands,
                                             type=QtCore.Qt.QueuedConnection)
-        self.watcher_thread.started.connect(self.watcher.watch_queue)
-        self.watcher_thread.start()
+            watcher_thread.started.connect(watcher.watch_queue)
+            watcher_thread.start()
+            self.watcher_threads.append(watcher_thread)
+            self.watchers.append(watcher)
+        if self.child_pool_size > 0:
+            self.child_pool = ChildPool(self, self.child_pool_size)
+            self.child_pool.fill()
 
     # USED FOR ALTERNATIVE SIGNALLING METHOD USING POST_EVENT
     #def customEvent(self, command_event):
     #    self.exec_child_to_parent_call_request(command_event.command)
 
-    def exec_child_to_parent_call_request(self, command):
+    def request_wake(self):
+        # called by the queue watchers after passing commands to child
+        #   processes, returns True if the GUI thread should be signaled
+        if not self.wake_pending:
+            self.wake_pending = True
+            return True
+        return False
+
+    def exec_pending_commands(self):
+        # executes commands from the queue watchers in the GUI thread for one
+        #   frame, sharing the time between child processes
+        self.wake_pending = False
+        start_time = time.perf_counter()
+        end_time = start_time + self.frame_time
+        processes = list(self.child_processes.values())
+        if len(processes) == 0:
+            return
+        # start with a different child process in each frame
+        self.n_frames += 1
+        i = self.n_frames % len(processes)
+        processes = processes[i:] + processes[:i]
+        for p in processes:
+            p.frame_gui_time = 0.0
+        active = [p for p in processes if p.has_pending_commands()]
+        busy = list(active)
+        while (len(active) > 0) and (time.perf_counter() < end_time):
+            if self.scheduler == 'weighted':
+                selected = [min(active, key=lambda p: p.frame_gui_time/p.get_frame_share(self.frame_time))]
+            else:
+                selected = active
+            for p in selected:
+                t = time.perf_counter()
+                command, lane = p.next_pending_command()
+                self.exec_child_to_parent_call_request(command, lane)
+                p.add_gui_time(time.perf_counter() - t)
+            active = [p for p in active if p.has_pending_commands() and not p.is_over_budget()]
+        for p in busy:
+            p.end_frame()
+        if any(p.has_pending_commands() for p in processes):
+            # let the GUI handle other events, like repainting, before
+            #   continuing, waiting for the next frame if child processes
+            #   have used up their budgets
+            delay = max(0, int(1000*(end_time - time.perf_counter())))
+            self.wake_pending = True
+            QtCore.QTimer.singleShot(delay, self.exec_pending_commands)
+
+    def start_recording(self, filename):
+        # record all requests from child processes to a file, which can be
+        #   replayed with pythics.recording.Replayer
+        if self.recorder is not None:
+            self.stop_recording()
+        self.recorder = pythics.recording.Recorder(self, filename)
+
+    def stop_recording(self):
+        recorder = self.recorder
+        if recorder is not None:
+            self.recorder = None
+            recorder.close()
+
+    def set_instrumentation(self, enabled):
+        # switch on or off the measurement of requests between processes in
+        #   all child processes, the statistics are kept when switched off
+        self.instrumentation_flag.value = 1 if enabled else 0
+
+    def is_instrumented(self):
+        return self.instrumentation_flag.value != 0
+
+    def get_instrumentation_stats(self):
+        # instrumentation statistics for each child process by name
+        stats = dict()
+        for p in self.child_processes.values():
+            stats[p.name] = p.get_instrumentation_stats()
+        return stats
+
+    def get_stats(self):
+        # statistics for each child process by name
+        stats = dict()
+        for p in self.child_processes.values():
+            stats[p.name] = p.get_scheduler_stats()
+        return stats
+
+    def exec_child_to_parent_call_request(self, command, lane=pythics.libproxy.LANE_INTERACTIVE):
         # executes a command in a control requested by a child process
         # protect from exceptions to avoid interrupting program
         try:
             process_id, function_name, args, kwargs = command
             #self.logger.debug('Executing %s.' % str((process_id, function_name, args, kwargs)))
-            self.child_processes[process_id].exec_child_to_parent_call_request(function_name, args, kwargs)
+            self.child_processes[process_id].exec_child_to_parent_call_request(function_name, args, kwargs, lane)
         except:
             self.logger.exception('Error in Parent.execute_child_to_parent_call_request while executing call request from child process in parent process.')
 
@@ -105,43 +243,50 @@ class Parent(QtCore.QObject):
         new_index = self.last_child_process_index + 1
         new_id = str(new_index)
         self.last_child_process_index = new_index
+        filename = os.path.join(path, name)
         name = name + '_' + new_id
         new_process = ChildInterface(self,
-                                     self.child_to_parent_call_queue,
+                                     self.child_to_parent_call_queues,
                                      self.multiprocess_manager,
+                                     self.transport,
                                      new_id,
-                                     path, name, anonymous_controls, controls)
+                                     path, name, anonymous_controls, controls,
+                                     filename)
         self.child_processes[new_id] = new_process
         return new_process
 
-    def get_global_namespace(self, name):
+    def get_global_namespace(self, name, mode='manager', fields=None):
+        # mode is 'manager' for a multiprocessing.Manager().Namespace() or
+        #   'shared' for a pythics.libtransport.SharedNamespace with the
+        #   given fields, which must be the same in every app
         if name in self.global_namespaces:
             g = self.global_namespaces[name]
-        else:
+            shared = isinstance(g, pythics.libtransport.SharedNamespace)
+            if shared != (mode == 'shared'):
+                raise ValueError("GlobalNamespace '%s' was already created with a different mode." % name)
+            if shared and (pythics.libtransport.SharedNamespace.get_layout(fields)[0]
+                           != g._layout):
+                raise ValueError("GlobalNamespace '%s' was already created with different fields." % name)
+        elif mode == 'shared':
+            g = pythics.libtransport.SharedNamespace(fields)
+            self.global_namespaces[name] = g
+        elif mode == 'manager':
             g = self.multiprocess_manager.Namespace()
             self.global_namespaces[name] = g
+        else:
+            raise ValueError("Unknown GlobalNamespace mode '%s', should be 'manager' or 'shared'." % mode)
         return g
 
-    def trigger_global_action(self, trigger_id):
-        if trigger_id in self.global_actions:
-            actions = self.global_actions[trigger_id]
-            for a in actions:
-                process_id, proxy_key = a
-                if process_id in self.child_processes:
-                    self.child_processes[process_id].exec_trigger_request(proxy_key)
-                else:
-                    # that process is not around anymore, so remove the action
-                    actions.remove(a)
-        else:
-            self.logger.warning("No action found for global trigger '%s'." % trigger_id)
+    def trigger_global_action(self, trigger_id, payload=None):
+        self.event_bus.publish(trigger_id, payload, time.time())
 
     def new_global_action(self, process_id, trigger_id, proxy_key):
-        if trigger_id in self.global_actions:
-            self.global_actions[trigger_id].append((process_id, proxy_key))
-        else:
-            self.global_actions[trigger_id] = [(process_id, proxy_key)]
+        # events are addressed to the proxy by its handle, since ids may
+        #   repeat in SubWindows
+        self.event_bus.subscribe(trigger_id, process_id, proxy_key.key)
 
     def stop_child_process(self, process):
+        self.event_bus.unsubscribe_process(process.process_id)
         process.stop()
         self.child_processes.pop(process.process_id)
 
@@ -149,43 +294,83 @@ class Parent(QtCore.QObject):
         # stop the ChildProcesses
         for p in self.child_processes.values():
             p.stop()
-        # stop the QueueWatcher
-        self.child_to_parent_call_queue.put((None, None, None, None))
-        self.logger.debug('Signaled QueueWatcher to stop.')
-        self.watcher_thread.quit()
-        # wait 2 seconds for the thread to die
-        success = self.watcher_thread.wait(2000)
-        self.logger.debug('QueueWatcher stopped? ' + str(success))
+        if self.child_pool is not None:
+            self.child_pool.stop()
+        self.stop_recording()
+        for g in self.global_namespaces.values():
+            if isinstance(g, pythics.libtransport.SharedNamespace):
+                g.close(unlink=True)
+        # stop the QueueWatchers
+        for q in self.child_to_parent_call_queues:
+            q.put((None, None, None, None))
+        self.logger.debug('Signaled QueueWatchers to stop.')
+        for watcher_thread in self.watcher_threads:
+            watcher_thread.quit()
+            # wait 2 seconds for the thread to die
+            success = watcher_thread.wait(2000)
+            self.logger.debug('QueueWatcher stopped? ' + str(success))
 
 
 #
 # object which gets moved to the parent process queue watching thread
 #
 class QueueWatcher(QtCore.QObject):
-    def __init__(self, parent, queue_to_watch, logger, *args):
+    def __init__(self, parent, queue_to_watch, lane, logger, batch_size=64,
+                 batch_time=0.002, *args):
         super(QueueWatcher, self).__init__(*args)
         self.parent = parent
         self.watched_queue = queue_to_watch
+        self.lane = lane
         self.logger = logger
+        self.batch_size = batch_size
+        self.batch_time = batch_time
 
-    # define a Qt signal 'call_requested' that takes a tuple argument
-    call_requested = Signal(tuple, name='call_requested')
+    # define a Qt signal 'calls_requested' to wake up the GUI thread
+    #   each signal has a cost in the GUI thread, so the signal is only
+    #   emitted after all commands which are already waiting are passed on,
+    #   and only if the GUI thread isn't already going to execute them
+    calls_requested = Signal(name='calls_requested')
 
     def watch_queue(self):
         # executes in the parent process, queue watcher thread
         stop = False
         while stop == False:
             try:
+                n_commands = 0
                 command = self.watched_queue.get()
-                #self.logger.debug("Parent watch_queue loop received '%s'" % str(command))
-                if command[0] is not None:
-                    self.call_requested.emit(command)
+                end_time = time.monotonic() + self.batch_time
+                while True:
+                    #self.logger.debug("Parent watch_queue loop received '%s'" % str(command))
+                    if command[0] is None:
+                        self.logger.debug('QueueWatcher.watch_queue() has detected a stop request.')
+                        stop = True
+                        break
+                    recorder = self.parent.recorder
+                    if recorder is not None:
+                        recorder.record(command, self.lane)
+                    process = self.parent.child_processes.get(command[0])
+                    if command[1] == pythics.libproxy.PUBLISH_EVENT:
+                        # events go straight to the subscribers, not
+                        #   through the GUI thread
+                        self.parent.event_bus.publish(*command[2])
+                    elif process is not None:
+                        # the command waits with the child process until the
+                        #   GUI thread schedules it
+                        process.request_received(command, self.lane)
+                        n_commands += 1
+                    else:
+                        self.logger.warning('Dropped call request from a child process which has been stopped.')
+                    if (n_commands >= self.batch_size) or (time.monotonic() > end_time):
+                        break
+                    try:
+                        command = self.watched_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if (n_commands > 0) and self.parent.request_wake():
+                    self.calls_requested.emit()
                     # USED FOR ALTERNATIVE SIGNALLING METHOD USING POST_EVENT
                     #QtCore.QCoreApplication.postEvent(self.parent,
-                    #                                  CommandEvent(command))
-                else:
-                    self.logger.debug('QueueWatcher.watch_queue() has detected a stop request.')
-                    stop = True
+                    #                                  CommandEvent(commands))
             except:
                 self.logger.exception('Error in QueueWatcher.watch_queue().')
         self.logger.debug('QueueWatcher.watch_queue() is exiting.')
@@ -198,51 +383,284 @@ class QueueWatcher(QtCore.QObject):
 #        QtCore.QEvent.__init__(self, QtCore.QEvent.User)
 
 
+#
+# EventBus delivers events published by GlobalTriggers to the subscribed
+#   GlobalActions in all child processes. Events from child processes are
+#   published by the queue watcher thread, so delivery doesn't wait for the
+#   GUI thread. Subscriptions are changed in the GUI thread, by replacing
+#   the tuple of subscribers of a topic, so publishing needs no lock.
+#
+class EventBus(object):
+    def __init__(self, parent):
+        self.parent = parent
+        self.logger = multiprocessing.get_logger()
+        # tuple of (process_id, proxy_id) subscribed to each topic
+        self.topics = dict()
+        self.n_published = 0
+        self.n_delivered = 0
+        self.n_unsubscribed = 0
+
+    def subscribe(self, topic, process_id, proxy_id):
+        subscribers = self.topics.get(topic, ())
+        self.topics[topic] = subscribers + ((process_id, proxy_id),)
+
+    def unsubscribe_process(self, process_id):
+        for topic, subscribers in list(self.topics.items()):
+            remaining = tuple(s for s in subscribers if s[0] != process_id)
+            if len(remaining) == 0:
+                self.topics.pop(topic)
+            elif len(remaining) != len(subscribers):
+                self.topics[topic] = remaining
+
+    def publish(self, topic, payload=None, sent_time=None):
+        # may be called from the GUI thread or the queue watcher threads
+        if sent_time is None:
+            sent_time = time.time()
+        self.n_published += 1
+        subscribers = self.topics.get(topic, ())
+        if len(subscribers) == 0:
+            self.n_unsubscribed += 1
+            self.logger.warning("No action found for global trigger '%s'." % topic)
+            return
+        for process_id, proxy_id in subscribers:
+            process = self.parent.child_processes.get(process_id)
+            if (process is None) or (process.parent_to_child_call_queue is None):
+                # stopped, or not started yet
+                continue
+            try:
+                process.exec_parent_to_proxy_call_request(proxy_id, '_receive_event',
+                                                          topic, payload, sent_time)
+                self.n_delivered += 1
+            except Exception:
+                self.logger.exception("Error delivering event '%s' to process '%s'." % (topic, process.name))
+
+    def get_stats(self):
+        return dict(topics=dict((topic, len(subscribers)) for topic, subscribers in self.topics.items()),
+                    published=self.n_published,
+                    delivered=self.n_delivered,
+                    unsubscribed=self.n_unsubscribed)
+
+
+#
+# An idle child process, which has imported common libraries and is waiting
+#   to be given an app. The queues and other objects for communication must
+#   be passed to a process when it is started, so each pooled child process
+#   gets its own set before it knows which app it will run.
+#
+class PooledChild(object):
+    def __init__(self, parent, value_cache_size):
+        transport = parent.transport
+        self.credits = multiprocessing.Semaphore(0)
+        self.value_versions = multiprocessing.RawArray('L', value_cache_size)
+        self.action_counts = multiprocessing.RawArray('l', 2)
+        with transport.start_lock:
+            self.parent_to_child_call_queue = transport.new_action_queue()
+            self.child_call_queues = tuple(transport.new_child_call_queue(q)
+                                           for q in parent.child_to_parent_call_queues)
+            self.child_to_parent_call_return_queues = tuple(transport.new_return_queue()
+                                                            for q in parent.child_to_parent_call_queues)
+            self.process = multiprocessing.Process(name='pooled_child',
+                                                   target=pythics.child.pooled_process_loop,
+                                                   args=(self.child_call_queues,
+                                                         self.child_to_parent_call_return_queues,
+                                                         self.credits,
+                                                         self.parent_to_child_call_queue,
+                                                         self.value_versions,
+                                                         parent.instrumentation_flag,
+                                                         self.action_counts))
+            self.process.start()
+            transport.child_started(self.child_call_queues, self.child_to_parent_call_return_queues)
+        self.transport = transport
+
+    def stop(self):
+        self.parent_to_child_call_queue.put((None, None))
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.transport.child_stopped(self.child_to_parent_call_return_queues)
+
+
+#
+# ChildPool keeps a few pooled child processes ready so that opening an app
+#   doesn't wait for a new process to start and import libraries. Taken
+#   processes are replaced in a background thread.
+#
+class ChildPool(object):
+    def __init__(self, parent, size=2, value_cache_size=256):
+        self.parent = parent
+        self.logger = multiprocessing.get_logger()
+        self.size = size
+        # apps with more cached control values than this get a new process
+        self.value_cache_size = value_cache_size
+        self.idle = collections.deque()
+        self.lock = threading.Lock()
+        self.filling = False
+        self.stopped = False
+
+    def fill(self):
+        with self.lock:
+            if self.filling or self.stopped:
+                return
+            self.filling = True
+        threading.Thread(target=self._fill, name='ChildPool.fill', daemon=True).start()
+
+    def _fill(self):
+        try:
+            while True:
+                with self.lock:
+                    if self.stopped or (len(self.idle) >= self.size):
+                        return
+                pooled_child = PooledChild(self.parent, self.value_cache_size)
+                with self.lock:
+                    if not self.stopped:
+                        self.idle.append(pooled_child)
+                        continue
+                pooled_child.stop()
+                return
+        except:
+            self.logger.exception('Error while starting a pooled child process.')
+        finally:
+            with self.lock:
+                self.filling = False
+
+    def take(self):
+        # returns an idle child process, or None if none is ready
+        pooled_child = None
+        with self.lock:
+            while len(self.idle) > 0:
+                pooled_child = self.idle.popleft()
+                if pooled_child.process.is_alive():
+                    break
+                pooled_child = None
+        self.fill()
+        return pooled_child
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            idle = list(self.idle)
+            self.idle.clear()
+        for pooled_child in idle:
+            pooled_child.stop()
+
+
 #
 # Interface for child processes from the parent process
 #   Create one instance for each child process.
 #
 class ChildInterface(object):
-    def __init__(self, parent, child_to_parent_call_queue, manager, process_id,
-                 path, name, anonymous_controls, controls):
+    def __init__(self, parent, child_to_parent_call_queues, manager, transport,
+                 process_id, path, name, anonymous_controls, controls, filename=None):
         self.parent = parent
         self.logger = multiprocessing.get_logger()
-        self.child_to_parent_call_queue = child_to_parent_call_queue
+        self.child_to_parent_call_queues = child_to_parent_call_queues
         self.manager = manager
+        self.transport = transport
         self.process_id = process_id
         self.path = path
         self.name = name
+        # the xml file of the app
+        self.filename = filename
         self.default_parameter_filename = 'defaults.txt'
         # dictionary of controls (widgets)
         self.controls = controls
         # list of controls without ids
         self.anonymous_controls = anonymous_controls
-        # queues for communication between parent and child
-        self.parent_to_child_call_queue = manager.Queue()
-        self.child_to_parent_call_return_queue = manager.Queue()
-        # This semaphore restricts the number of GUI requests from each
-        #  child process to a certain number at any time.
-        #  The number of requests available to each process can be set here.
-        #  The minimum preferable value is 2 in order to be sure the GUI
-        #  process remains busy. Setting it to 1 would effectively give
-        #  completely synchronous execution. Higher values would potentially
-        #  buffer more requests.
-        self.child_to_parent_call_queue_semaphore = manager.Semaphore(2)
+        # queues for communication between parent and child, created (or
+        #   taken from a pooled child process) in start()
+        #   return values go back on the queue for the lane of the request,
+        #   so they are received in the same order as the requests were sent
+        self.parent_to_child_call_queue = None
+        self.child_call_queues = None
+        self.child_to_parent_call_return_queues = None
+        self.child_to_parent_call_return_queue = None
+        # the app, pickled for a pooled child process
+        self.pooled_child_data = None
+        # commands received from the child process which are waiting for the
+        #   GUI thread, for each lane, see Parent.exec_pending_commands()
+        self.pending_commands = tuple(collections.deque()
+                                      for q in child_to_parent_call_queues)
+        # maximum GUI time in seconds per frame for this child process, or None
+        #   for no limit, set in start()
+        self.gui_budget = None
+        self.frame_gui_time = 0.0
+        self.last_frame_gui_time = 0.0
+        self.max_frame_gui_time = 0.0
+        self.gui_time = 0.0
+        self.n_executed = 0
+        self.n_frames = 0
+        self.max_queue_depth = 0
+        # measurements of requests, when switched on in the parent
+        self.instrumentation = pythics.libproxy.Instrumentation(parent.instrumentation_flag)
+        # the latest measurements sent by the child process
+        self.child_instrumentation_stats = None
+        # arrival times of the last pending commands in each lane, only
+        #   while instrumentation is on
+        self.pending_times = tuple(collections.deque()
+                                   for q in child_to_parent_call_queues)
+        # control ids by proxy handle, for instrumentation
+        self.proxy_names = dict()
+        # Flow control restricts the number of GUI requests from each
+        #  child process to a window of requests at any time, which adapts
+        #  to how fast the GUI executes them. The limits of the window can be
+        #  set per app (usually with the Main control). The minimum preferable
+        #  value is 2 in order to be sure the GUI process remains busy. A
+        #  value of 1 would effectively give completely synchronous execution.
+        #  The flow control is created when the child process is started.
+        self.flow_control = None
+        # version counters in shared memory for values cached by proxies,
+        #  created when the child process is started
+        self.n_value_cache_slots = 0
+        # keys of controls whose property sets may be skipped if a newer set
+        #  of the same property is waiting, see note_request()
+        self.coalesced_keys = set()
+        # by key, then by property, the arguments of the latest set which is
+        #  waiting to be executed
+        self.latest_sets = dict()
+        # the arguments of waiting sets which will be skipped, by id
+        self.superseded_sets = dict()
+        # held while the above are changed, by the queue watcher threads and
+        #  the GUI thread
+        self.coalesce_lock = threading.Lock()
+        self.n_coalesced = 0
+        self.value_versions = None
+        # the number of actions taken from parent_to_child_call_queue and the
+        #   number running, updated by the child process, see actions_finished()
+        self.action_counts = None
+        self.n_actions_sent = 0
         self.child_process = None
-        # objects which have proxies
-        self.objects = dict()
-        self.fully_picklable_types = [int, float, bool, str, type(None), np.ndarray]
-        self.fully_picklable_types.extend(list(np.typeDict.values()))
+        # objects which have proxies, by integer handle
+        self.registry = pythics.libproxy.ObjectRegistry()
+        # batches of released handles which have not arrived in every lane
+        #   yet, see release_Proxies()
+        self.pending_releases = dict()
+        # ChildInterface methods, indexed by the opcodes sent by proxies
+        self.dispatch_table = tuple(getattr(self, name) for name in pythics.libproxy.OPCODE_NAMES)
+        self.fully_picklable_types = frozenset(pythics.libproxy.SCALAR_TYPES
+                                               | set([np.ndarray, bytearray]))
+        # callables for each FunctionProxy received, by function name
+        self.function_proxies = dict()
         self.control_proxies = dict()
+        # per-app settings passed to the child process, set by controls
+        #   (usually Main) when they are registered
+        self.child_options = dict()
+        # maps arrays sent through shared memory by the child process
+        if pythics.libtransport.shared_memory_available:
+            self.shared_array_mapper = pythics.libtransport.SharedArrayMapper()
+        else:
+            self.shared_array_mapper = None
         self.module_names = list()
         self.initialization_commands = list()
         self.termination_commands = list()
+        # actions which may run in parallel with others in the child process
+        self.concurrent_actions = set()
         # loop through controls to create proxies, etc.
         for k, v in controls.items():
             # _register() is an opportunity for controls to add to:
             #   module_names, initialization_commands, termination_commands,
             #   or to add global variables
-            proxy_key = self.new_ProxyKey(v)
+            proxy_key = self.new_ProxyKey(v, pin=True)
+            self.proxy_names[proxy_key.key] = k
             if hasattr(v, '_register'):
                 try:
                     v._register(self, k, proxy_key)
@@ -254,36 +672,131 @@ class ChildInterface(object):
                 self.control_proxies[k] = v._proxy
             else:
                 # use a standard AutoProxy
-                self.control_proxies[k] = pythics.libproxy.AutoProxy(proxy_key, enable_cache=True)
+                self.control_proxies[k] = pythics.libproxy.AutoProxy(proxy_key, enable_cache=True,
+                                            value_cache_slot=getattr(v, '_value_cache_slot', None),
+                                            lane=getattr(v, '_lane', pythics.libproxy.LANE_INTERACTIVE))
+            self.concurrent_actions.update(getattr(v, '_concurrent_actions', ()))
         for v in anonymous_controls:
             if hasattr(v, '_register'):
                 v._register(self, None, None)
+            self.concurrent_actions.update(getattr(v, '_concurrent_actions', ()))
 
     def start(self):
-        child = pythics.child.Child(self.process_id,
-                      self.child_to_parent_call_queue,
-                      self.child_to_parent_call_return_queue,
-                      self.child_to_parent_call_queue_semaphore,
-                      self.parent_to_child_call_queue,
-                      self.path,
-                      self.module_names,
-                      self.control_proxies)
-        self.child_process = multiprocessing.Process(name=self.name,
-                                                     target=child.process_loop)
-        self.child_process.start()
+        self.child_options['concurrent_actions'] = sorted(self.concurrent_actions)
+        self.registry.max_objects = self.child_options.get('max_proxied_objects', 10000)
+        gui_budget_ms = self.child_options.get('gui_budget_ms', None)
+        if gui_budget_ms is not None:
+            self.gui_budget = 1e-3*gui_budget_ms
+        pooled_child = self.take_pooled_child()
+        if pooled_child is not None:
+            # use a child process which is already running, passing it the app
+            self.logger.debug("Starting '%s' in a pooled child process." % self.name)
+            self.parent_to_child_call_queue = pooled_child.parent_to_child_call_queue
+            self.child_call_queues = pooled_child.child_call_queues
+            self.child_to_parent_call_return_queues = pooled_child.child_to_parent_call_return_queues
+            self.flow_control = pythics.libtransport.FlowControl(
+                                    self.child_options.get('min_window', 2),
+                                    self.child_options.get('max_window', 32),
+                                    pooled_child.credits)
+            self.value_versions = pooled_child.value_versions
+            self.action_counts = pooled_child.action_counts
+            self.child_process = pooled_child.process
+            self.child_process.name = self.name
+            self.parent_to_child_call_queue.put(self.pooled_child_data)
+            self.pooled_child_data = None
+        else:
+            self.flow_control = pythics.libtransport.FlowControl(
+                                    self.child_options.get('min_window', 2),
+                                    self.child_options.get('max_window', 32))
+            self.value_versions = multiprocessing.RawArray('L', max(self.n_value_cache_slots, 1))
+            self.action_counts = multiprocessing.RawArray('l', 2)
+            # pooled child processes may be started at the same time, see
+            #   pythics.libtransport.Transport.start_lock
+            with self.transport.start_lock:
+                self.parent_to_child_call_queue = self.transport.new_action_queue()
+                # each child process has its own call queues, see
+                #   pythics.libtransport.Transport
+                self.child_call_queues = tuple(self.transport.new_child_call_queue(q)
+                                               for q in self.child_to_parent_call_queues)
+                self.child_to_parent_call_return_queues = tuple(self.transport.new_return_queue()
+                                                                for q in self.child_to_parent_call_queues)
+                child = pythics.child.Child(self.process_id,
+                              self.child_call_queues,
+                              self.child_to_parent_call_return_queues,
+                              self.flow_control.credits,
+                              self.parent_to_child_call_queue,
+                              self.path,
+                              self.module_names,
+                              self.control_proxies,
+                              self.child_options,
+                              self.value_versions,
+                              self.parent.instrumentation_flag,
+                              self.action_counts)
+                self.child_process = multiprocessing.Process(name=self.name,
+                                                             target=child.process_loop)
+                self.child_process.start()
+                self.transport.child_started(self.child_call_queues,
+                                             self.child_to_parent_call_return_queues)
+        self.child_to_parent_call_return_queue = self.child_to_parent_call_return_queues[0]
         # call initialization functions
         for item in self.initialization_commands:
             self.exec_parent_to_child_call_request(item)
 
-    def new_global_namespace(self, element_id):
-        namespace = self.parent.get_global_namespace(element_id)
+    def take_pooled_child(self):
+        # returns an idle child process from the pool, or None if there is
+        #   none or this app can't use one
+        pool = self.parent.child_pool
+        if (pool is None) or (self.n_value_cache_slots > pool.value_cache_size):
+            return None
+        # the app is passed to the pooled child process through a queue, which
+        #   fails for objects which must be passed when a process is started
+        #   (e.g. a multiprocessing.Event), so pickle it here to find out
+        try:
+            self.pooled_child_data = bytes(multiprocessing.reduction.ForkingPickler.dumps(
+                    (self.process_id, self.name, self.path, self.module_names,
+                     self.control_proxies, self.child_options)))
+        except Exception:
+            self.logger.debug("'%s' can't use a pooled child process, starting a new process." % self.name)
+            return None
+        return pool.take()
+
+    def start_replay(self):
+        # set up as in start(), but without a child process, so that recorded
+        #   requests can be replayed, see pythics.recording.Replayer
+        #   anything sent to the child process is discarded
+        self.child_options['concurrent_actions'] = sorted(self.concurrent_actions)
+        self.registry.max_objects = self.child_options.get('max_proxied_objects', 10000)
+        gui_budget_ms = self.child_options.get('gui_budget_ms', None)
+        if gui_budget_ms is not None:
+            self.gui_budget = 1e-3*gui_budget_ms
+        self.parent_to_child_call_queue = pythics.libtransport.DiscardQueue()
+        self.child_to_parent_call_return_queues = tuple(pythics.libtransport.DiscardQueue()
+                                                        for q in self.child_to_parent_call_queues)
+        self.child_to_parent_call_return_queue = self.child_to_parent_call_return_queues[0]
+        self.flow_control = pythics.libtransport.FlowControl(
+                                self.child_options.get('min_window', 2),
+                                self.child_options.get('max_window', 32))
+        self.value_versions = multiprocessing.RawArray('L', max(self.n_value_cache_slots, 1))
+
+    def new_value_cache_slot(self):
+        slot = self.n_value_cache_slots
+        self.n_value_cache_slots += 1
+        return slot
+
+    def invalidate_value_cache(self, slot):
+        # only called from the GUI thread, so no lock is needed
+        if self.value_versions is not None:
+            self.value_versions[slot] += 1
+
+    def new_global_namespace(self, element_id, mode='manager', fields=None):
+        namespace = self.parent.get_global_namespace(element_id, mode, fields)
         return namespace
 
     def new_global_action(self, element_id, proxy_key):
         self.parent.new_global_action(self.process_id, element_id, proxy_key)
 
-    def trigger_global_action(self, action_id):
-        self.parent.trigger_global_action(action_id)
+    def trigger_global_action(self, action_id, payload=None):
+        self.parent.trigger_global_action(action_id, payload)
 
     def append_initialization_command(self, command):
         self.initialization_commands.append(command)
@@ -295,24 +808,208 @@ class ChildInterface(object):
         if not module_name in self.module_names:
             self.module_names.append(module_name)
 
-    def exec_child_to_parent_call_request(self, function_name, args, kwargs):
+    def request_received(self, command, lane=pythics.libproxy.LANE_INTERACTIVE):
+        # called in the queue watcher thread for each command from the
+        #   child process, before it is executed in the GUI thread
+        self.flow_control.request_received()
+        if len(self.coalesced_keys) > 0:
+            function_name, args = command[1], command[2]
+            if function_name == pythics.libproxy.EXEC_PROXY_BATCH:
+                for call in args[0]:
+                    self.note_request(call[0], call[1])
+            else:
+                self.note_request(function_name, args)
+        if self.instrumentation.enabled:
+            self.pending_times[lane].append(time.perf_counter())
+        self.pending_commands[lane].append(command)
+        self.max_queue_depth = max(self.max_queue_depth, self.get_queue_depth())
+
+    def has_pending_commands(self):
+        for commands in self.pending_commands:
+            if len(commands) > 0:
+                return True
+        return False
+
+    def actions_finished(self):
+        # True if the child process has taken every action sent to it and no
+        #   action is running, including actions started by Timers
+        counts = self.action_counts
+        if counts is None:
+            return True
+        return (counts[0] >= self.n_actions_sent) and (counts[1] == 0)
+
+    def get_queue_depth(self):
+        return sum(len(commands) for commands in self.pending_commands)
+
+    def next_pending_command(self):
+        # the interactive lane always goes first
+        for lane, commands in enumerate(self.pending_commands):
+            if len(commands) > 0:
+                times = self.pending_times[lane]
+                if len(times) > 0:
+                    # arrival times are kept only for the last commands in
+                    #   the lane, since instrumentation may have been
+                    #   switched on after the first ones arrived
+                    if len(times) >= len(commands):
+                        t = time.perf_counter() - times.popleft()
+                        if self.instrumentation.enabled:
+                            self.instrumentation.add_time('queue_wait', t)
+                        else:
+                            times.clear()
+                return commands.popleft(), lane
+
+    def get_frame_share(self, frame_time):
+        # GUI time per frame this child process should get, relative to others
+        if self.gui_budget is None:
+            return frame_time
+        return self.gui_budget
+
+    def is_over_budget(self):
+        return (self.gui_budget is not None) and (self.frame_gui_time >= self.gui_budget)
+
+    def add_gui_time(self, t):
+        self.frame_gui_time += t
+        self.gui_time += t
+        self.n_executed += 1
+
+    def end_frame(self):
+        self.last_frame_gui_time = self.frame_gui_time
+        self.max_frame_gui_time = max(self.max_frame_gui_time, self.frame_gui_time)
+        self.n_frames += 1
+
+    def get_scheduler_stats(self):
+        stats = dict()
+        stats['queue_depth'] = [len(commands) for commands in self.pending_commands]
+        stats['max_queue_depth'] = self.max_queue_depth
+        stats['executed'] = self.n_executed
+        if self.gui_budget is None:
+            stats['gui_budget_ms'] = None
+        else:
+            stats['gui_budget_ms'] = 1e3*self.gui_budget
+        stats['gui_time_ms'] = 1e3*self.gui_time
+        stats['last_frame_gui_time_ms'] = 1e3*self.last_frame_gui_time
+        stats['max_frame_gui_time_ms'] = 1e3*self.max_frame_gui_time
+        if self.n_frames > 0:
+            stats['mean_frame_gui_time_ms'] = 1e3*self.gui_time/self.n_frames
+        else:
+            stats['mean_frame_gui_time_ms'] = 0.0
+        return stats
+
+    def note_request(self, function_name, args):
+        # a set of a property is superseded by a newer set of the same
+        #   property, unless a get or call on the same control comes between
+        #   them, which must see the older value
+        if (len(args) == 0) or (type(args[0]) is not pythics.libproxy.ProxyKey):
+            return
+        key = args[0].key
+        if key not in self.coalesced_keys:
+            return
+        with self.coalesce_lock:
+            if function_name == pythics.libproxy.SET_PROXY_ATTR:
+                sets = self.latest_sets.setdefault(key, dict())
+                previous = sets.get(args[1])
+                if previous is not None:
+                    self.superseded_sets[id(previous)] = previous
+                sets[args[1]] = args
+            else:
+                self.latest_sets.pop(key, None)
+
+    def is_superseded(self, args):
+        # called just before a set is executed
+        if len(self.coalesced_keys) == 0:
+            return False
+        key = args[0].key
+        if key not in self.coalesced_keys:
+            return False
+        with self.coalesce_lock:
+            if self.superseded_sets.pop(id(args), None) is args:
+                return True
+            sets = self.latest_sets.get(key)
+            if (sets is not None) and (sets.get(args[1]) is args):
+                # the latest set is executed, so nothing is kept for it
+                del sets[args[1]]
+                if len(sets) == 0:
+                    del self.latest_sets[key]
+            return False
+
+    def skip_set(self, args):
+        self.n_coalesced += 1
+        # converting the value releases any arrays sent through shared memory
+        self.keys_to_objects(args[2])
+
+    def exec_child_to_parent_call_request(self, function_name, args, kwargs,
+                                          lane=pythics.libproxy.LANE_INTERACTIVE):
         # executes a command in this (ChildInterface) object
-        f = getattr(self, function_name)
-        f(*args, **kwargs)
+        self.child_to_parent_call_return_queue = self.child_to_parent_call_return_queues[lane]
+        try:
+            if (function_name == pythics.libproxy.SET_PROXY_ATTR) and self.is_superseded(args):
+                self.skip_set(args)
+            elif self.instrumentation.enabled:
+                start_time = time.perf_counter()
+                try:
+                    self.dispatch(function_name)(*args, **kwargs)
+                finally:
+                    t = time.perf_counter() - start_time
+                    self.instrumentation.add_time('gui_exec', t)
+                    if function_name != pythics.libproxy.EXEC_PROXY_BATCH:
+                        # calls in a batch are counted one by one
+                        self.count_call(function_name, args, t)
+            else:
+                self.dispatch(function_name)(*args, **kwargs)
+        finally:
+            # allow the child process to send more requests
+            self.flow_control.request_executed()
+
+    def count_call(self, function_name, args, t):
+        # count a call for instrumentation by control id, or by type for
+        #   other objects
+        if (len(args) > 0) and (type(args[0]) is pythics.libproxy.ProxyKey):
+            handle = args[0].key
+            if handle in self.proxy_names:
+                proxy = self.proxy_names[handle]
+            else:
+                try:
+                    proxy = type(self.registry.lookup(handle)).__name__
+                except KeyError:
+                    proxy = 'object'
+        else:
+            proxy = 'process'
+        self.instrumentation.count(proxy, pythics.libproxy.describe_call(function_name, args), t)
+
+    def get_instrumentation_stats(self):
+        stats = dict()
+        stats['gui'] = self.instrumentation.get_stats()
+        stats['child'] = self.child_instrumentation_stats
+        return stats
+
+    def dispatch(self, function_name):
+        # function_name is usually an opcode from pythics.libproxy,
+        #   but method names are also accepted
+        if type(function_name) is int:
+            return self.dispatch_table[function_name]
+        else:
+            return getattr(self, function_name)
+
+    def get_stats(self):
+        stats = dict()
+        stats['flow_control'] = self.flow_control.get_stats()
+        stats['coalesced'] = self.n_coalesced
+        stats['objects'] = self.registry.get_stats()
+        stats['scheduler'] = self.get_scheduler_stats()
+        return stats
 
     def exec_parent_to_child_call_request(self, command):
         c = command.split('.')
         self.logger.debug("Put in parent_to_child_call_queue: '%s'." % str((c[0], c[1])))
-        self.parent_to_child_call_queue.put((c[0], c[1]))
+        # the time is used for statistics on how long actions wait
+        self.n_actions_sent += 1
+        self.parent_to_child_call_queue.put((c[0], c[1], time.time()))
 
     def exec_parent_to_proxy_call_request(self, proxy_id, method, *args, **kwargs):
         message = pythics.libproxy.ProxyMessage(proxy_id, method, *args, **kwargs)
         self.logger.debug("Put in parent_to_child_call_queue: '%s'." % str((None, message)))
         self.parent_to_child_call_queue.put((None, message))
 
-    def exec_trigger_request(self, proxy_key):
-        self.lookup(proxy_key)._exec_action('triggered')
-
     def load_parameters(self, filename=None):
         if filename is None:
             filename = self.default_parameter_filename
@@ -356,7 +1053,10 @@ class ChildInterface(object):
             for item in self.termination_commands:
                 self.exec_parent_to_child_call_request(item)
             self.logger.info("Stopping process '%s'." % self.name)
-            if self.child_process.is_alive():
+            if self.child_process is None:
+                # never started, or replayed without a process
+                pass
+            elif self.child_process.is_alive():
                 self.logger.debug("Passing (None, None) to process '%s'." % self.name)
                 self.parent_to_child_call_queue.put((None, None))
                 # try to stop the process; give it 5 seconds to stop peacefully
@@ -369,29 +1069,32 @@ class ChildInterface(object):
                     self.logger.info("Process '%s' was terminated normally." % self.name)
             else:
                 self.logger.error("Action process '%s' was already dead." % self.name)
+            if self.child_process is not None:
+                self.transport.child_stopped(self.child_to_parent_call_return_queues)
         except:
                 self.logger.exception("Error while trying to stop process '%s'." % self.name)
+        if self.shared_array_mapper is not None:
+            self.shared_array_mapper.close()
 
     #------------------------------------------------
     # methods for proxy handling
 
-    def new_ProxyKey(self, original_object, cache=False):
-        new_key = 'AutoProxy_key_' + str(type(original_object)) + '_' + str(id(original_object))
-        new_proxy = pythics.libproxy.ProxyKey(new_key, cache)
-        if new_key in self.objects:
-            self.objects[new_key] = (self.objects[new_key][0] + 1, original_object)
-        else:
-            self.objects[new_key] = (1, original_object)
-        return new_proxy
+    def new_ProxyKey(self, original_object, cache=False, pin=False):
+        # controls should be pinned so they are always available
+        new_key = self.registry.register(original_object, pin)
+        return pythics.libproxy.ProxyKey(new_key, cache)
 
     def lookup(self, proxy_key):
-        return self.objects[proxy_key.key][1]
+        return self.registry.lookup(proxy_key.key)
 
     def objects_to_keys(self, value):
         t = type(value)
         if t in self.fully_picklable_types:
             # a simple picklable type, doesn't need proxy
             return value
+        elif (t is list or t is tuple) and pythics.libproxy.is_scalar_sequence(value):
+            # nothing to convert
+            return value
         elif t is list:
             # have to check for unpicklable objects in the list
             r = list()
@@ -413,7 +1116,7 @@ class ChildInterface(object):
         else:
             # some other type that has to be accessed by proxy
             #  because it may not be picklable
-            if isinstance(value, collections.Callable):
+            if callable(value):
                 # request that functions be cached since they usually don't change
                 return self.new_ProxyKey(value, cache=True)
             else:
@@ -423,10 +1126,15 @@ class ChildInterface(object):
         # create a new object with any AutoProxy keys replaced by
         #  the original objects
         t = type(value)
-        if t is pythics.libproxy.ProxyKey:
+        if t in self.fully_picklable_types:
+            return value
+        elif t is pythics.libproxy.ProxyKey:
             # some other type that has to be accessed by proxy
             #  because it may not be picklable
             return self.lookup(value)
+        elif (t is list or t is tuple) and pythics.libproxy.is_scalar_sequence(value):
+            # no ProxyKeys, and value was just unpickled so it can be used
+            return value
         elif t is list:
             # have to check for ProxyKeys in the list
             r = list()
@@ -447,7 +1155,12 @@ class ChildInterface(object):
             return r
         elif t is pythics.libproxy.FunctionProxy:
             name = value.name
-            return lambda *args, **kwargs: self.exec_parent_to_child_call_request(name)
+            if name not in self.function_proxies:
+                self.function_proxies[name] = lambda *args, **kwargs: self.exec_parent_to_child_call_request(name)
+            return self.function_proxies[name]
+        elif t is pythics.libproxy.SharedArray:
+            # a view of an array in shared memory, without copying
+            return self.shared_array_mapper.view(value)
         else:
             # hopefully just a picklable type
             return value
@@ -455,6 +1168,24 @@ class ChildInterface(object):
     #------------------------------------------------
     # methods for use by AutoProxy
 
+    def exec_Proxy_batch(self, calls):
+        # execute a batch of calls with no return value from a CallBatcher
+        instrumented = self.instrumentation.enabled
+        for function_name, args, kwargs in calls:
+            try:
+                if (function_name == pythics.libproxy.SET_PROXY_ATTR) and self.is_superseded(args):
+                    self.skip_set(args)
+                    continue
+                if instrumented:
+                    start_time = time.perf_counter()
+                    self.dispatch(function_name)(*args, **kwargs)
+                    self.count_call(function_name, args, time.perf_counter() - start_time)
+                else:
+                    self.dispatch(function_name)(*args, **kwargs)
+            except Exception:
+                # already logged, continue with the rest of the batch
+                pass
+
     def call_Proxy(self, proxy_key, *args, **kwargs):
         try:
             a = self.keys_to_objects(args)
@@ -468,8 +1199,6 @@ class ChildInterface(object):
             raise
         else:
             self.child_to_parent_call_return_queue.put(ret)
-        finally:
-            self.child_to_parent_call_queue_semaphore.release()
 
     def get_Proxy_attr(self, proxy_key, name):
         try:
@@ -482,8 +1211,6 @@ class ChildInterface(object):
             raise
         else:
             self.child_to_parent_call_return_queue.put(ret)
-        finally:
-            self.child_to_parent_call_queue_semaphore.release()
 
     def set_Proxy_attr(self, proxy_key, name, value):
         try:
@@ -494,8 +1221,6 @@ class ChildInterface(object):
             logger.exception('Exception raised in parent thread that cannot propagate to action process.')
             # re-raise exception in this process
             raise
-        finally:
-            self.child_to_parent_call_queue_semaphore.release()
 
     def call_Proxy_method(self, proxy_key, method_name, *args, **kwargs):
         try:
@@ -510,8 +1235,6 @@ class ChildInterface(object):
             raise
         else:
             self.child_to_parent_call_return_queue.put(ret)
-        finally:
-            self.child_to_parent_call_queue_semaphore.release()
 
     def call_Proxy_method_no_return(self, proxy_key, method_name, *args, **kwargs):
         try:
@@ -523,21 +1246,34 @@ class ChildInterface(object):
             logger.exception('Exception raised in parent thread that cannot propagate to action process.')
             # re-raise exception in this process
             raise
-        finally:
-            self.child_to_parent_call_queue_semaphore.release()
 
     def delete_Proxy(self, proxy_key):
         try:
-            k = proxy_key.key
-            entry = self.objects[k]
-            if entry[0] == 1:
-                self.objects.pop(k)
-            else:
-                self.objects[k] = (entry[0] - 1, entry[1])
+            self.registry.release(proxy_key.key)
         except Exception:
             logger = multiprocessing.get_logger()
             logger.exception('Exception raised in parent thread that cannot propagate to action process.')
             # re-raise exception in this process
             raise
-        finally:
-            self.child_to_parent_call_queue_semaphore.release()
+
+    def report_Instrumentation(self, stats):
+        # the child process sends its measurements while instrumentation is on
+        self.child_instrumentation_stats = stats
+
+    def publish_Event(self, topic, payload, sent_time):
+        # events are usually published by the queue watcher, this is only
+        #   used when a recording is replayed
+        self.parent.event_bus.publish(topic, payload, sent_time)
+
+    def release_Proxies(self, handles, batch=None, n_lanes=1):
+        # release a batch of deleted proxies, which is sent in n_lanes lanes
+        #   and released once it has arrived in all of them
+        if n_lanes > 1:
+            arrived = self.pending_releases.setdefault(batch, [0, list()])
+            arrived[0] += 1
+            arrived[1].extend(handles)
+            if arrived[0] < n_lanes:
+                return
+            handles = self.pending_releases.pop(batch)[1]
+        for handle in handles:
+            self.registry.release(handle)
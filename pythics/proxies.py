@@ -22,7 +22,8 @@
 #
 # load libraries
 #
-import code, sys, threading, time
+import code, heapq, sys, threading, time
+import concurrent.futures
 import multiprocessing
 
 import pythics.libproxy
@@ -97,12 +98,12 @@ class ImageProxy(pythics.libproxy.PartialAutoProxy):
         pythics.libproxy.PartialAutoProxy.__init__(self, local_attrs, *args, **kwargs)
 
 #    def _get_image(self):
-#        r = self._call_method('call_Proxy_method', self._key, '_get_image')
+#        r = self._call_method(pythics.libproxy.CALL_PROXY_METHOD, self._key, '_get_image')
 #        return rgb_to_pil(r[0], r[1])
 #
 #    def _set_image(self, pil):
 #        args = pil_to_rgb(pil)
-#        self._call_method_no_return('call_Proxy_method_no_return', self._key, '_set_image', *args)
+#        self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_set_image', *args)
 #        
 #    image = property(_get_image, _set_image, doc="""None""")
 
@@ -122,7 +123,7 @@ class ImageProxy(pythics.libproxy.PartialAutoProxy):
           *data*: bytearray
             Image as raw data, with no padding anywhere.
         """
-        self._call_method_no_return('call_Proxy_method_no_return', self._key, '_display', mode, size, data)
+        self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_display', mode, size, data)
 
 
 class ImageWithSharedProxy(pythics.libproxy.PartialAutoProxy):
@@ -132,20 +133,110 @@ class ImageWithSharedProxy(pythics.libproxy.PartialAutoProxy):
         pythics.libproxy.PartialAutoProxy.__init__(self, local_attrs, *args, **kwargs)
 
 #    def _get_image(self):
-#        w, h = self._call_method('call_Proxy_method', self._key, '_get_image_with_shared')
+#        w, h = self._call_method(pythics.libproxy.CALL_PROXY_METHOD, self._key, '_get_image_with_shared')
 #        return rgb_to_pil(self._shared.raw[0:(4*w*h)], (w, h))
 #
 #    def _set_image(self, pil):
 #        if (pil.mode != 'RGBA'):
 #            pil = pil.convert('RGBA')
 #        self._shared.raw = pil.tobytes('raw', 'BGRA')
-#        self._call_method_no_return('call_Proxy_method_no_return', self._key, '_set_image_with_shared', pil.size)
+#        self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_set_image_with_shared', pil.size)
 #
 #    image = property(_get_image, _set_image)
 
     def display(self, mode, size, data):
         self._shared.raw = data
-        self._call_method_no_return('call_Proxy_method_no_return', self._key, '_display_shared', mode, size)
+        self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_display_shared', mode, size)
+
+
+#
+# Modified MainProxy which also reports on the child process itself
+#
+class MainProxy(pythics.libproxy.PartialAutoProxy):
+    def __init__(self, *args, **kwargs):
+        local_attrs = ['get_action_statistics', 'submit', 'map', 'as_completed']
+        pythics.libproxy.PartialAutoProxy.__init__(self, local_attrs, *args, **kwargs)
+
+    def get_action_statistics(self):
+        """Return a dictionary of statistics for each action which has run,
+        including how long it waited in the queue and how long it ran.
+        """
+        return self._process.get_action_statistics()
+
+    def submit(self, fn, *args, **kwargs):
+        """Start fn(*args, **kwargs) in a pool of worker processes, so that
+        compute-heavy code does not slow down the rest of the python script.
+        Return a concurrent.futures.Future for the result. fn and its
+        arguments must be picklable, e.g. fn must be defined at the top level
+        of a module, and fn can't use the controls.
+        """
+        return self._process.get_worker_pool().submit(fn, *args, **kwargs)
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):
+        """Like the built-in map(), but calls to fn run in parallel in the
+        pool of worker processes. Results are returned in order as soon as
+        each one is ready, so they can be plotted while later ones are
+        still being calculated.
+        """
+        return self._process.get_worker_pool().map(fn, *iterables,
+                                                   timeout=timeout, chunksize=chunksize)
+
+    def as_completed(self, futures, timeout=None):
+        """Return an iterator over the futures (from submit()) which yields
+        each one as soon as it is done.
+        """
+        return concurrent.futures.as_completed(futures, timeout)
+
+
+#
+# GlobalTriggerProxy publishes events straight to the subscribed
+#   GlobalActions in all apps, without waiting for the GUI
+#
+class GlobalTriggerProxy(pythics.libproxy.PartialAutoProxy):
+    def __init__(self, topic, *args, **kwargs):
+        local_attrs = ['trigger']
+        pythics.libproxy.PartialAutoProxy.__init__(self, local_attrs, *args, **kwargs)
+        self._topic = topic
+
+    def trigger(self, payload=None):
+        """Trigger all GlobalActions with an id matching `action_id`, passing
+        them payload, which must be picklable."""
+        if self._call_batcher is not None:
+            # requests made before the event go first
+            self._call_batcher.flush()
+        self._call_channel.publish(self._topic, payload)
+
+
+#
+# GlobalActionProxy receives events from GlobalTriggers and runs the action
+#
+class GlobalActionProxy(pythics.libproxy.PartialAutoProxy):
+    def __init__(self, proxy_id, action, *args, **kwargs):
+        local_attrs = ['payload', 'sent_time', 'n_received', 'get_latency_statistics']
+        pythics.libproxy.PartialAutoProxy.__init__(self, local_attrs, *args, **kwargs)
+        self._proxy_id = proxy_id
+        # 'module.function' to run for each event, or None
+        self._action = action
+        # the payload of the latest event and when it was published
+        self.payload = None
+        self.sent_time = None
+        self.n_received = 0
+        self._latency = pythics.libproxy.LatencyHistogram()
+
+    def _receive_event(self, topic, payload, sent_time):
+        # called in the child process loop for each event
+        self._latency.add(max(time.time() - sent_time, 0.0))
+        self.payload = payload
+        self.sent_time = sent_time
+        self.n_received += 1
+        if self._action is not None:
+            module_name, function_name = self._action.split('.')
+            self._process.dispatch_action(module_name, function_name, sent_time)
+
+    def get_latency_statistics(self):
+        """Return statistics of the time from GlobalTrigger.trigger() in any
+        app until the event arrived in this app, in ms."""
+        return self._latency.get_stats()
 
 
 #
@@ -213,62 +304,136 @@ class SubWindowProxy(dict):
 
 
 
+#
+# TimerScheduler serves all Timers in a child process from one thread,
+#   firing each Timer at absolute deadlines on its own grid of intervals, so
+#   the period does not drift by the time taken to queue the action
+#
+CATCH_UP_POLICIES = ('skip', 'burst', 'coalesce')
+
+
+class TimerScheduler(object):
+    def __init__(self):
+        self._condition = threading.Condition()
+        # heap of (deadline, sequence number, timer, generation)
+        self._heap = list()
+        self._sequence = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._thread_loop, name='timers')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def schedule(self, timer, deadline):
+        # called with the lock held
+        self._sequence += 1
+        heapq.heappush(self._heap, (deadline, self._sequence, timer, timer._generation))
+        if self._heap[0][1] == self._sequence:
+            # new earliest deadline
+            self._condition.notify()
+
+    def _thread_loop(self):
+        heap = self._heap
+        with self._condition:
+            while self._running:
+                if len(heap) == 0:
+                    self._condition.wait()
+                    continue
+                now = time.monotonic()
+                deadline, sequence, timer, generation = heap[0]
+                if deadline > now:
+                    self._condition.wait(deadline - now)
+                    continue
+                heapq.heappop(heap)
+                if generation != timer._generation:
+                    # timer was stopped or restarted since this was scheduled
+                    continue
+                try:
+                    next_deadline = timer._tick(deadline, now)
+                except:
+                    multiprocessing.get_logger().exception('Error in Timer.')
+                    next_deadline = None
+                if next_deadline is not None:
+                    self.schedule(timer, next_deadline)
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+
 #
 # Modified TimerProxy which contains the actual timer functionality
 #
 class TimerProxy(object):
-    def __init__(self, action):
+    def __init__(self, proxy_id, action):
         self.delayed = False
         self._running = False
+        self._interval = None
+        self._catch_up = 'burst'
+        self._generation = 0
         self._set_action(action)
+        self._proxy_id = proxy_id
 
     def _start(self, process):
         # initialization delayed until proxy is moved to action process so
         #   threading objects are created in the right process
         self._process = process
         self._parent_to_child_call_queue = self._process.parent_to_child_call_queue
-        self._event = threading.Event()
-        self._retrigger_event = threading.Event()
+        self._pending = 0
+        self._coalesced = False
+        self._reset_statistics()
 
     def start(self, interval=1.0, action=None, call_at_zero=True,
-              require_retrigger=False, retrigger_timeout=None):
-        if not self._running:
+              require_retrigger=False, retrigger_timeout=None, catch_up='burst'):
+        """Start calling the action every interval seconds.
+
+        Calls are made at fixed deadlines, interval seconds apart from the
+        start, so the period does not drift. If the previous call has not
+        finished when the next one is due, catch_up selects what happens:
+        'burst' (default) makes every call anyway, so calls pile up and run
+        back to back, 'skip' drops the call, and 'coalesce' makes one call
+        for all dropped calls when the previous call finishes.
+        """
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError("catch_up must be one of %s." % ', '.join(CATCH_UP_POLICIES))
+        scheduler = self._process.get_timer_scheduler()
+        with scheduler._condition:
+            if self._running:
+                raise RuntimeWarning('Timer is already running.')
             if action != None:
                 self._set_action(action)
             self.delayed = False
-            self._event.clear()
-            self._retrigger_event.clear()
             self._running = True
             self._interval = interval
-            self._call_at_zero = call_at_zero
             self._require_retrigger = require_retrigger
-            if require_retrigger:
-                self._thread = threading.Thread(target=self._thread_loop_with_retrigger)
-                self._retrigger_timeout = retrigger_timeout
-            else:
-                self._thread = threading.Thread(target=self._thread_loop)
-            self._thread.start()
-        else:
-            raise RuntimeWarning('Timer is already running.')
+            self._retrigger_timeout = retrigger_timeout
+            # retriggered before the first call if there is no call at zero
+            self._retriggered = not call_at_zero
+            self._waiting_deadline = None
+            self._coalesced = False
+            self._catch_up = catch_up
+            self._scheduler = scheduler
+            self._reset_statistics()
+            now = time.monotonic()
+            if call_at_zero:
+                self._trigger_action()
+            self._generation += 1
+            scheduler.schedule(self, now + interval)
 
     def stop(self):
         if self._running:
-            self._event.set()
-            if self._require_retrigger:
-                self._retrigger_event.set()
-            self._thread.join()
-            self._running = False
+            self._stop()
         else:
             raise RuntimeWarning('Timer is not running.')
 
-    # used to shutdown the thread if timer is running when process is closed
+    # used to shutdown the timer if it is running when process is closed
     def _stop(self):
         if self._running:
-            self._event.set()
-            if self._require_retrigger:
-                self._retrigger_event.set()
-            self._thread.join()
-            self._running = False
+            # no more calls are queued once the lock is released
+            with self._scheduler._condition:
+                self._generation += 1
+                self._running = False
 
     def _get_action(self):
         return self._action
@@ -292,52 +457,225 @@ class TimerProxy(object):
 
     running = property(_get_running)
 
-    def _thread_loop(self):
-        if self._call_at_zero:
-            # optionally call action once at the start
-            self._trigger_action()
-        while True:
-            self._event.wait(self._interval)
-            if self._event.is_set():
-                self._event.clear()
-                break
-            # run timer action
-            self._trigger_action()
+    def _get_catch_up(self):
+        return self._catch_up
 
-    def retrigger(self):
-        self._retrigger_event.set()
+    catch_up = property(_get_catch_up)
 
-    def _thread_loop_with_retrigger(self):
-        if self._call_at_zero:
-            # optionally call action once at the start
-            self._trigger_action()
-        else:
-            self._retrigger_event.set()
-        while True:
-            self._event.wait(self._interval)
-            if self._event.is_set():
-                self._event.clear()
-                break
-            delayed = not self._retrigger_event.is_set()
-            self._retrigger_event.wait(self._retrigger_timeout)
-            self._retrigger_event.clear()
-            self.delayed = delayed
-            # run timer action
+    def retrigger(self):
+        scheduler = self._process.get_timer_scheduler()
+        with scheduler._condition:
+            if self._running and (self._waiting_deadline is not None):
+                # the timer is waiting for this, call now
+                deadline = self._waiting_deadline
+                self._waiting_deadline = None
+                self._trigger_action()
+                self._generation += 1
+                scheduler.schedule(self, self._next_deadline(deadline, time.monotonic()))
+            else:
+                self._retriggered = True
+
+    def _tick(self, deadline, now):
+        # called by the TimerScheduler with its lock held, returns the next
+        #   deadline, or None to wait for retrigger()
+        if self._waiting_deadline is not None:
+            # retrigger_timeout passed without a call to retrigger()
+            deadline = self._waiting_deadline
+            self._waiting_deadline = None
             self._trigger_action()
+            return self._next_deadline(deadline, now)
+        statistics = self._statistics
+        statistics['ticks'] += 1
+        self._jitter.add(now - deadline)
+        if self._pending > 0:
+            statistics['overruns'] += 1
+            if self._catch_up != 'burst':
+                statistics['missed'] += 1
+                if self._catch_up == 'coalesce':
+                    self._coalesced = True
+                return self._next_deadline(deadline, now)
+        if self._require_retrigger:
+            self.delayed = not self._retriggered
+            if not self._retriggered:
+                self._waiting_deadline = deadline
+                if self._retrigger_timeout is None:
+                    return None
+                return now + self._retrigger_timeout
+            self._retriggered = False
+        self._trigger_action()
+        return self._next_deadline(deadline, now)
+
+    def _next_deadline(self, deadline, now):
+        # deadlines which have already passed are missed, unless catching up
+        #   with a burst of calls
+        if self._catch_up == 'burst':
+            return deadline + self._interval
+        n_missed = int((now - deadline)/self._interval)
+        self._statistics['missed'] += n_missed
+        return deadline + (n_missed + 1)*self._interval
+
+    def _run_action(self, sent_time):
+        # called in the child process loop for each call queued by the timer
+        #   a concurrent action is still running when this returns
+        future = None
+        try:
+            future = self._process.dispatch_action(self._queue_action_entry[0],
+                                                   self._queue_action_entry[1], sent_time)
+        finally:
+            if future is None:
+                self._action_finished()
+            else:
+                future.add_done_callback(self._action_finished)
+
+    def _action_finished(self, future=None):
+        with self._scheduler._condition:
+            self._pending -= 1
+            if self._coalesced and (self._pending == 0) and self._running:
+                # one call for the calls dropped while this one ran
+                self._coalesced = False
+                self._trigger_action()
+
+    def _reset_statistics(self):
+        self._statistics = dict(ticks=0, calls=0, missed=0, overruns=0)
+        self._jitter = pythics.libproxy.LatencyHistogram()
+
+    def get_statistics(self):
+        """Return a dictionary of statistics since the timer was started:
+        ticks (deadlines reached), calls (of the action), missed (calls
+        dropped), overruns (deadlines reached before the previous call
+        finished), and jitter, the lateness of the deadlines in ms.
+        """
+        statistics = dict(self._statistics)
+        statistics['interval'] = self._interval
+        statistics['catch_up'] = self._catch_up
+        statistics['jitter'] = self._jitter.get_stats()
+        return statistics
 
     def _trigger_action(self):
-        self._parent_to_child_call_queue.put(self._queue_action_entry)
+        self._statistics['calls'] += 1
+        self._pending += 1
+        self._parent_to_child_call_queue.put((None, pythics.libproxy.ProxyMessage(
+                                                self._proxy_id, '_run_action', time.time())))
+
+
+#
+# Pacer waits for precise intervals by sleeping until shortly before the
+#   deadline, then spinning for the last spin_threshold seconds, since a
+#   sleep may end up to a few ms late. Waits end early when is_set()
+#   returns True, and wait(timeout) must return early then too.
+#
+class Pacer(object):
+    # while spinning, is_set() is only called this often, since it may take
+    #   a lock shared with other processes
+    CHECK_INTERVAL_NS = 50000
+
+    def __init__(self, wait, is_set, spin_threshold=0):
+        self._wait = wait
+        self._is_set = is_set
+        self.spin_threshold = spin_threshold
+        self.delayed = False
+        self._last_ns = time.perf_counter_ns()
+        self.reset_statistics()
+
+    def _get_spin_threshold(self):
+        return 1e-9*self._spin_ns
+
+    def _set_spin_threshold(self, value):
+        self._spin_ns = int(1e9*value)
+
+    spin_threshold = property(_get_spin_threshold, _set_spin_threshold)
+
+    def start(self):
+        # intervals are measured from now
+        self._last_ns = time.perf_counter_ns()
+
+    def sleep(self, t):
+        # wait t seconds, returns True if interrupted
+        self.delayed = False
+        return self._sleep_until(time.perf_counter_ns() + int(1e9*t))
+
+    def wait_interval(self, t):
+        # wait until t seconds after the end of the last wait, returns True
+        #   if interrupted
+        deadline_ns = self._last_ns + int(1e9*t)
+        self.delayed = time.perf_counter_ns() >= deadline_ns
+        return self._sleep_until(deadline_ns)
+
+    def _sleep_until(self, deadline_ns):
+        perf_counter_ns = time.perf_counter_ns
+        is_set = self._is_set
+        spin_ns = self._spin_ns
+        check_interval_ns = self.CHECK_INTERVAL_NS
+        interrupted = False
+        next_check_ns = 0
+        while True:
+            now_ns = perf_counter_ns()
+            if now_ns >= next_check_ns:
+                if is_set():
+                    interrupted = True
+                    break
+                next_check_ns = now_ns + check_interval_ns
+            remaining_ns = deadline_ns - now_ns
+            if remaining_ns <= 0:
+                break
+            if remaining_ns > spin_ns:
+                self._wait(1e-9*(remaining_ns - spin_ns))
+                # check again as soon as the wait ends
+                next_check_ns = 0
+        now_ns = perf_counter_ns()
+        if not interrupted:
+            self._lateness.add(max(1e-9*(now_ns - deadline_ns), 0.0))
+        period_ns = now_ns - self._last_ns
+        self._last_ns = now_ns
+        self._n += 1
+        self._total_ns += period_ns
+        self._total_squares += (1e-9*period_ns)**2
+        self._min_ns = min(self._min_ns, period_ns)
+        self._max_ns = max(self._max_ns, period_ns)
+        if self.delayed:
+            self._n_delayed += 1
+        return interrupted
+
+    def reset_statistics(self):
+        self._n = 0
+        self._n_delayed = 0
+        self._total_ns = 0
+        self._total_squares = 0.0
+        self._min_ns = 2**63
+        self._max_ns = 0
+        self._lateness = pythics.libproxy.LatencyHistogram()
+
+    def get_statistics(self):
+        # periods between the ends of waits and lateness of waits, in ms
+        statistics = dict()
+        n = self._n
+        statistics['count'] = n
+        statistics['delayed'] = self._n_delayed
+        statistics['spin_threshold_ms'] = 1e3*self.spin_threshold
+        if n > 0:
+            mean = 1e-9*self._total_ns/n
+            statistics['mean_period_ms'] = 1e3*mean
+            statistics['std_period_ms'] = 1e3*max(self._total_squares/n - mean**2, 0.0)**0.5
+            statistics['min_period_ms'] = 1e-6*self._min_ns
+            statistics['max_period_ms'] = 1e-6*self._max_ns
+        statistics['lateness'] = self._lateness.get_stats()
+        return statistics
 
 
 #
 # Modified EventButtonProxy which contains the timing functionality
 #
 class EventButtonProxy(pythics.libproxy.PartialAutoProxy):
-    def __init__(self, event, *args, **kwargs):
-        local_attrs = ['clear', 'is_set', 'wait_interval', 'wait']
+    def __init__(self, event, spin_threshold, *args, **kwargs):
+        local_attrs = ['clear', 'is_set', 'start_interval', 'wait_interval', 'wait',
+                       'get_pacing_statistics']
         pythics.libproxy.PartialAutoProxy.__init__(self, local_attrs, *args, **kwargs)
-        self._last_time = time.time()
         self._event = event
+        self._spin_threshold = spin_threshold
+
+    def _start(self, process):
+        pythics.libproxy.PartialAutoProxy._start(self, process)
+        self._pacer = Pacer(self._event.wait, self._event.is_set, self._spin_threshold)
 
     def clear(self):
         """Clear the Event."""
@@ -352,21 +690,20 @@ class EventButtonProxy(pythics.libproxy.PartialAutoProxy):
         
     def start_interval(self):
         """Start the timer used for the firt call to wait_interval()."""
-        self._last_time = time.time()
+        self._pacer.start()
 
     def wait_interval(self, t):
         """Wait t seconds since the last call to start_interval() or 
         wait_interval(). This wait can be interrupted by any action that sets 
         the Event.
         """
-        # calculate how long we need to wait
-        sleep_time = t - (time.time() - self._last_time)
-        if sleep_time > 0 :
-            result = self._event.wait(sleep_time)
-        else:
-            result = self._event.is_set()
-        self._last_time = time.time()
-        return result
+        return self._pacer.wait_interval(t)
+
+    def get_pacing_statistics(self):
+        """Return a dictionary of statistics of the periods between the ends
+        of calls to wait_interval(), and of how late the calls ended, in ms.
+        """
+        return self._pacer.get_statistics()
 
     def wait(self, t):
         """Wait t seconds. This wait can be interrupted by any action that sets 
@@ -379,13 +716,17 @@ class EventButtonProxy(pythics.libproxy.PartialAutoProxy):
 # Modified RunButtonProxy which contains the timing functionality
 #
 class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
-    def __init__(self, proxy_id, action, time_interval, *args, **kwargs):
-        local_attrs = ['start', 'step', 'stop', 'abort', 'kill', 'action', 'running', 'value', 'delayed']
+    def __init__(self, proxy_id, action, time_interval, in_thread, spin_threshold, *args, **kwargs):
+        local_attrs = ['start', 'step', 'stop', 'abort', 'kill', 'action', 'running', 'value', 'delayed',
+                       'get_pacing_statistics']
         pythics.libproxy.PartialAutoProxy.__init__(self, local_attrs, *args, **kwargs)
         self._time_interval = time_interval
+        self._in_thread = in_thread
+        self._spin_threshold = spin_threshold
         # self._running should only be True when the thread is running
         self._running = False
         self._set_action(action)
+        self._proxy_id = proxy_id
         self._step_message = (None, pythics.libproxy.ProxyMessage(proxy_id, 'step'))
         self.delayed = False
 
@@ -398,13 +739,17 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
         self._stop_event = threading.Event()
         self._yield_event = threading.Event()
         self._interval_semaphore = threading.Semaphore(1)
+        # wakes a step thread waiting for an interval
+        self._step_condition = threading.Condition()
+        self._pacer = Pacer(self._wait_for_abort, self._abort_event.is_set,
+                            self._spin_threshold)
 
     # used to shutdown the thread if timer is running when process is closed
     def _stop(self):
         if self._running:
             self._stop_event.set()
             self._yield_event.set()
-            self._abort_event.set()
+            self.abort()
             self._thread.join()
 
     def _get_action(self):
@@ -435,7 +780,7 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
         """)
     
     def _get_value(self):
-        return self._call_method('call_Proxy_method', self._key, '_get_value')
+        return self._call_method(pythics.libproxy.CALL_PROXY_METHOD, self._key, '_get_value')
 
     value = property(_get_value, doc=\
         """This read-only property holds the state of the RunButton.
@@ -450,7 +795,7 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
         Use the resume function instead."""
         if not self._running:
             if update_button_state:
-                self._call_method_no_return('call_Proxy_method_no_return', self._key, '_set_value', True)
+                self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_set_value', True)
             # setup action
             called_module_name, called_function_name = self._queue_action_entry
             called_module = self._process.modules[called_module_name]
@@ -462,7 +807,11 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
             self._abort_event.clear()
             self._stop_event.clear()
             self._yield_event.clear()
-            if self._time_interval:
+            self._pacer.reset_statistics()
+            self._pacer.start()
+            if self._in_thread:
+                self._thread = threading.Thread(target=self._thread_loop_in_thread)
+            elif self._time_interval:
                 self._thread = threading.Thread(target=self._thread_loop_time_interval)
             else:
                 self._thread = threading.Thread(target=self._thread_loop)
@@ -478,7 +827,7 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
         not cancel a kill request."""
         if self._running:
             if update_button_state:
-                self._call_method_no_return('call_Proxy_method_no_return', self._key, '_set_value', True)
+                self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_set_value', True)
             # reset _abort_event to make yield events work again
             self._abort_event.clear()
         else:
@@ -496,7 +845,7 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
             self._interval_semaphore.acquire()
             interval = self._interval
             self._interval_semaphore.release()
-            self._abort_event.wait(interval)
+            self._pacer.sleep(interval)
             # check for stop again in case of a kill
             if self._stop_event.is_set():
                 break
@@ -504,7 +853,6 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
             self._parent_to_child_call_queue.put(self._step_message)
 
     def _thread_loop_time_interval(self):
-        last_time = time.time()
         # run action
         self._parent_to_child_call_queue.put(self._step_message)
         while True:
@@ -515,19 +863,62 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
             self._interval_semaphore.acquire()
             interval = self._interval
             self._interval_semaphore.release()
-            sleep_time = interval - (time.time() - last_time)
-            if sleep_time > 0 :
-                self.delayed = False
-                self._abort_event.wait(sleep_time)
-                # check for stop again in case of a kill
-                if self._stop_event.is_set():
-                    break
-            else:
-                self.delayed = True
-            last_time = time.time()
+            self._pacer.wait_interval(interval)
+            self.delayed = self._pacer.delayed
+            # check for stop again in case of a kill
+            if self._stop_event.is_set():
+                break
             # run action
             self._parent_to_child_call_queue.put(self._step_message)
 
+    def _thread_loop_in_thread(self):
+        # drive the generator from this thread instead of sending each step
+        #   through parent_to_child_call_queue to the child process loop
+        while True:
+            if not self._step_in_thread():
+                break
+            if self._stop_event.is_set():
+                break
+            if self._time_interval:
+                self._pacer.wait_interval(self._interval)
+                self.delayed = self._pacer.delayed
+            else:
+                self._pacer.sleep(self._interval)
+            # check for stop again in case of a kill
+            if self._stop_event.is_set():
+                break
+
+    def _wait_for_abort(self, timeout):
+        with self._step_condition:
+            self._step_condition.wait_for(self._abort_event.is_set, timeout)
+
+    def get_pacing_statistics(self):
+        """Return a dictionary of statistics of the periods between steps,
+        and of how late the waits between steps ended, in ms."""
+        return self._pacer.get_statistics()
+
+    def _step_in_thread(self):
+        # take a step while holding the lock of the child process loop, so
+        #   steps do not run at the same time as other actions
+        # returns False when the RunButton should stop
+        action_lock = self._process.action_lock
+        while not action_lock.acquire(timeout=0.05):
+            if self._stop_event.is_set():
+                return False
+        try:
+            self._interval = next(self._generator) or 0.0
+            return True
+        except StopIteration:
+            # the generator returned (not yielded) on its own, so stop
+            pass
+        except:
+            multiprocessing.get_logger().exception("Error in RunButton action '%s'." % self._action)
+        finally:
+            action_lock.release()
+        self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_set_value', False)
+        self._running = False
+        return False
+
     def step(self):
         """Take a step. Normally for internal use only."""
         try:
@@ -550,7 +941,7 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
     def stop(self):
         """Request the RunButton to stop. Equivlent to pressing the button to stop."""
         if self._running:
-            self._call_method_no_return('call_Proxy_method_no_return', self._key, '_set_value', False)
+            self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_set_value', False)
             self.abort()
         else:
             raise RuntimeWarning('RunButton is not running.')
@@ -559,15 +950,19 @@ class RunButtonProxy(pythics.libproxy.PartialAutoProxy):
         """Abort the current wait in the RunButton. This may not stop your function."""
         # don't check self._running because this call can get out of order with kill
         self._abort_event.set()
+        with self._step_condition:
+            self._step_condition.notify_all()
 
     def kill(self):
         """Try to force the RunButton to stop. This may leave your function in a poorly defined state."""
         if self._running:
-            self._call_method_no_return('call_Proxy_method_no_return', self._key, '_set_value', False)
+            self._call_method_no_return(pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self._key, '_set_value', False)
             self._stop_event.set()
             self._yield_event.set()
-            self._abort_event.set()
-            self._thread.join()
+            self.abort()
+            if self._thread is not threading.current_thread():
+                # the run action may kill the RunButton from its own thread
+                self._thread.join()
             self._running = False
         else:
             raise RuntimeWarning('RunButton is not running.')
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+# Record the requests sent by child processes to the parent process, and
+#   replay them later without the child processes, e.g. to reproduce a
+#   problem or to measure the cost of the GUI side alone. Record with
+#
+#     python -m pythics.start --record session.log.gz -a app.xml
+#
+#   then replay with
+#
+#     python -m pythics.recording [--max-speed] session.log.gz
+#
+#   A log is a header followed by records, each a struct with the time
+#   (seconds since recording started), the lane and the length of the
+#   pickled request which follows. Files ending in '.gz' are compressed.
+#
+
+#
+# load libraries
+#
+import getopt
+import gzip
+import json
+import logging
+import multiprocessing
+import multiprocessing.reduction
+import os, os.path
+import pickle
+import struct
+import sys
+import threading
+import time
+
+from pythics.settings import _TRY_PYSIDE
+try:
+    if not _TRY_PYSIDE:
+        raise ImportError()
+    import PySide2.QtWidgets as _QtWidgets
+    QtWidgets = _QtWidgets
+    USES_PYSIDE = True
+except ImportError:
+    import PyQt5.QtWidgets as _QtWidgets
+    QtWidgets = _QtWidgets
+    USES_PYSIDE = False
+
+import pythics.html
+import pythics.libproxy
+import pythics.libtransport
+import pythics.parent
+
+
+MAGIC = b'PYTHICS-RECORDING-1\n'
+
+# time, lane, length of the pickled request
+RECORD_HEADER = struct.Struct('<dBI')
+
+# lane of records which name the app of a process, (process_id, filename)
+APP_LANE = 255
+
+
+def _open(filename, mode):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode, compresslevel=1)
+    return open(filename, mode)
+
+
+#
+# Recorder writes requests to a log, called from the QueueWatcher threads
+#
+class Recorder(object):
+    def __init__(self, parent, filename):
+        self.parent = parent
+        self.logger = multiprocessing.get_logger()
+        self.filename = filename
+        self.file = _open(filename, 'wb')
+        self.file.write(MAGIC)
+        # held while writing to the file and updating known_processes
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.known_processes = set()
+        self.n_records = 0
+        # arrays in shared memory are copied into the log, since the
+        #   memory is reused once the request has been executed
+        if pythics.libtransport.shared_memory_available:
+            self.shared_array_mapper = pythics.libtransport.SharedArrayMapper()
+        else:
+            self.shared_array_mapper = None
+        self.shared_array_lock = threading.Lock()
+
+    def record(self, command, lane):
+        # executes in the parent process, queue watcher threads
+        t = time.perf_counter() - self.start_time
+        try:
+            process_id = command[0]
+            with self.shared_array_lock:
+                command = self.copy_shared_arrays(command)
+            data = self._dumps(command)
+            with self.lock:
+                # each lane has its own thread, so check and write the app
+                #   record with the lock held, so it is written only once
+                if process_id not in self.known_processes:
+                    process = self.parent.child_processes.get(process_id)
+                    filename = None if process is None else process.filename
+                    self._write(t, APP_LANE, self._dumps((process_id, filename)))
+                    self.known_processes.add(process_id)
+                self._write(t, lane, data)
+        except Exception:
+            self.logger.exception('Error recording a request.')
+
+    def _dumps(self, obj):
+        return multiprocessing.reduction.ForkingPickler.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+    def _write(self, t, lane, data):
+        # must be called with self.lock held
+        if self.file is None:
+            return
+        self.file.write(RECORD_HEADER.pack(t, lane, len(data)))
+        self.file.write(data)
+        self.n_records += 1
+
+    def copy_shared_arrays(self, value):
+        t = type(value)
+        if t is tuple:
+            return tuple(self.copy_shared_arrays(v) for v in value)
+        elif t is list:
+            return [self.copy_shared_arrays(v) for v in value]
+        elif t is dict:
+            return dict((k, self.copy_shared_arrays(v)) for k, v in value.items())
+        elif t is pythics.libproxy.SharedArray:
+            return self.shared_array_mapper.copy(value)
+        else:
+            return value
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        if self.shared_array_mapper is not None:
+            with self.shared_array_lock:
+                self.shared_array_mapper.close()
+        self.logger.info("Recorded %d requests to '%s'." % (self.n_records, self.filename))
+
+
+def read_log(filename):
+    # generates (time, lane, request) for each record in a log
+    with _open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("'%s' is not a pythics recording" % filename)
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            t, lane, length = RECORD_HEADER.unpack(header)
+            yield t, lane, pickle.loads(f.read(length))
+
+
+#
+# Replayer opens the apps found in a log and feeds the recorded requests
+#   to them, at the recorded times or as fast as the GUI executes them
+#
+class Replayer(object):
+    def __init__(self, parent, filename, max_speed=False, max_pending=32, size=(800, 600)):
+        self.parent = parent
+        self.logger = multiprocessing.get_logger()
+        self.filename = filename
+        self.max_speed = max_speed
+        # with max_speed, requests wait in the log while this many are pending
+        self.max_pending = max_pending
+        self.size = size
+        self.application = QtWidgets.QApplication.instance()
+        # ChildInterface for each recorded process id
+        self.processes = dict()
+        self.windows = list()
+        self.n_requests = 0
+
+    def open_app(self, process_id, filename):
+        window = pythics.html.HtmlWindow(None, 'pythics.controls', self.logger)
+        window.resize(*self.size)
+        os.chdir(os.path.dirname(filename))
+        anonymous_controls, controls = window.open_file(filename)
+        path, file_name_only = os.path.split(filename)
+        process = self.parent.new_child_process(path, file_name_only,
+                                                anonymous_controls, controls)
+        process.start_replay()
+        window.show()
+        self.windows.append(window)
+        self.processes[process_id] = process
+
+    def process_events(self):
+        self.application.processEvents()
+        self.parent.exec_pending_commands()
+
+    def n_pending(self):
+        return sum(p.get_queue_depth() for p in self.processes.values())
+
+    def run(self):
+        # replay the whole log, returns statistics
+        start_time = time.perf_counter()
+        for t, lane, request in read_log(self.filename):
+            if lane == APP_LANE:
+                process_id, filename = request
+                if filename is None:
+                    self.logger.warning("Process '%s' in the recording has no app." % process_id)
+                else:
+                    self.open_app(process_id, filename)
+                continue
+            process = self.processes.get(request[0])
+            if process is None:
+                continue
+            if self.max_speed:
+                while self.n_pending() >= self.max_pending:
+                    self.process_events()
+            else:
+                while time.perf_counter() - start_time < t:
+                    self.process_events()
+                    time.sleep(0.0005)
+            # the process has a new id in this session
+            process.request_received((process.process_id,) + tuple(request[1:]), lane)
+            self.n_requests += 1
+            self.parent.request_wake()
+        # execute whatever is left
+        while self.n_pending() > 0:
+            self.process_events()
+        self.application.processEvents()
+        elapsed = time.perf_counter() - start_time
+        stats = dict()
+        stats['requests'] = self.n_requests
+        stats['elapsed'] = elapsed
+        stats['requests_per_second'] = self.n_requests/elapsed if elapsed > 0 else 0.0
+        stats['apps'] = dict((p.name, p.get_scheduler_stats()) for p in self.processes.values())
+        return stats
+
+    def close(self):
+        for process in self.processes.values():
+            self.parent.stop_child_process(process)
+        self.processes = dict()
+        for window in self.windows:
+            window.close()
+        self.windows = list()
+
+
+class OptionsProcessor(object):
+    def __init__(self):
+        # configure the logger
+        self.logger = multiprocessing.log_to_stderr()
+        self.logger.setLevel(logging.WARNING)
+        self.max_speed = False
+        self.scheduler = 'round_robin'
+        self.filename = ''
+
+    def usage(self):
+        print("""\
+Usage: python -m pythics.recording [options] recording
+Options:
+  -h | --help       show help text then exit
+  -m | --max-speed  replay as fast as possible instead of at the recorded times
+  --scheduler       selects how GUI time is shared between apps:
+                      'round_robin' (default) or 'weighted'
+  -v | --verbose    selects verbose mode
+  -d | --debug      selects debug mode""")
+
+    def options(self):
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], 'hmvd',
+                                       ['help', 'max-speed', 'scheduler=', 'verbose', 'debug'])
+        except getopt.GetoptError as err:
+            print(err)
+            self.usage()
+            sys.exit(2)
+        for o, a in opts:
+            if o in ('-v', '--verbose'):
+                self.logger.setLevel(logging.INFO)
+            elif o in ('-d', '--debug'):
+                self.logger.setLevel(logging.DEBUG)
+            elif o in ('-h', '--help'):
+                self.usage()
+                sys.exit(0)
+            elif o in ('-m', '--max-speed'):
+                self.max_speed = True
+            elif o == '--scheduler':
+                if a not in pythics.parent.SCHEDULERS:
+                    print("unknown scheduler '%s'" % a)
+                    self.usage()
+                    sys.exit(2)
+                self.scheduler = a
+            else:
+                assert False, 'unhandled option'
+        if len(args) != 1:
+            self.usage()
+            sys.exit(2)
+        self.filename = os.path.abspath(args[0])
+
+
+#
+# replay a recording without a display, then print statistics
+#
+if __name__ == '__main__':
+    # must be set before the QApplication is created
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    cl_options_processor = OptionsProcessor()
+    cl_options_processor.options()
+    application = QtWidgets.QApplication(sys.argv[:1])
+    # no requests arrive from child processes, but the manager is still
+    #   needed for GlobalNamespaces in 'manager' mode
+    manager = multiprocessing.Manager()
+    parent = pythics.parent.Parent(manager, transport='pipe',
+                                   scheduler=cl_options_processor.scheduler)
+    parent.start()
+    replayer = Replayer(parent, cl_options_processor.filename,
+                        max_speed=cl_options_processor.max_speed)
+    try:
+        stats = replayer.run()
+        print(json.dumps(stats, indent=2, sort_keys=True))
+    finally:
+        replayer.close()
+        parent.stop()
+        manager.shutdown()
@@ -24,6 +24,7 @@
 #
 import getopt
 import inspect
+import json
 import logging
 import os, os.path
 import multiprocessing
@@ -60,8 +61,10 @@ except ImportError:
     Property = QtCore.pyqtProperty
     USES_PYSIDE = False
 
+import pythics.child
 import pythics.html
 import pythics.libcontrol
+import pythics.libtransport
 import pythics.parent
 
 
@@ -126,6 +129,21 @@ class MainWindow(QtWidgets.QMainWindow):
         if not self.compact:
             self.status_text = QtWidgets.QLabel('')
             self.statusBar().addWidget(self.status_text, 1)
+            # show how busy the GUI is with requests from the current app
+            self.load_text = QtWidgets.QLabel('')
+            self.statusBar().addPermanentWidget(self.load_text)
+            self.load_timer = QtCore.QTimer(self)
+            self.load_timer.timeout.connect(self.update_load_text)
+            self.load_timer.start(1000)
+
+    def update_load_text(self):
+        tab = self.get_active_tab()
+        if (tab is None) or tab.error:
+            self.load_text.setText('')
+            return
+        stats = tab.child_process.get_scheduler_stats()
+        self.load_text.setText('queue: %d  GUI: %.1f ms/frame' % (sum(stats['queue_depth']),
+                                                                 stats['last_frame_gui_time_ms']))
 
     def set_status_text(self, value):
         if not self.compact:
@@ -231,6 +249,16 @@ class MainWindow(QtWidgets.QMainWindow):
                             0, 'Save parameters to default location.')
         self.add_menu_item('Save As...', self.menu_save_parameters_as, 0,
                             'Save parameter file.')
+        # Tools menu
+        self.tools_menu = self.add_menu('&Tools')
+        self.instrumentation_action = self.add_menu_item('Instrumentation',
+                            self.menu_instrumentation, 0,
+                            'Measure requests between the apps and the GUI.')
+        self.instrumentation_action.setCheckable(True)
+        self.add_menu_item('Show Statistics...', self.menu_show_statistics, 0,
+                            'Show measurements of requests from the apps.')
+        self.add_menu_item('Export Statistics...', self.menu_export_statistics, 0,
+                            'Save measurements of requests from the apps as JSON.')
         # Help menu
         if not self.fixed_tabs:
             self.help_menu = self.add_menu('&Help')
@@ -450,6 +478,37 @@ class MainWindow(QtWidgets.QMainWindow):
     def menu_save_parameters_as(self):
         self.get_active_tab().save_parameters()
 
+    def menu_instrumentation(self):
+        self.parent_process.set_instrumentation(self.instrumentation_action.isChecked())
+
+    def get_statistics(self):
+        stats = dict()
+        stats['instrumented'] = self.parent_process.is_instrumented()
+        stats['scheduler'] = self.parent_process.get_stats()
+        stats['instrumentation'] = self.parent_process.get_instrumentation_stats()
+        stats['events'] = self.parent_process.event_bus.get_stats()
+        return stats
+
+    def menu_show_statistics(self):
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle('Statistics')
+        dialog.resize(600, 400)
+        layout = QtWidgets.QVBoxLayout(dialog)
+        text = QtWidgets.QPlainTextEdit(dialog)
+        text.setReadOnly(True)
+        text.setPlainText(json.dumps(self.get_statistics(), indent=2, sort_keys=True))
+        layout.addWidget(text)
+        dialog.show()
+
+    def menu_export_statistics(self):
+        try:
+            filename = self.get_save_filename('JSON file (*.json)')
+        except IOError:
+            pass
+        else:
+            with open(filename, 'w') as file:
+                json.dump(self.get_statistics(), file, indent=2, sort_keys=True)
+
     def shutdown(self):
         # stop all action threads then exit
         self.set_status_text('Waiting for threads and subprocesses to die...')
@@ -631,6 +690,11 @@ class OptionsProcessor(object):
         self.first_workspace = ""
         self.compact = False
         self.shutdown_on_exit = False
+        self.transport = 'manager'
+        self.scheduler = 'round_robin'
+        self.child_pool_size = 0
+        self.start_method = None
+        self.record_filename = None
 
     def usage(self):
         print("""\
@@ -641,13 +705,24 @@ Options:
   -w | --workspace  selects startup workspace
   -c | --compact    run in compact mode with simplified controls for small screens
   -s | --shutdown   shutdown computer on exit (*nix only)
+  -t | --transport  selects transport between processes: 'manager' (default)
+                      or 'pipe' (faster, direct OS pipes)
+  --scheduler       selects how GUI time is shared between apps:
+                      'round_robin' (default) or 'weighted'
+  -p | --pool       number of idle processes kept ready for opening apps
+                      (default 0, start a new process for each app)
+  --start-method    selects how processes are started: 'fork', 'spawn' or
+                      'forkserver' (preloads libraries), default depends on
+                      the platform
+  --record          record all requests from apps to the given file, for
+                      replay with 'python -m pythics.recording'
   -v | --verbose    selects verbose mode
   -d | --debug      selects debug mode""")
 
     def options(self):
         try:
-            opts, args = getopt.getopt(sys.argv[1:], 'ha:w:csvd',
-                                       ['help', 'app=', 'workspace=', 'compact', 'shutdown', 'verbose', 'debug'])
+            opts, args = getopt.getopt(sys.argv[1:], 'ha:w:cst:p:vd',
+                                       ['help', 'app=', 'workspace=', 'compact', 'shutdown', 'transport=', 'scheduler=', 'pool=', 'start-method=', 'record=', 'verbose', 'debug'])
         except getopt.GetoptError as err:
             # print help information and exit:
             print(err) # will print something like "option -a not recognized"
@@ -673,6 +748,38 @@ Options:
             elif o in ('-c', '--compact'):
                 self.logger.info('compact mode')
                 self.compact = True
+            elif o in ('-t', '--transport'):
+                if a not in pythics.libtransport.TRANSPORTS:
+                    print("unknown transport '%s'" % a)
+                    self.usage()
+                    sys.exit(2)
+                self.logger.info('using transport ' + a)
+                self.transport = a
+            elif o == '--scheduler':
+                if a not in pythics.parent.SCHEDULERS:
+                    print("unknown scheduler '%s'" % a)
+                    self.usage()
+                    sys.exit(2)
+                self.logger.info('using scheduler ' + a)
+                self.scheduler = a
+            elif o in ('-p', '--pool'):
+                try:
+                    self.child_pool_size = int(a)
+                except ValueError:
+                    print("pool size should be an integer, not '%s'" % a)
+                    self.usage()
+                    sys.exit(2)
+                self.logger.info('keeping %d pooled processes' % self.child_pool_size)
+            elif o == '--start-method':
+                if a not in multiprocessing.get_all_start_methods():
+                    print("unknown start method '%s'" % a)
+                    self.usage()
+                    sys.exit(2)
+                self.logger.info('using start method ' + a)
+                self.start_method = a
+            elif o == '--record':
+                self.logger.info('recording requests to ' + a)
+                self.record_filename = a
             else:
                 assert False, 'unhandled option'
 
@@ -681,14 +788,25 @@ Options:
 # create and start the application
 #
 if __name__ == '__main__':
-    manager = multiprocessing.Manager()
     application = QtWidgets.QApplication(sys.argv)
-    parent_process = pythics.parent.Parent(manager)
     cl_options_processor = OptionsProcessor()
     cl_options_processor.options()
+    if cl_options_processor.start_method is not None:
+        multiprocessing.set_start_method(cl_options_processor.start_method)
+        if cl_options_processor.start_method == 'forkserver':
+            # start child processes from a server process which has already
+            #   imported the libraries they need
+            multiprocessing.set_forkserver_preload(pythics.child.PRELOAD_MODULES)
+    manager = multiprocessing.Manager()
+    parent_process = pythics.parent.Parent(manager,
+                                           transport=cl_options_processor.transport,
+                                           scheduler=cl_options_processor.scheduler,
+                                           child_pool_size=cl_options_processor.child_pool_size)
     window = MainWindow(parent_process, application, compact=cl_options_processor.compact)
     window.show()
     parent_process.start()
+    if cl_options_processor.record_filename is not None:
+        parent_process.start_recording(cl_options_processor.record_filename)
     if os.path.isfile(cl_options_processor.first_workspace):
         window.open_workspace(cl_options_processor.first_workspace)
     elif os.path.isfile(cl_options_processor.first_app):
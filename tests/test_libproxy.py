@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+# load libraries
+#
+import asyncio
+import concurrent.futures
+import gc
+import multiprocessing
+import queue
+import threading
+import time
+import types
+import unittest
+import weakref
+
+import numpy as np
+
+import pythics.libproxy
+
+
+#
+# ObjectRegistry
+#
+class Thing(object):
+    def method(self):
+        pass
+
+
+class TestObjectRegistry(unittest.TestCase):
+    def test_register_and_release(self):
+        registry = pythics.libproxy.ObjectRegistry()
+        thing = Thing()
+        handle = registry.register(thing)
+        # a second proxy of the same object shares the handle
+        self.assertEqual(registry.register(thing), handle)
+        self.assertIs(registry.lookup(handle), thing)
+        registry.release(handle)
+        self.assertIs(registry.lookup(handle), thing)
+        registry.release(handle)
+        with self.assertRaises(KeyError):
+            registry.lookup(handle)
+        # handles are never reused
+        self.assertNotEqual(registry.register(thing), handle)
+        self.assertEqual(registry.get_stats()['released'], 1)
+
+    def test_pinned(self):
+        registry = pythics.libproxy.ObjectRegistry(max_objects=1)
+        control = Thing()
+        handle = registry.register(control, pin=True)
+        self.assertEqual(registry.register(control), handle)
+        registry.release(handle)
+        for i in range(3):
+            registry.register(Thing())
+        self.assertIs(registry.lookup(handle), control)
+        self.assertEqual(registry.get_stats()['pinned'], 1)
+
+    def test_demotion_to_weak_references(self):
+        registry = pythics.libproxy.ObjectRegistry(max_objects=2)
+        kept = Thing()
+        kept_handle = registry.register(kept)
+        dropped_handle = registry.register(Thing())
+        method = kept.method
+        method_handle = registry.register(method)
+        registry.register(Thing())
+        stats = registry.get_stats()
+        self.assertEqual(stats['live'], 2)
+        self.assertEqual(stats['weak'], 2)
+        self.assertEqual(stats['demoted'], 2)
+        # still available while something else holds the object
+        self.assertIs(registry.lookup(kept_handle), kept)
+        with self.assertRaises(KeyError):
+            registry.lookup(dropped_handle)
+        self.assertEqual(registry.get_stats()['lost'], 1)
+        # a bound method is demoted to a weak reference to the method
+        del method
+        gc.collect()
+        self.assertEqual(registry.lookup(method_handle), kept.method)
+        # a demoted object is still removed when its proxies are released
+        registry.release(kept_handle)
+        with self.assertRaises(KeyError):
+            registry.lookup(kept_handle)
+
+    def test_demoting_objects_without_weak_references(self):
+        registry = pythics.libproxy.ObjectRegistry(max_objects=1)
+        handle = registry.register([1, 2, 3])
+        registry.register(Thing())
+        with self.assertRaises(KeyError):
+            registry.lookup(handle)
+        self.assertEqual(registry.get_stats()['lost'], 1)
+
+
+#
+# ProxyFuture and CallChannel, with plain queues in place of the parent process
+#
+def new_call_channel():
+    lanes = pythics.libproxy.LANE_NAMES
+    process = types.SimpleNamespace(
+        process_id='1',
+        child_to_parent_call_queues=tuple(queue.Queue() for lane in lanes),
+        child_to_parent_call_return_queues=tuple(queue.Queue() for lane in lanes),
+        child_to_parent_call_queue_semaphore=threading.Semaphore(100),
+        instrumentation=None)
+    return pythics.libproxy.CallChannel(process), process
+
+
+def new_proxy_process():
+    # with what ControlProxy._start() needs as well
+    channel, process = new_call_channel()
+    process.call_channel = channel
+    process.call_batcher = None
+    process.shared_array_pool = None
+    process.instrumentation = pythics.libproxy.Instrumentation(multiprocessing.RawValue('b', 0))
+    process.weak_proxy_refs = weakref.WeakSet()
+    process.value_versions = None
+    return process
+
+
+def get_requests(process, lane=pythics.libproxy.LANE_INTERACTIVE):
+    # (opcode, args) of each request sent to the parent process
+    requests = list()
+    q = process.child_to_parent_call_queues[lane]
+    while not q.empty():
+        process_id, f, args, kwargs = q.get()
+        requests.append((f, args))
+    return requests
+
+
+class TestProxyFuture(unittest.TestCase):
+    def setUp(self):
+        self.channel, self.process = new_call_channel()
+
+    def reply(self, value, lane=pythics.libproxy.LANE_INTERACTIVE):
+        self.process.child_to_parent_call_return_queues[lane].put(value)
+
+    def test_returns_match_calls_in_order(self):
+        futures = [self.channel.submit(pythics.libproxy.GET_PROXY_ATTR, (i,), {})
+                   for i in range(5)]
+        for i in range(5):
+            self.reply(10*i)
+        # waiting for a later future reads the earlier return values too
+        self.assertEqual(futures[3].result(1.0), 30)
+        self.assertTrue(futures[0].done())
+        self.assertFalse(futures[4].done())
+        self.assertEqual([f.result(1.0) for f in futures], [0, 10, 20, 30, 40])
+
+    def test_lanes_are_matched_separately(self):
+        interactive = self.channel.submit(pythics.libproxy.GET_PROXY_ATTR, (), {})
+        bulk = self.channel.submit(pythics.libproxy.GET_PROXY_ATTR, (), {},
+                                   lane=pythics.libproxy.LANE_BULK)
+        self.reply('bulk', pythics.libproxy.LANE_BULK)
+        self.assertEqual(bulk.result(1.0), 'bulk')
+        self.assertFalse(interactive.done())
+        self.reply('interactive')
+        self.assertEqual(interactive.result(1.0), 'interactive')
+
+    def test_convert_and_exception(self):
+        converted = self.channel.submit(pythics.libproxy.GET_PROXY_ATTR, (), {},
+                                        convert=lambda r: r + 1)
+        failed = self.channel.submit(pythics.libproxy.GET_PROXY_ATTR, (), {})
+        self.reply(1)
+        self.reply(pythics.libproxy.CrossProcessExceptionProxy('failed'))
+        self.assertEqual(converted.result(1.0), 2)
+        self.assertIsInstance(failed.exception(1.0), pythics.libproxy.CrossProcessException)
+        with self.assertRaises(pythics.libproxy.CrossProcessException):
+            failed.result()
+
+    def test_result_timeout(self):
+        future = self.channel.submit(pythics.libproxy.GET_PROXY_ATTR, (), {})
+        start_time = time.monotonic()
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            future.result(0.05)
+        self.assertLess(time.monotonic() - start_time, 1.0)
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            future.exception(0)
+        # the return value still goes to the right future afterwards
+        self.reply('late')
+        self.assertEqual(future.result(1.0), 'late')
+
+    def test_await(self):
+        future = self.channel.submit(pythics.libproxy.GET_PROXY_ATTR, (), {})
+        abandoned = self.channel.submit(pythics.libproxy.GET_PROXY_ATTR, (), {})
+
+        async def wait():
+            loop = asyncio.get_event_loop()
+            loop.call_later(0.05, self.reply, 'awaited')
+            value = await future
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(abandoned, 0.05)
+            return value
+
+        self.assertEqual(asyncio.run(wait()), 'awaited')
+
+
+class TestCallChannelLanes(unittest.TestCase):
+    def setUp(self):
+        self.channel, self.process = new_call_channel()
+
+    def test_calls_go_in_their_lane(self):
+        self.channel.send(pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 1), {})
+        self.channel.send(pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 2), {},
+                          pythics.libproxy.LANE_BULK)
+        self.channel.send(pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 3), {},
+                          pythics.libproxy.LANE_BULK)
+        self.assertEqual(get_requests(self.process),
+                         [(pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 1))])
+        self.assertEqual(get_requests(self.process, pythics.libproxy.LANE_BULK),
+                         [(pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 2)),
+                          (pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 3))])
+
+    def test_releases_are_sent_in_every_lane(self):
+        self.channel.release_batch_size = 2
+        self.channel.release(pythics.libproxy.ProxyKey(5))
+        self.channel.release(pythics.libproxy.ProxyKey(6))
+        self.channel.send(pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 1), {},
+                          pythics.libproxy.LANE_BULK)
+        self.channel.release(pythics.libproxy.ProxyKey(7))
+        self.channel.release(pythics.libproxy.ProxyKey(8))
+        self.channel.send(pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 2), {})
+        # the handles go once, and the batch is complete when it has
+        #   arrived in both lanes
+        self.assertEqual(get_requests(self.process),
+                         [(pythics.libproxy.RELEASE_PROXIES, ([5, 6], 0, 2)),
+                          (pythics.libproxy.RELEASE_PROXIES, ([7, 8], 1, 2)),
+                          (pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 2))])
+        self.assertEqual(get_requests(self.process, pythics.libproxy.LANE_BULK),
+                         [(pythics.libproxy.RELEASE_PROXIES, ([], 0, 2)),
+                          (pythics.libproxy.SET_PROXY_ATTR, (3, 'value', 1)),
+                          (pythics.libproxy.RELEASE_PROXIES, ([], 1, 2))])
+
+
+#
+# CallBatcher
+#
+class TestCallBatcher(unittest.TestCase):
+    def setUp(self):
+        self.process = new_proxy_process()
+        self.batchers = list()
+
+    def tearDown(self):
+        for batcher in self.batchers:
+            batcher.stop()
+
+    def new_batcher(self, size, window):
+        batcher = pythics.libproxy.CallBatcher(self.process, size, window)
+        self.batchers.append(batcher)
+        return batcher
+
+    def append(self, batcher, values, lane=pythics.libproxy.LANE_INTERACTIVE):
+        for value in values:
+            batcher.append(pythics.libproxy.SET_PROXY_ATTR,
+                           (pythics.libproxy.ProxyKey(3), 'value', value), {}, lane)
+
+    def get_batches(self, lane=pythics.libproxy.LANE_INTERACTIVE):
+        # the values set by the calls in each batch sent
+        batches = list()
+        for f, args in get_requests(self.process, lane):
+            self.assertEqual(f, pythics.libproxy.EXEC_PROXY_BATCH)
+            batches.append([call_args[2] for call_f, call_args, call_kwargs in args[0]])
+        return batches
+
+    def test_flush_on_size(self):
+        batcher = self.new_batcher(4, 10.0)
+        self.append(batcher, range(3))
+        self.assertEqual(self.get_batches(), [])
+        self.append(batcher, range(3, 10))
+        self.assertEqual(self.get_batches(), [[0, 1, 2, 3], [4, 5, 6, 7]])
+        batcher.stop()
+        self.assertEqual(self.get_batches(), [[8, 9]])
+
+    def test_flush_on_window(self):
+        batcher = self.new_batcher(100, 0.05)
+        start_time = time.monotonic()
+        self.append(batcher, range(3))
+        self.assertEqual(self.get_batches(), [])
+        q = self.process.child_to_parent_call_queues[pythics.libproxy.LANE_INTERACTIVE]
+        while q.empty() and (time.monotonic() - start_time < 5.0):
+            time.sleep(0.005)
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.04)
+        self.assertEqual(self.get_batches(), [[0, 1, 2]])
+        # the window starts again with the next call
+        self.append(batcher, [3])
+        time.sleep(0.2)
+        self.assertEqual(self.get_batches(), [[3]])
+
+    def test_lanes_are_batched_separately(self):
+        batcher = self.new_batcher(100, 10.0)
+        self.append(batcher, [1, 2])
+        self.append(batcher, [3], pythics.libproxy.LANE_BULK)
+        batcher.flush()
+        self.assertEqual(self.get_batches(), [[1, 2]])
+        self.assertEqual(self.get_batches(pythics.libproxy.LANE_BULK), [[3]])
+
+    def test_flush_before_call_with_return_value(self):
+        self.process.call_batcher = self.new_batcher(100, 10.0)
+        proxy = pythics.libproxy.AutoProxy(pythics.libproxy.ProxyKey(3))
+        proxy._start(self.process)
+        proxy.value = 1
+        proxy.label = 'a'
+        self.assertEqual(get_requests(self.process), [])
+        self.process.child_to_parent_call_return_queues[pythics.libproxy.LANE_INTERACTIVE].put(1)
+        self.assertEqual(proxy.value, 1)
+        requests = get_requests(self.process)
+        # the batched sets go first, then the get
+        self.assertEqual([f for f, args in requests],
+                         [pythics.libproxy.EXEC_PROXY_BATCH, pythics.libproxy.GET_PROXY_ATTR])
+        self.assertEqual([call[1][1:] for call in requests[0][1][0]], [('value', 1), ('label', 'a')])
+
+
+#
+# the cached value of input controls in AutoProxy
+#
+class TestValueCache(unittest.TestCase):
+    def setUp(self):
+        self.process = new_proxy_process()
+        # as set by the parent process when the control's value changes
+        self.process.value_versions = [0]
+        self.proxy = pythics.libproxy.AutoProxy(pythics.libproxy.ProxyKey(3),
+                                                value_cache_slot=0)
+        self.proxy._start(self.process)
+
+    def get_requests(self):
+        return [(f, args[1:]) for f, args in get_requests(self.process)]
+
+    def read(self, value):
+        # read the value, with the value the parent process returns if asked
+        q = self.process.child_to_parent_call_return_queues[pythics.libproxy.LANE_INTERACTIVE]
+        q.put(value)
+        r = self.proxy.value
+        if self.get_requests() == []:
+            # not asked, so take the reply back
+            q.get_nowait()
+        return r
+
+    def test_cache_hit(self):
+        self.assertEqual(self.read(1.5), 1.5)
+        self.assertEqual(self.read(2.5), 1.5)
+        self.assertEqual(self.proxy._async.value.result(1.0), 1.5)
+        self.assertEqual(self.get_requests(), [])
+
+    def test_invalidated_when_version_changes(self):
+        self.assertEqual(self.read(1.5), 1.5)
+        self.process.value_versions[0] += 1
+        self.assertEqual(self.read(2.5), 2.5)
+        self.assertEqual(self.read(3.5), 2.5)
+
+    def test_dropped_on_set(self):
+        self.assertEqual(self.read(1.5), 1.5)
+        self.proxy.value = 4.0
+        self.assertEqual(self.get_requests(), [(pythics.libproxy.SET_PROXY_ATTR, ('value', 4.0))])
+        self.assertEqual(self.read(4.0), 4.0)
+        self.assertEqual(self.read(5.0), 4.0)
+
+    def test_cached_values_are_copies(self):
+        for value in ([1, 2], dict(a=1), np.arange(3.0)):
+            self.process.value_versions[0] += 1
+            first = self.read(value)
+            index = 'a' if type(value) is dict else 0
+            # changing what was read doesn't change later reads
+            first[index] = 100
+            second = self.read(None)
+            self.assertEqual(type(second), type(value))
+            self.assertEqual(second[index], value[index])
+            self.assertNotEqual(second[index], 100)
+            self.assertIsNot(self.proxy._async.value.result(1.0), second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+# load libraries
+#
+import gc
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+import unittest
+
+import numpy as np
+
+import pythics.libproxy
+import pythics.libtransport
+
+
+#
+# PipeQueue and PipeQueueMux, used within one process
+#
+class TestPipeQueue(unittest.TestCase):
+    def test_round_trip_in_order(self):
+        q = pythics.libtransport.PipeQueue()
+        try:
+            self.assertTrue(q.empty())
+            items = [1, 'two', (3, [4.0]), {'five': None}]
+            for item in items:
+                q.put(item)
+            self.assertFalse(q.empty())
+            self.assertEqual([q.get() for item in items], items)
+            self.assertTrue(q.empty())
+        finally:
+            q.close()
+
+    def test_get_timeout(self):
+        q = pythics.libtransport.PipeQueue()
+        try:
+            with self.assertRaises(queue.Empty):
+                q.get_nowait()
+            start_time = time.monotonic()
+            with self.assertRaises(queue.Empty):
+                q.get(True, 0.05)
+            self.assertGreaterEqual(time.monotonic() - start_time, 0.04)
+        finally:
+            q.close()
+
+    def test_feeder_does_not_block(self):
+        # much more than fits in the pipe, with nobody reading
+        q = pythics.libtransport.PipeQueue()
+        try:
+            q.start_feeder()
+            data = b'x'*(4*2**20)
+            start_time = time.monotonic()
+            q.put(data)
+            q.put('after')
+            self.assertLess(time.monotonic() - start_time, 1.0)
+            self.assertEqual(q.get(True, 5.0), data)
+            self.assertEqual(q.get(True, 5.0), 'after')
+        finally:
+            q.close()
+
+    def test_feeder_discards_data_after_reader_closes(self):
+        q = pythics.libtransport.PipeQueue()
+        q.start_feeder()
+        q.close_reader()
+        q.put(b'x'*(4*2**20))
+        deadline = time.monotonic() + 5.0
+        while (not q._feeder.broken) and (time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.assertTrue(q._feeder.broken)
+        # further puts are dropped instead of raising
+        q.put('lost')
+        q.close()
+
+    def test_mux_reads_all_queues(self):
+        mux = pythics.libtransport.PipeQueueMux()
+        a = pythics.libtransport.PipeQueue()
+        b = pythics.libtransport.PipeQueue()
+        mux.add(a)
+        mux.add(b)
+        self.assertEqual(len(mux), 2)
+        a.put(('a', 1))
+        b.put(('b', 1))
+        a.put(('a', 2))
+        received = [mux.get(True, 1.0) for i in range(3)]
+        self.assertEqual(sorted(received), [('a', 1), ('a', 2), ('b', 1)])
+        # requests from one queue stay in order
+        self.assertLess(received.index(('a', 1)), received.index(('a', 2)))
+        with self.assertRaises(queue.Empty):
+            mux.get(True, 0.05)
+        a.close()
+        b.close()
+
+    def test_mux_local_put_and_drop(self):
+        mux = pythics.libtransport.PipeQueueMux()
+        a = pythics.libtransport.PipeQueue()
+        mux.add(a)
+        mux.put('local')
+        self.assertEqual(mux.get(True, 1.0), 'local')
+        a.put('last')
+        # the writer closes, as when a child process exits
+        a.close_writer()
+        self.assertEqual(mux.get(True, 1.0), 'last')
+        with self.assertRaises(queue.Empty):
+            mux.get(True, 0.05)
+        self.assertEqual(len(mux), 0)
+
+
+#
+# FlowControl, with the child and parent processes simulated in turn
+#
+def count_credits(flow_control):
+    n = 0
+    while flow_control.credits.acquire(False):
+        n += 1
+    for i in range(n):
+        flow_control.credits.release()
+    return n
+
+
+class TestFlowControl(unittest.TestCase):
+    def run_requests(self, flow_control, n):
+        # each request executes as soon as it is received
+        for i in range(n):
+            self.assertTrue(flow_control.credits.acquire(False))
+            flow_control.request_received()
+            flow_control.request_executed()
+
+    def test_window_limits(self):
+        with self.assertRaises(ValueError):
+            pythics.libtransport.FlowControl(0, 4)
+        with self.assertRaises(ValueError):
+            pythics.libtransport.FlowControl(4, 2)
+
+    def test_starts_at_min_window(self):
+        flow_control = pythics.libtransport.FlowControl(3, 8)
+        self.assertEqual(flow_control.window, 3)
+        self.assertEqual(count_credits(flow_control), 3)
+
+    def test_existing_semaphore(self):
+        credits = multiprocessing.Semaphore(0)
+        flow_control = pythics.libtransport.FlowControl(2, 8, credits)
+        self.assertIs(flow_control.credits, credits)
+        self.assertEqual(count_credits(flow_control), 2)
+
+    def test_window_grows_without_backlog(self):
+        flow_control = pythics.libtransport.FlowControl(2, 8)
+        self.run_requests(flow_control, 200)
+        self.assertEqual(flow_control.window, 8)
+        self.assertEqual(count_credits(flow_control), 8)
+        self.assertEqual(flow_control.get_stats()['backlog'], 0)
+
+    def test_window_shrinks_with_backlog(self):
+        flow_control = pythics.libtransport.FlowControl(2, 8)
+        self.run_requests(flow_control, 200)
+        # the GUI falls behind by a full window
+        for i in range(8):
+            self.assertTrue(flow_control.credits.acquire(False))
+            flow_control.request_received()
+        self.assertFalse(flow_control.credits.acquire(False))
+        for i in range(8):
+            flow_control.request_executed()
+        self.assertLess(flow_control.window, 8)
+        self.assertGreaterEqual(flow_control.window, 2)
+        self.assertEqual(flow_control.max_backlog, 7)
+        # once idle, one credit is in circulation for each place in the window
+        self.assertEqual(count_credits(flow_control), flow_control.window)
+
+
+#
+# SharedArrayPool and SharedArrayMapper, with both ends in one process
+#
+@unittest.skipUnless(pythics.libtransport.shared_memory_available,
+                     'requires shared memory')
+class TestSharedArrays(unittest.TestCase):
+    def setUp(self):
+        self.pool = pythics.libtransport.SharedArrayPool(threshold=1024, max_total_size=2**17)
+        self.mapper = pythics.libtransport.SharedArrayMapper()
+
+    def tearDown(self):
+        self.mapper.close()
+        self.pool.close()
+
+    def send(self, array):
+        # as the array would arrive in the parent process
+        return pickle.loads(pickle.dumps(self.pool.pack(array)))
+
+    def test_small_and_object_arrays_are_pickled(self):
+        small = np.arange(10)
+        self.assertIs(self.pool.pack(small), small)
+        objects = np.array([object()]*1000)
+        self.assertIs(self.pool.pack(objects), objects)
+
+    def test_round_trip(self):
+        for array in (np.arange(4096, dtype=np.float64),
+                      np.arange(3000, dtype=np.int32).reshape(30, 100),
+                      np.ones((64, 64), dtype=np.complex64)):
+            shared_array = self.send(array)
+            self.assertIs(type(shared_array), pythics.libproxy.SharedArray)
+            view = self.mapper.view(shared_array)
+            self.assertEqual(view.dtype, array.dtype)
+            np.testing.assert_array_equal(view, array)
+            copy = self.mapper.copy(shared_array)
+            np.testing.assert_array_equal(copy, array)
+
+    def test_segment_is_reused_once_views_are_gone(self):
+        array = np.arange(4096, dtype=np.float64)
+        first = self.send(array)
+        view = self.mapper.view(first)
+        # still in use by the GUI, so the next array needs another segment
+        second = self.send(array + 1)
+        self.assertNotEqual(second.name, first.name)
+        self.mapper.view(second)
+        del view
+        gc.collect()
+        third = self.send(array + 2)
+        self.assertIn(third.name, (first.name, second.name))
+        np.testing.assert_array_equal(self.mapper.view(third), array + 2)
+
+    def test_unlinked_segments_are_unmapped(self):
+        first = self.send(np.arange(4096, dtype=np.float64))
+        self.mapper.view(first)
+        gc.collect()
+        # too large for the free segment and for the space left, so the
+        #   free segment is unlinked to make room
+        big = np.arange(12000, dtype=np.float64)
+        second = self.send(big)
+        self.assertNotEqual(second.name, first.name)
+        self.assertEqual(second.released, (first.name,))
+        np.testing.assert_array_equal(self.mapper.view(second), big)
+        self.assertNotIn(first.name, self.mapper._segments)
+        self.assertEqual(self.mapper._closing, [])
+        # reported only once
+        self.assertEqual(self.send(big).released, ())
+
+    def test_pickled_when_full(self):
+        array = np.arange(12000, dtype=np.float64)
+        shared_array = self.send(array)
+        view = self.mapper.view(shared_array)
+        # no space for another segment while the first is in use
+        self.assertIs(self.pool.pack(array), array)
+        del view
+
+
+#
+# SharedNamespace, with readers and writers in threads of one process
+#
+@unittest.skipUnless(pythics.libtransport.shared_memory_available,
+                     'requires shared memory')
+class TestSharedNamespace(unittest.TestCase):
+    FIELDS = dict(count='int64', level='float64', trace=('float32', 16))
+
+    def setUp(self):
+        self.namespace = pythics.libtransport.SharedNamespace(self.FIELDS)
+
+    def tearDown(self):
+        self.namespace.close(unlink=True)
+
+    def test_read_and_write(self):
+        namespace = self.namespace
+        self.assertEqual(namespace.count, 0)
+        self.assertEqual(namespace.version('count'), 0)
+        namespace.count = 7
+        namespace.level = 0.25
+        namespace.trace = np.arange(16)
+        self.assertEqual(namespace.count, 7)
+        self.assertEqual(namespace.level, 0.25)
+        np.testing.assert_array_equal(namespace.trace, np.arange(16, dtype=np.float32))
+        self.assertEqual(namespace.version('count'), 1)
+        namespace.count += 1
+        self.assertEqual(namespace.version('count'), 2)
+        self.assertEqual(namespace.version('level'), 1)
+        self.assertEqual(sorted(dir(namespace)), ['count', 'level', 'trace', 'version'])
+        with self.assertRaises(AttributeError):
+            namespace.missing
+        with self.assertRaises(AttributeError):
+            namespace.missing = 1
+
+    def test_returned_arrays_are_copies(self):
+        self.namespace.trace = np.ones(16)
+        trace = self.namespace.trace
+        self.namespace.trace = np.zeros(16)
+        np.testing.assert_array_equal(trace, np.ones(16))
+
+    def test_invalid_fields(self):
+        for fields in (dict(_hidden='int64'), dict(version='int64'), dict(text='U8')):
+            with self.assertRaises(ValueError):
+                pythics.libtransport.SharedNamespace.get_layout(fields)
+
+    def test_pickle_attaches_to_the_same_memory(self):
+        other = pickle.loads(pickle.dumps(self.namespace))
+        try:
+            self.namespace.level = 3.5
+            self.assertEqual(other.level, 3.5)
+            other.count = 11
+            self.assertEqual(self.namespace.count, 11)
+        finally:
+            other.close()
+
+    def test_read_waits_for_write_in_progress(self):
+        sequences = self.namespace._sequences
+        # a writer has started, but not finished, writing the field
+        sequences['count'][...] = 1
+        values = list()
+        reader = threading.Thread(target=lambda: values.append(self.namespace.count))
+        reader.start()
+        time.sleep(0.05)
+        self.assertEqual(values, [])
+        self.namespace._data['count'][...] = 5
+        sequences['count'][...] = 2
+        reader.join(5.0)
+        self.assertEqual(values, [5])
+
+    def test_reads_are_never_torn(self):
+        stop = threading.Event()
+
+        def write():
+            i = 0
+            while not stop.is_set():
+                i += 1
+                self.namespace.trace = np.full(16, i)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for j in range(2000):
+                trace = self.namespace.trace
+                self.assertTrue(np.all(trace == trace[0]))
+        finally:
+            stop.set()
+            writer.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+# load libraries
+#
+import queue
+import time
+import unittest
+
+import pythics.libproxy
+import pythics.libtransport
+import pythics.parent
+
+
+#
+# stands in for pythics.parent.ChildInterface, keeping the messages sent to
+#   the child process
+#
+class ChildInterface(object):
+    def __init__(self, process_id):
+        self.process_id = process_id
+        self.name = 'app_' + process_id
+        self.parent_to_child_call_queue = queue.Queue()
+        self.stopped = False
+
+    def exec_parent_to_proxy_call_request(self, proxy_id, method, *args, **kwargs):
+        message = pythics.libproxy.ProxyMessage(proxy_id, method, *args, **kwargs)
+        self.parent_to_child_call_queue.put((None, message))
+
+    def stop(self):
+        self.stopped = True
+
+    def get_messages(self):
+        messages = list()
+        while not self.parent_to_child_call_queue.empty():
+            m = self.parent_to_child_call_queue.get()[1]
+            messages.append((m.proxy_id, m.method) + m.args)
+        return messages
+
+
+#
+# EventBus and the GlobalAction subscriptions of Parent
+#
+class TestEventBus(unittest.TestCase):
+    def setUp(self):
+        self.parent = pythics.parent.Parent(None, transport='pipe')
+        for process_id in ('1', '2'):
+            self.parent.child_processes[process_id] = ChildInterface(process_id)
+
+    def test_publish_to_subscribers(self):
+        parent = self.parent
+        parent.new_global_action('1', 'go', pythics.libproxy.ProxyKey(5))
+        parent.new_global_action('2', 'go', pythics.libproxy.ProxyKey(5))
+        # the same id in a SubWindow of the same app is another subscriber
+        parent.new_global_action('1', 'go', pythics.libproxy.ProxyKey(9))
+        parent.new_global_action('2', 'other', pythics.libproxy.ProxyKey(6))
+        parent.trigger_global_action('go', 'payload')
+        first = parent.child_processes['1'].get_messages()
+        second = parent.child_processes['2'].get_messages()
+        self.assertEqual([m[:4] for m in first], [(5, '_receive_event', 'go', 'payload'),
+                                                  (9, '_receive_event', 'go', 'payload')])
+        self.assertEqual([m[:4] for m in second], [(5, '_receive_event', 'go', 'payload')])
+        stats = parent.event_bus.get_stats()
+        self.assertEqual(stats['topics'], dict(go=3, other=1))
+        self.assertEqual((stats['published'], stats['delivered']), (1, 3))
+
+    def test_publish_keeps_sent_time(self):
+        parent = self.parent
+        parent.new_global_action('1', 'go', pythics.libproxy.ProxyKey(5))
+        parent.event_bus.publish('go', None, 123.0)
+        self.assertEqual(parent.child_processes['1'].get_messages(),
+                         [(5, '_receive_event', 'go', None, 123.0)])
+
+    def test_publish_without_subscribers(self):
+        parent = self.parent
+        parent.trigger_global_action('nobody')
+        self.assertEqual(parent.event_bus.get_stats()['unsubscribed'], 1)
+        self.assertEqual(parent.child_processes['1'].get_messages(), [])
+
+    def test_skips_processes_not_started(self):
+        parent = self.parent
+        parent.new_global_action('1', 'go', pythics.libproxy.ProxyKey(5))
+        parent.new_global_action('2', 'go', pythics.libproxy.ProxyKey(5))
+        # not started yet
+        parent.child_processes['1'].parent_to_child_call_queue = None
+        parent.trigger_global_action('go')
+        self.assertEqual(len(parent.child_processes['2'].get_messages()), 1)
+        self.assertEqual(parent.event_bus.get_stats()['delivered'], 1)
+
+    def test_unsubscribe_on_close(self):
+        parent = self.parent
+        parent.new_global_action('1', 'go', pythics.libproxy.ProxyKey(5))
+        parent.new_global_action('1', 'only_first', pythics.libproxy.ProxyKey(6))
+        parent.new_global_action('2', 'go', pythics.libproxy.ProxyKey(5))
+        first = parent.child_processes['1']
+        parent.stop_child_process(first)
+        self.assertTrue(first.stopped)
+        self.assertNotIn('1', parent.child_processes)
+        self.assertEqual(parent.event_bus.get_stats()['topics'], dict(go=1))
+        parent.trigger_global_action('go')
+        self.assertEqual(len(parent.child_processes['2'].get_messages()), 1)
+        self.assertEqual(first.get_messages(), [])
+
+
+#
+# a ChildInterface without a child process, with requests passed to it as
+#   the queue watcher threads would
+#
+class Indicator(object):
+    def __init__(self):
+        # every value set, in order
+        self.values = [0]
+        self.label = ''
+
+    def _get_value(self):
+        return self.values[-1]
+
+    def _set_value(self, value):
+        self.values.append(value)
+
+    value = property(_get_value, _set_value)
+
+    def reset(self):
+        self.values.append('reset')
+
+
+def new_app(parent):
+    app = parent.new_child_process('', 'app.xml', [], {})
+    app.flow_control = pythics.libtransport.FlowControl(100, 100)
+    app.child_to_parent_call_return_queues = tuple(queue.Queue() for lane in pythics.libproxy.LANE_NAMES)
+    app.child_to_parent_call_return_queue = app.child_to_parent_call_return_queues[0]
+    return app
+
+
+def receive(app, function_name, *args, lane=pythics.libproxy.LANE_INTERACTIVE):
+    app.request_received((app.process_id, function_name, args, {}), lane)
+
+
+def execute(app):
+    while app.has_pending_commands():
+        command, lane = app.next_pending_command()
+        app.exec_child_to_parent_call_request(command[1], command[2], command[3], lane)
+
+
+class TestCoalescing(unittest.TestCase):
+    def setUp(self):
+        self.parent = pythics.parent.Parent(None, transport='pipe')
+        self.app = new_app(self.parent)
+        self.indicator = Indicator()
+        self.key = self.app.new_ProxyKey(self.indicator, pin=True)
+        self.app.coalesced_keys.add(self.key.key)
+
+    def set(self, value, name='value'):
+        receive(self.app, pythics.libproxy.SET_PROXY_ATTR, self.key, name, value)
+
+    def assertNothingKept(self):
+        self.assertEqual(self.app.latest_sets, {})
+        self.assertEqual(self.app.superseded_sets, {})
+
+    def test_skips_superseded_sets(self):
+        for i in range(1, 4):
+            self.set(i)
+        execute(self.app)
+        self.assertEqual(self.indicator.values, [0, 3])
+        self.assertEqual(self.app.get_stats()['coalesced'], 2)
+        self.assertNothingKept()
+
+    def test_properties_are_separate(self):
+        self.set(1)
+        self.set('a', 'label')
+        self.set(2)
+        execute(self.app)
+        self.assertEqual(self.indicator.values, [0, 2])
+        self.assertEqual(self.indicator.label, 'a')
+        self.assertNothingKept()
+
+    def test_get_in_between_sees_older_set(self):
+        self.set(1)
+        receive(self.app, pythics.libproxy.GET_PROXY_ATTR, self.key, 'value')
+        self.set(2)
+        self.set(3)
+        execute(self.app)
+        self.assertEqual(self.app.child_to_parent_call_return_queue.get_nowait(), 1)
+        self.assertEqual(self.indicator.values, [0, 1, 3])
+        self.assertNothingKept()
+
+    def test_call_in_between_sees_older_set(self):
+        self.set(1)
+        receive(self.app, pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, self.key, 'reset')
+        self.set(2)
+        execute(self.app)
+        self.assertEqual(self.indicator.values, [0, 1, 'reset', 2])
+        self.assertNothingKept()
+
+    def test_batches(self):
+        receive(self.app, pythics.libproxy.EXEC_PROXY_BATCH,
+                [(pythics.libproxy.SET_PROXY_ATTR, (self.key, 'value', 1), {}),
+                 (pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, (self.key, 'reset'), {}),
+                 (pythics.libproxy.SET_PROXY_ATTR, (self.key, 'value', 2), {})])
+        receive(self.app, pythics.libproxy.EXEC_PROXY_BATCH,
+                [(pythics.libproxy.SET_PROXY_ATTR, (self.key, 'value', 3), {})])
+        execute(self.app)
+        self.assertEqual(self.indicator.values, [0, 1, 'reset', 3])
+        self.assertNothingKept()
+
+    def test_executed_set_is_not_superseded(self):
+        self.set(1)
+        execute(self.app)
+        self.set(2)
+        execute(self.app)
+        self.assertEqual(self.indicator.values, [0, 1, 2])
+        self.assertNothingKept()
+
+    def test_other_controls_are_not_coalesced(self):
+        other = Indicator()
+        key = self.app.new_ProxyKey(other, pin=True)
+        for i in range(1, 4):
+            receive(self.app, pythics.libproxy.SET_PROXY_ATTR, key, 'value', i)
+        execute(self.app)
+        self.assertEqual(other.values, [0, 1, 2, 3])
+        self.assertNothingKept()
+
+
+class TestLanes(unittest.TestCase):
+    def setUp(self):
+        self.parent = pythics.parent.Parent(None, transport='pipe', frame_time=10.0)
+        self.app = new_app(self.parent)
+        self.indicator = Indicator()
+        self.key = self.app.new_ProxyKey(self.indicator, pin=True)
+
+    def set(self, value, lane):
+        receive(self.app, pythics.libproxy.SET_PROXY_ATTR, self.key, 'value', value, lane=lane)
+
+    def test_interactive_lane_goes_first(self):
+        for i in range(3):
+            self.set(i, pythics.libproxy.LANE_BULK)
+        self.set('a', pythics.libproxy.LANE_INTERACTIVE)
+        self.set('b', pythics.libproxy.LANE_INTERACTIVE)
+        self.parent.exec_pending_commands()
+        self.assertEqual(self.indicator.values, [0, 'a', 'b', 0, 1, 2])
+        self.assertFalse(self.app.has_pending_commands())
+
+    def test_interactive_request_overtakes_waiting_bulk_requests(self):
+        for i in range(3):
+            self.set(i, pythics.libproxy.LANE_BULK)
+        command, lane = self.app.next_pending_command()
+        self.app.exec_child_to_parent_call_request(command[1], command[2], command[3], lane)
+        self.set('a', pythics.libproxy.LANE_INTERACTIVE)
+        execute(self.app)
+        self.assertEqual(self.indicator.values, [0, 0, 'a', 1, 2])
+
+    def test_release_waits_for_every_lane(self):
+        key = self.app.new_ProxyKey(Indicator())
+        # as sent by pythics.libproxy.CallChannel, after a call in the bulk lane
+        receive(self.app, pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, key, 'reset',
+                lane=pythics.libproxy.LANE_BULK)
+        receive(self.app, pythics.libproxy.RELEASE_PROXIES, [key.key], 0, 2,
+                lane=pythics.libproxy.LANE_INTERACTIVE)
+        receive(self.app, pythics.libproxy.RELEASE_PROXIES, [], 0, 2,
+                lane=pythics.libproxy.LANE_BULK)
+        command, lane = self.app.next_pending_command()
+        self.assertEqual(lane, pythics.libproxy.LANE_INTERACTIVE)
+        self.app.exec_child_to_parent_call_request(command[1], command[2], command[3], lane)
+        # still there for the call in the bulk lane
+        self.assertEqual(self.app.lookup(key).values, [0])
+        command, lane = self.app.next_pending_command()
+        self.app.exec_child_to_parent_call_request(command[1], command[2], command[3], lane)
+        self.assertEqual(self.app.lookup(key).values, [0, 'reset'])
+        execute(self.app)
+        with self.assertRaises(KeyError):
+            self.app.lookup(key)
+        self.assertEqual(self.app.pending_releases, {})
+
+
+#
+# sharing GUI time between apps, see Parent.exec_pending_commands()
+#
+class Worker(object):
+    def __init__(self):
+        self.n_calls = 0
+
+    def work(self, t):
+        end_time = time.perf_counter() + t
+        while time.perf_counter() < end_time:
+            pass
+        self.n_calls += 1
+
+
+class TestScheduler(unittest.TestCase):
+    def run_frame(self, scheduler, slow_budget=None, fast_budget=None, n_fast=100):
+        # one frame, with a slow app and a fast app which both have work
+        #   for longer than the frame
+        parent = pythics.parent.Parent(None, transport='pipe', frame_time=0.02,
+                                       scheduler=scheduler)
+        workers = list()
+        for t, n, budget in ((0.002, 20, slow_budget), (0.0002, n_fast, fast_budget)):
+            app = new_app(parent)
+            app.gui_budget = budget
+            worker = Worker()
+            key = app.new_ProxyKey(worker, pin=True)
+            for i in range(n):
+                receive(app, pythics.libproxy.CALL_PROXY_METHOD_NO_RETURN, key, 'work', t)
+            workers.append((app, worker))
+        parent.exec_pending_commands()
+        return workers
+
+    def test_round_robin(self):
+        # one request from each app in turn
+        (slow, slow_worker), (fast, fast_worker) = self.run_frame('round_robin')
+        self.assertLess(slow_worker.n_calls, 20)
+        self.assertLessEqual(abs(slow_worker.n_calls - fast_worker.n_calls), 1)
+        self.assertGreater(slow.get_scheduler_stats()['last_frame_gui_time_ms'],
+                           5*fast.get_scheduler_stats()['last_frame_gui_time_ms'])
+
+    def test_weighted(self):
+        # equal GUI time for each app
+        (slow, slow_worker), (fast, fast_worker) = self.run_frame('weighted')
+        self.assertLess(fast_worker.n_calls, 100)
+        self.assertGreater(fast_worker.n_calls, 3*slow_worker.n_calls)
+        slow_time = slow.get_scheduler_stats()['last_frame_gui_time_ms']
+        fast_time = fast.get_scheduler_stats()['last_frame_gui_time_ms']
+        # within the time of one slow request
+        self.assertLess(abs(slow_time - fast_time), 2.5)
+
+    def test_round_robin_with_budget(self):
+        # the slow app stops once it has used its budget for the frame
+        (slow, slow_worker), (fast, fast_worker) = self.run_frame('round_robin', slow_budget=0.004)
+        self.assertIn(slow_worker.n_calls, (2, 3))
+        self.assertGreater(fast_worker.n_calls, 10*slow_worker.n_calls)
+        stats = slow.get_scheduler_stats()
+        self.assertEqual(stats['gui_budget_ms'], 4.0)
+        self.assertEqual(stats['queue_depth'][pythics.libproxy.LANE_INTERACTIVE],
+                         20 - slow_worker.n_calls)
+
+    def test_weighted_with_budgets(self):
+        # GUI time is shared in proportion to the budgets, until they are used
+        (slow, slow_worker), (fast, fast_worker) = self.run_frame('weighted', 0.012, 0.004, 200)
+        slow_time = slow.get_scheduler_stats()['last_frame_gui_time_ms']
+        fast_time = fast.get_scheduler_stats()['last_frame_gui_time_ms']
+        self.assertGreaterEqual(slow_time, 12.0)
+        self.assertLess(slow_time, 12.0 + 2.5)
+        self.assertGreaterEqual(fast_time, 4.0)
+        self.assertLess(fast_time, 4.0 + 0.5)
+        self.assertTrue(slow.has_pending_commands())
+        self.assertTrue(fast.has_pending_commands())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+# load libraries
+#
+import concurrent.futures
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import pythics.child
+import pythics.libproxy
+import pythics.proxies
+
+
+#
+# stands in for pythics.child.Child, running the calls queued by Timers in
+#   a process loop thread and recording when each action runs
+#
+class Process(object):
+    def __init__(self, action_time=0.0, is_concurrent=False):
+        self.action_time = action_time
+        self.parent_to_child_call_queue = queue.Queue()
+        self.timer_scheduler = None
+        self.proxies = dict()
+        # (start time, end time) of each action
+        self.calls = list()
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+        if is_concurrent:
+            self.executor = concurrent.futures.ThreadPoolExecutor(4)
+        else:
+            self.executor = None
+        self.thread = threading.Thread(target=self.process_loop)
+        self.thread.start()
+
+    def new_timer(self, proxy_id='timer'):
+        timer = pythics.proxies.TimerProxy(proxy_id, 'module.action')
+        timer._start(self)
+        self.proxies[proxy_id] = timer
+        return timer
+
+    def get_timer_scheduler(self):
+        if self.timer_scheduler is None:
+            self.timer_scheduler = pythics.proxies.TimerScheduler()
+        return self.timer_scheduler
+
+    def process_loop(self):
+        while True:
+            message = self.parent_to_child_call_queue.get()
+            if message is None:
+                break
+            m = message[1]
+            getattr(self.proxies[m.proxy_id], m.method)(*m.args, **m.kwargs)
+
+    def dispatch_action(self, module_name, function_name, sent_time):
+        if self.executor is not None:
+            return self.executor.submit(self.exec_action)
+        self.exec_action()
+
+    def exec_action(self):
+        start_time = time.monotonic()
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.action_time)
+        with self.lock:
+            self.running -= 1
+            self.calls.append((start_time, time.monotonic()))
+
+    def stop(self):
+        for timer in self.proxies.values():
+            timer._stop()
+        self.parent_to_child_call_queue.put(None)
+        self.thread.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        if self.timer_scheduler is not None:
+            self.timer_scheduler.stop()
+
+
+#
+# TimerScheduler and TimerProxy
+#
+class TestTimer(unittest.TestCase):
+    def run_timer(self, duration, interval, catch_up='burst', action_time=0.0,
+                  is_concurrent=False):
+        process = Process(action_time, is_concurrent)
+        try:
+            timer = process.new_timer()
+            start_time = time.monotonic()
+            timer.start(interval, catch_up=catch_up)
+            time.sleep(duration)
+            timer.stop()
+            # let the calls already queued finish
+            time.sleep(2*action_time + 0.05)
+        finally:
+            process.stop()
+        return process, timer.get_statistics(), start_time
+
+    def test_calls_at_fixed_deadlines(self):
+        interval = 0.02
+        process, statistics, start_time = self.run_timer(0.41, interval)
+        self.assertAlmostEqual(statistics['ticks'], 20, delta=1)
+        # one call at zero, then one for each deadline
+        self.assertEqual(statistics['calls'], statistics['ticks'] + 1)
+        self.assertEqual(len(process.calls), statistics['calls'])
+        self.assertEqual(statistics['missed'], 0)
+        # the calls don't drift from the grid of deadlines
+        for i, (call_start, call_end) in enumerate(process.calls):
+            self.assertAlmostEqual(call_start - start_time, i*interval, delta=0.015)
+
+    def test_several_timers(self):
+        process = Process()
+        try:
+            fast = process.new_timer('fast')
+            slow = process.new_timer('slow')
+            fast.start(0.01, call_at_zero=False)
+            slow.start(0.03, call_at_zero=False)
+            time.sleep(0.305)
+            fast.stop()
+            slow.stop()
+        finally:
+            process.stop()
+        n_fast = fast.get_statistics()['calls']
+        n_slow = slow.get_statistics()['calls']
+        self.assertAlmostEqual(n_fast, 30, delta=1)
+        self.assertAlmostEqual(n_slow, 10, delta=1)
+        self.assertEqual(len(process.calls), n_fast + n_slow)
+
+    def test_stop(self):
+        process = Process()
+        try:
+            timer = process.new_timer()
+            timer.start(0.01)
+            time.sleep(0.05)
+            timer.stop()
+            self.assertFalse(timer.running)
+            n_calls = timer.get_statistics()['calls']
+            time.sleep(0.05)
+            self.assertEqual(timer.get_statistics()['calls'], n_calls)
+            with self.assertRaises(RuntimeWarning):
+                timer.stop()
+        finally:
+            process.stop()
+
+    def test_invalid_catch_up(self):
+        process = Process()
+        try:
+            timer = process.new_timer()
+            with self.assertRaises(ValueError):
+                timer.start(0.01, catch_up='later')
+            self.assertFalse(timer.running)
+        finally:
+            process.stop()
+
+    def test_burst(self):
+        # every call is made, so the calls pile up behind the slow action
+        process, statistics, start_time = self.run_timer(0.2, 0.02, 'burst', 0.05)
+        self.assertEqual(statistics['catch_up'], 'burst')
+        self.assertEqual(statistics['missed'], 0)
+        self.assertGreater(statistics['overruns'], 0)
+        self.assertEqual(statistics['calls'], statistics['ticks'] + 1)
+        self.assertEqual(len(process.calls), statistics['calls'])
+
+    def test_skip(self):
+        process, statistics, start_time = self.run_timer(0.3, 0.02, 'skip', 0.05)
+        self.assertGreater(statistics['missed'], 0)
+        self.assertEqual(statistics['missed'], statistics['overruns'])
+        self.assertEqual(statistics['calls'],
+                         statistics['ticks'] + 1 - statistics['missed'])
+        self.assertEqual(len(process.calls), statistics['calls'])
+
+    def test_skip_concurrent_action(self):
+        # a concurrent action is still pending until it finishes, so the
+        #   calls don't overlap
+        process, statistics, start_time = self.run_timer(0.3, 0.02, 'skip', 0.05,
+                                                         is_concurrent=True)
+        self.assertGreater(statistics['missed'], 0)
+        self.assertEqual(process.max_running, 1)
+        self.assertEqual(len(process.calls), statistics['calls'])
+
+    def test_coalesce(self):
+        # one call is made for the dropped calls as soon as the action
+        #   finishes, so the action runs back to back
+        process, statistics, start_time = self.run_timer(0.3, 0.02, 'coalesce', 0.05)
+        self.assertGreater(statistics['missed'], 0)
+        self.assertEqual(len(process.calls), statistics['calls'])
+        gaps = [b[0] - a[1] for a, b in zip(process.calls[:-1], process.calls[1:])]
+        self.assertLess(max(gaps), 0.01)
+
+    def test_require_retrigger(self):
+        process = Process()
+        try:
+            timer = process.new_timer()
+            timer.start(0.01, require_retrigger=True)
+            time.sleep(0.05)
+            # only the call at zero, then waiting for retrigger()
+            self.assertEqual(timer.get_statistics()['calls'], 1)
+            self.assertTrue(timer.delayed)
+            timer.retrigger()
+            time.sleep(0.05)
+            self.assertEqual(timer.get_statistics()['calls'], 2)
+            timer.stop()
+        finally:
+            process.stop()
+
+
+#
+# a real Child running in a thread, with plain queues in place of the parent
+#   process, and actions from a module written to a temporary directory
+#
+ACTIONS = """
+import os
+import time
+
+calls = []
+events = []
+
+def tick(**kwargs):
+    calls.append(time.monotonic())
+
+def on_event(sub, **kwargs):
+    events.append(sub['action'].payload)
+
+def square(x):
+    return x*x
+
+def worker_pid():
+    return os.getpid()
+"""
+
+
+class ChildProcess(object):
+    def __init__(self, control_proxies):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, 'child_actions.py'), 'w') as f:
+            f.write(ACTIONS)
+        lanes = pythics.libproxy.LANE_NAMES
+        self.parent_to_child_call_queue = queue.Queue()
+        self.child = pythics.child.Child('1', tuple(queue.Queue() for lane in lanes),
+                                         tuple(queue.Queue() for lane in lanes),
+                                         threading.Semaphore(100),
+                                         self.parent_to_child_call_queue,
+                                         self.directory.name, ['child_actions'],
+                                         control_proxies,
+                                         dict(shared_memory_threshold=None))
+        self.thread = threading.Thread(target=self.child.process_loop)
+        self.thread.start()
+        # the proxies are started before the modules are loaded
+        deadline = time.monotonic() + 5.0
+        while ('child_actions' not in self.child.modules) and (time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.module = self.child.modules['child_actions']
+
+    def stop(self):
+        self.parent_to_child_call_queue.put((None, None))
+        self.thread.join()
+        sys.path.remove(self.directory.name)
+        sys.modules.pop('child_actions', None)
+        self.directory.cleanup()
+
+
+class TestTimerInSubWindow(unittest.TestCase):
+    def test_calls_reach_timer_in_sub_window(self):
+        # the calls are addressed by handle, not by the top-level control id
+        timer = pythics.proxies.TimerProxy(7, 'child_actions.tick')
+        process = ChildProcess(dict(sub=pythics.proxies.SubWindowProxy(timer=timer)))
+        try:
+            timer.start(0.02, catch_up='skip')
+            time.sleep(0.21)
+            timer.stop()
+            time.sleep(0.05)
+        finally:
+            process.stop()
+        statistics = timer.get_statistics()
+        self.assertAlmostEqual(statistics['calls'], 11, delta=1)
+        self.assertEqual(statistics['missed'], 0)
+        self.assertEqual(len(process.module.calls), statistics['calls'])
+        self.assertEqual(timer._pending, 0)
+
+
+class TestGlobalAction(unittest.TestCase):
+    def test_events_reach_action_in_sub_window(self):
+        action = pythics.proxies.GlobalActionProxy(8, 'child_actions.on_event',
+                                                   pythics.libproxy.ProxyKey(8))
+        process = ChildProcess(dict(sub=pythics.proxies.SubWindowProxy(action=action)))
+        try:
+            # as sent by pythics.parent.EventBus.publish
+            for i in range(3):
+                process.parent_to_child_call_queue.put((None, pythics.libproxy.ProxyMessage(
+                    8, '_receive_event', 'topic', i, time.time())))
+        finally:
+            process.stop()
+        self.assertEqual(process.module.events, [0, 1, 2])
+        self.assertEqual(action.n_received, 3)
+        self.assertEqual(action.payload, 2)
+        self.assertEqual(action.get_latency_statistics()['count'], 3)
+
+    def test_event_without_action(self):
+        action = pythics.proxies.GlobalActionProxy(8, None, pythics.libproxy.ProxyKey(8))
+        process = ChildProcess(dict(action=action))
+        try:
+            process.parent_to_child_call_queue.put((None, pythics.libproxy.ProxyMessage(
+                8, '_receive_event', 'topic', 'payload', time.time())))
+        finally:
+            process.stop()
+        self.assertEqual(action.n_received, 1)
+        self.assertEqual(action.payload, 'payload')
+        self.assertEqual(process.module.events, [])
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_submit_and_map(self):
+        main = pythics.proxies.MainProxy(pythics.libproxy.ProxyKey(1))
+        process = ChildProcess(dict(main=main))
+        try:
+            square = process.module.square
+            future = main.submit(square, 7)
+            self.assertEqual(future.result(30.0), 49)
+            self.assertEqual(list(main.map(square, range(10), timeout=30.0)),
+                             [i*i for i in range(10)])
+            futures = [main.submit(square, i) for i in range(4)]
+            done = main.as_completed(futures, timeout=30.0)
+            self.assertEqual(sorted(f.result() for f in done), [0, 1, 4, 9])
+            self.assertNotEqual(main.submit(process.module.worker_pid).result(30.0),
+                                os.getpid())
+            # workers are never forked from the child process
+            start_method = process.child.worker_pool._mp_context.get_start_method()
+            self.assertIn(start_method, ('forkserver', 'spawn'))
+        finally:
+            process.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
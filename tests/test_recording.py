@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2008 - 2019 Brian R. D'Urso
+#
+# This file is part of Python Instrument Control System, also known as Pythics.
+#
+# Pythics is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pythics is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pythics.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+#
+# load libraries
+#
+import os, os.path
+import tempfile
+import threading
+import types
+import unittest
+
+import numpy as np
+
+import pythics.libproxy
+import pythics.libtransport
+import pythics.recording
+
+
+#
+# Recorder and read_log, with a stand-in for the parent process
+#
+class TestRecording(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.parent = types.SimpleNamespace(child_processes={
+            '1': types.SimpleNamespace(filename='/apps/first.xml'),
+            '2': types.SimpleNamespace(filename='/apps/second.xml')})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, filename, requests):
+        filename = os.path.join(self.directory.name, filename)
+        recorder = pythics.recording.Recorder(self.parent, filename)
+        for command, lane in requests:
+            recorder.record(command, lane)
+        recorder.close()
+        return filename, list(pythics.recording.read_log(filename))
+
+    def check_round_trip(self, filename):
+        requests = [(('1', pythics.libproxy.SET_PROXY_ATTR, (pythics.libproxy.ProxyKey(3), 'value', 1.5), {}),
+                     pythics.libproxy.LANE_INTERACTIVE),
+                    (('2', pythics.libproxy.CALL_PROXY_METHOD, (pythics.libproxy.ProxyKey(4), 'clear'), {}),
+                     pythics.libproxy.LANE_BULK),
+                    (('1', pythics.libproxy.RELEASE_PROXIES, ([5, 6], 0, 2), {}),
+                     pythics.libproxy.LANE_BULK)]
+        filename, records = self.record(filename, requests)
+        lanes = [lane for t, lane, request in records]
+        self.assertEqual(lanes, [pythics.recording.APP_LANE, pythics.libproxy.LANE_INTERACTIVE,
+                                 pythics.recording.APP_LANE, pythics.libproxy.LANE_BULK,
+                                 pythics.libproxy.LANE_BULK])
+        self.assertEqual(records[0][2], ('1', '/apps/first.xml'))
+        self.assertEqual(records[2][2], ('2', '/apps/second.xml'))
+        process_id, opcode, args, kwargs = records[1][2]
+        self.assertEqual((process_id, opcode), ('1', pythics.libproxy.SET_PROXY_ATTR))
+        self.assertEqual(args[0].key, 3)
+        self.assertEqual(args[1:], ('value', 1.5))
+        self.assertEqual(records[4][2], requests[2][0])
+        times = [t for t, lane, request in records]
+        self.assertEqual(times, sorted(times))
+
+    def test_round_trip(self):
+        self.check_round_trip('session.log')
+
+    def test_round_trip_compressed(self):
+        self.check_round_trip('session.log.gz')
+
+    def test_not_a_recording(self):
+        filename = os.path.join(self.directory.name, 'other.log')
+        with open(filename, 'wb') as f:
+            f.write(b'something else entirely')
+        with self.assertRaises(ValueError):
+            list(pythics.recording.read_log(filename))
+
+    @unittest.skipUnless(pythics.libtransport.shared_memory_available,
+                         'requires shared memory')
+    def test_shared_arrays_are_copied(self):
+        pool = pythics.libtransport.SharedArrayPool(threshold=1024)
+        try:
+            array = np.arange(4096, dtype=np.float64)
+            shared_array = pool.pack(array)
+            self.assertIs(type(shared_array), pythics.libproxy.SharedArray)
+            filename, records = self.record('arrays.log', [
+                (('1', pythics.libproxy.CALL_PROXY_METHOD,
+                  (pythics.libproxy.ProxyKey(3), 'set_data', shared_array), {}),
+                 pythics.libproxy.LANE_BULK)])
+        finally:
+            pool.close()
+        recorded = records[1][2][2][2]
+        self.assertIs(type(recorded), np.ndarray)
+        np.testing.assert_array_equal(recorded, array)
+
+    def test_one_app_record_per_process(self):
+        # each lane is recorded from its own queue watcher thread
+        filename = os.path.join(self.directory.name, 'threads.log')
+        recorder = pythics.recording.Recorder(self.parent, filename)
+        barrier = threading.Barrier(2)
+
+        def record(lane):
+            barrier.wait()
+            for i in range(200):
+                recorder.record(('1', pythics.libproxy.DELETE_PROXY, (i,), {}), lane)
+
+        threads = [threading.Thread(target=record, args=(lane,))
+                   for lane in (pythics.libproxy.LANE_INTERACTIVE, pythics.libproxy.LANE_BULK)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        recorder.close()
+        records = list(pythics.recording.read_log(filename))
+        lanes = [lane for t, lane, request in records]
+        self.assertEqual(lanes.count(pythics.recording.APP_LANE), 1)
+        self.assertEqual(lanes[0], pythics.recording.APP_LANE)
+        self.assertEqual(len(records), 401)
+
+
+if __name__ == '__main__':
+    unittest.main()